@@ -9,20 +9,51 @@ A complete demo system with multiple AI agents handling different services:
 - General Customer Service
 """
 
-from flask import Flask, render_template, jsonify, request, session
-from flask_socketio import SocketIO, emit
+from flask import Flask, render_template, jsonify, request, session, Response
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import os
 import asyncio
+import contextlib
 import base64
 import io
 import json
+import time
 from datetime import datetime
-from google import genai
-from google.genai import types
-import pyaudio
-import threading
-import queue
+import atexit
 import logging
+import threading
+import uuid
+from call_engine import CallEngine, EngineFull
+from audio_frames import (
+    encode_frame, decode_frame, FrameError, TRANSPORT_BINARY, TRANSPORT_BASE64
+)
+from vad import VoiceActivityDetector, VAD_ENABLED
+from jitter_buffer import OutputPipeline, OUTPUT_FRAME_MS
+from call_store import (
+    create_call_store, project, CATEGORY_ORDERS, CATEGORY_APPOINTMENTS, CATEGORY_TICKETS,
+    DEFAULT_PAGE_SIZE
+)
+from live_stats import LiveStats, ClusterStats, run_publisher
+from cluster import create_cluster, MESSAGE_QUEUE_URL
+from session_pool import SessionPool, PooledSession, SESSION_POOL_SIZE
+from prompts import PROMPTS_VERSION, GREETING_CUE, system_instruction
+from extractors import StreamingExtractor, apply_records
+from transcript import Transcript
+from audio_codecs import negotiate, OutboundEncoder, InboundDecoder
+from rtp_gateway import RtpGateway, RTP_GATEWAY_ENABLED, RTP_SAMPLE_RATE
+from server_mode import Bridge, socketio_options, run_blocking, serve, on_serve
+from recording import RecordingWriter, TRACK_CALLER, TRACK_AGENT, load_index, serve_range
+from lifecycle import (
+    Reaper, expired, CALL_CONNECT_TIMEOUT_S, REASON_HANGUP, REASON_DISCONNECT, REASON_OVERLOAD,
+    REASON_SLOW_CONSUMER, FAILURE_REASONS
+)
+from backpressure import (
+    InboundBuffer, LoadShedder, BacklogSampler, client_backlog, AUDIO_OUT_CLIENT_MAX_MS,
+    SHED_COALESCED, SHED_STALL, SHED_DISCONNECT
+)
+from startup import LiveClient, Warmup
+import metrics
+from metrics import CallTimings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,21 +61,32 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'demo-secret-key-change-in-production')
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# SERVER_MODE picks the server (see server_mode.py). With MESSAGE_QUEUE_URL
+# set, emits reach clients connected to any worker.
+bridge = Bridge()
+socketio = SocketIO(app, cors_allowed_origins="*", **socketio_options(MESSAGE_QUEUE_URL, bridge))
+# Engine loops and cluster threads emit through the bridge
+bridge.start(socketio)
 
-# Initialize Gemini client
-client = genai.Client(
-    http_options={"api_version": "v1beta"},
-    api_key=os.environ.get("GEMINI_API_KEY"),
-)
+# Gemini client, built by the warm-up below or on first use, whichever
+# comes first (LIVE_BACKEND=fake uses the offline stand-in)
+live_client = LiveClient()
+started_at = time.monotonic()
 
-# Audio configuration
-FORMAT = pyaudio.paInt16
+# Audio configuration (16-bit mono PCM both ways)
 CHANNELS = 1
 SEND_SAMPLE_RATE = 16000
 RECEIVE_SAMPLE_RATE = 24000
 CHUNK_SIZE = 1024
 
+LIVE_MODEL = "models/gemini-2.5-flash-preview-native-audio-dialog"
+
+# Largest page the /api list endpoints will return
+MAX_PAGE_SIZE = 200
+
+# Dashboards join this room for transcripts and call metadata (never audio)
+DASHBOARD_ROOM = 'dashboard'
+
 # Service configurations with phone numbers
 SERVICES = {
     "restaurant": {
@@ -84,226 +126,440 @@ SERVICES = {
     }
 }
 
-# Master prompts for each service
-MASTER_PROMPTS = {
-    "restaurant": """
-You are an AI assistant for GourmetEats Restaurant. Your job is to:
-1. Greet customers warmly
-2. Help them browse the menu (Pizza, Burgers, Pasta, Salads, Desserts)
-3. Take their order with quantities
-4. Confirm delivery address
-5. Provide estimated delivery time (30-45 minutes)
-6. Process payment confirmation
-7. Give order ID at the end
-
-Be friendly, suggest popular items, handle special requests (extra cheese, no onions, etc.).
-Example menu items with prices:
-- Margherita Pizza: $12.99
-- Cheeseburger Deluxe: $9.99
-- Spaghetti Carbonara: $14.99
-- Caesar Salad: $7.99
-- Chocolate Cake: $5.99
-
-Always confirm the complete order before finalizing.
-""",
-    
-    "hospital": """
-You are an AI receptionist for HealthCare Plus Hospital. Your responsibilities:
-1. Greet patients professionally
-2. Ask about their medical concern (general checkup, specialist visit, emergency)
-3. Recommend appropriate doctor/department
-4. Check available time slots (weekdays 9 AM - 5 PM)
-5. Collect patient name, phone, insurance info
-6. Confirm appointment date and time
-7. Provide appointment ID
-
-Available departments: Cardiology, Orthopedics, Pediatrics, General Medicine, Emergency.
-Be empathetic, professional, and prioritize urgent cases.
-For emergencies, immediately provide emergency number: 911
-""",
-    
-    "techsupport": """
-You are a technical support agent for TechFix Support. Your goals:
-1. Greet customer and get their name
-2. Identify the issue (software, hardware, network, account)
-3. Ask diagnostic questions
-4. Provide step-by-step troubleshooting
-5. Offer remote assistance if needed
-6. Create support ticket with issue ID
-
-Common issues: WiFi problems, software installation, password reset, device not working.
-Be patient, explain in simple terms, and confirm each step is completed.
-Always provide a ticket number at the end: TECH-XXXXX
-""",
-    
-    "travel": """
-You are a travel booking agent for SkyHigh Travel Agency. Your tasks:
-1. Greet the customer warmly
-2. Ask for travel preferences (destination, dates, budget)
-3. Suggest flight options with prices
-4. Offer hotel packages
-5. Handle special requests (window seat, dietary needs)
-6. Process booking with confirmation
-7. Provide booking reference number
-
-Popular destinations: New York, Paris, Tokyo, Dubai, London.
-Be enthusiastic, suggest deals, and ensure customer satisfaction.
-Flight prices range from $299 to $1,500. Hotels from $100-$400 per night.
-""",
-    
-    "support": """
-You are a general customer service agent for Universal Customer Service. You handle:
-1. Product inquiries
-2. Return/refund requests
-3. Account issues
-4. Billing questions
-5. General complaints
-6. Feedback collection
-
-Be professional, empathetic, and solution-oriented.
-Always get: customer name, order/account number, issue description.
-Provide resolution steps and ticket number.
-For escalations, mention: "I'll connect you with a supervisor."
-"""
-}
+# Completed calls are persisted here (write-behind; end_call never blocks)
+call_store = create_call_store()
+# Registered first so it closes after the engine has drained calls
+atexit.register(call_store.close)
+
+# Per-service call recordings, written on a background thread (see
+# recording.py); finished after the engine has ended calls
+recordings = RecordingWriter()
+atexit.register(recordings.close)
+
+# Other workers of this deployment, if any (see cluster.py); closed after
+# the engine has ended local calls
+cluster = create_cluster()
+atexit.register(cluster.close)
+
+# Incremental counters pushed to dashboards (seeded from the store). With
+# several workers dashboards get the cluster-wide view instead.
+live_stats = LiveStats()
+live_stats.seed(call_store.group_counts())
+dashboard_stats = ClusterStats(call_store, cluster) if cluster.distributed else live_stats
+_stats_publisher = None
+_stats_publisher_lock = threading.Lock()
+
+# Live session configs, built once per service and reused by every call
+_live_configs = {}
+
+def live_config(service_type):
+    """Live session config for a service: its voice and master prompt"""
+    if service_type not in _live_configs:
+        from google.genai import types
+        _live_configs[service_type] = types.LiveConnectConfig(
+            response_modalities=["AUDIO"],
+            speech_config=types.SpeechConfig(
+                voice_config=types.VoiceConfig(
+                    prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                        voice_name="Kore" if service_type in ["hospital", "support"] else "Puck"
+                    )
+                )
+            ),
+            system_instruction=system_instruction(service_type),
+        )
+    return _live_configs[service_type]
+
+async def open_live_session(service_type):
+    """Connect a Live session carrying the service prompt as its system instruction"""
+    stack = contextlib.AsyncExitStack()
+    connect_started = time.monotonic()
+    try:
+        session = await stack.enter_async_context(
+            live_client.get().aio.live.connect(model=LIVE_MODEL, config=live_config(service_type))
+        )
+    except BaseException:
+        await stack.aclose()
+        raise
+    return PooledSession(service_type, session, stack, time.monotonic() - connect_started)
 
-# Store active calls and their data
+def make_session_pool(worker):
+    return SessionPool(open_live_session, SERVICES)
+
+def on_session_finished(agent, error):
+    """Engine callback (on the call's loop): its session task has stopped"""
+    if error is not None:
+        agent.call_data["metadata"]["error"] = repr(error)
+    if agent.call_id in active_calls:
+        # Nobody ended it: the session died or never connected
+        bridge.call(reap_call, agent, expired(agent, time.monotonic()))
+
+# Shared call engine: a fixed pool of event-loop workers hosting all calls,
+# each keeping a few warm sessions per service (pools start after warm-up).
+# start_worker() starts it once the server is about to serve.
+engine = CallEngine(pool_factory=make_session_pool if SESSION_POOL_SIZE > 0 else None,
+                    on_finished=on_session_finished)
+atexit.register(engine.shutdown)
+
+# Build the client and Live configs off the import path, then fill the
+# session pools; /readyz reports when this is done
+warmup = Warmup([
+    ("client", live_client.get),
+    ("live_configs", lambda: [live_config(service) for service in SERVICES]),
+    ("session_pools", engine.start_pools),
+])
+
+# Store active calls
 active_calls = {}
-call_logs = []
-orders_db = []
-appointments_db = []
-support_tickets = []
+
+# Scrape-time gauges over the live calls
+metrics.registry.register(metrics.Gauge(
+    "call_inbound_queue_depth", "Caller audio chunks waiting to be sent upstream",
+    lambda: sum(len(a.audio_in) for a in list(active_calls.values()))))
+metrics.registry.register(metrics.Gauge(
+    "call_emit_backlog_frames", "Agent audio frames waiting to be paced out",
+    lambda: sum(len(a.output.frames) for a in list(active_calls.values()))))
+metrics.registry.register(metrics.Gauge(
+    "call_session_pool_idle", "Pre-opened Live sessions waiting for a call",
+    lambda: sum(sum(w.session_pool.stats()["idle"].values())
+                for w in engine.workers if w.session_pool is not None)))
+metrics.registry.register(metrics.Gauge(
+    "call_engine_tasks", "Session tasks running on the call engine (should match active calls)",
+    lambda: sum(len(w.tasks) for w in engine.workers)))
+metrics.registry.register(metrics.Gauge(
+    "call_recording_queue_depth", "Audio blocks waiting for the recording writer",
+    lambda: recordings.queue.qsize()))
 
 class AICallAgent:
-    def __init__(self, service_type, call_id):
+    def __init__(self, service_type, call_id, transport=TRANSPORT_BASE64, sid=None, audio_offer=None):
         self.service_type = service_type
         self.call_id = call_id
+        # Latency and volume counters; summarised into metadata at the end
+        self.timings = CallTimings(service_type)
+        # Socket.IO room named after call_id; the caller's sid is its only member
+        self.room = call_id
+        self.sid = sid
+        self.transport = transport
+        # RTP stream for gateway calls (see rtp_gateway.py); None for Socket.IO
+        self.media = None
+        # Codec and rate per direction, from what the client offered
+        audio_out, audio_in = negotiate(audio_offer, RECEIVE_SAMPLE_RATE, SEND_SAMPLE_RATE)
+        self.encoder = OutboundEncoder(audio_out, RECEIVE_SAMPLE_RATE)
+        self.decoder = InboundDecoder(audio_in, SEND_SAMPLE_RATE)
+        self.in_seq = None
+        self.lost_in_frames = 0
         self.session = None
-        self.audio_in_queue = queue.Queue()
+        self._session_stack = contextlib.AsyncExitStack()
+        # Set by the call engine: the worker loop all session I/O runs on
+        self.loop = None
+        self.worker = None
+        # Bounded both ways; overflow follows the policies in backpressure.py
+        self.audio_in = InboundBuffer(SEND_SAMPLE_RATE, on_shed=self._shed_inbound)
+        self.dropped_audio_chunks = 0
+        self.shed_reason = None
+        # Drops silence before it reaches the Live session
+        self.vad = VoiceActivityDetector(SEND_SAMPLE_RATE) if VAD_ENABLED else None
+        # Re-chunks, sequences and paces model audio to the client
+        self.output = OutputPipeline(RECEIVE_SAMPLE_RATE, on_shed=self._shed_outbound)
+        # Packets still queued on the caller's socket, re-read every BACKLOG_SAMPLE_S
+        self.client_backlog = BacklogSampler(lambda: client_backlog(socketio.server, self.sid))
+        # Both directions to disk, for services configured to record
+        self.recorder = recordings.start(call_id, service_type, {
+            TRACK_CALLER: SEND_SAMPLE_RATE, TRACK_AGENT: RECEIVE_SAMPLE_RATE})
+        # Pulls order IDs, slots, tickets etc. out of the agent's text
+        self.extractor = StreamingExtractor(service_type)
         self.is_active = True
-        self.transcript = []
+        # Lifecycle state read by the reaper (see lifecycle.py)
+        self.ended = False
+        self.session_done = False
+        self.last_activity = time.monotonic()
+        # Merged utterances; entry dicts are only built when read or stored.
+        # Each finished utterance goes to the search index right away.
+        self.transcript = Transcript(on_utterance=self._index_utterance)
         self.call_data = {
+            "call_id": call_id,
             "service": service_type,
             "start_time": datetime.now().isoformat(),
             "status": "active",
-            "transcript": [],
-            "metadata": {}
+            "transcript": self.transcript,
+            "metadata": {
+                "prompt_version": PROMPTS_VERSION,
+                "audio": {"out": audio_out._asdict(), "in": audio_in._asdict()},
+            }
         }
         
     async def start_session(self):
-        """Initialize the AI session"""
-        config = types.LiveConnectConfig(
-            response_modalities=["AUDIO"],
-            speech_config=types.SpeechConfig(
-                voice_config=types.VoiceConfig(
-                    prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                        voice_name="Kore" if self.service_type in ["hospital", "support"] else "Puck"
-                    )
-                )
-            ),
-        )
-        
-        self.session = await client.aio.live.connect(
-            model="models/gemini-2.5-flash-preview-native-audio-dialog",
-            config=config
-        )
+        """Initialize the AI session (from the worker's warm pool if possible)"""
+        connect_started = time.monotonic()
+        pool = self.worker.session_pool if self.worker else None
+        pooled = await pool.acquire(self.service_type) if pool else None
+        metrics.session_pool_requests.inc(1, self.service_type, "hit" if pooled else "miss")
+        self.call_data["metadata"]["session_pool"] = "hit" if pooled else "miss"
+        if pooled is None:
+            pooled = await open_live_session(self.service_type)
+        self._session_stack.push_async_exit(pooled.stack)
+        self.session = pooled.session
+        self.timings.connected(time.monotonic() - connect_started)
         
-        # Send master prompt
-        prompt = MASTER_PROMPTS.get(self.service_type, MASTER_PROMPTS["support"])
-        await self.session.send(input=prompt, end_of_turn=True)
+        # The prompt is already the system instruction; just cue the greeting
+        await self.session.send(input=GREETING_CUE, end_of_turn=True)
         
         # Start greeting
         greeting = f"Hello! Thank you for calling {SERVICES[self.service_type]['name']}. How may I assist you today?"
-        self.add_to_transcript("Agent", greeting)
-        socketio.emit('call_transcript', {
-            'call_id': self.call_id,
-            'speaker': 'Agent',
-            'text': greeting
-        })
+        self.add_to_transcript("Agent", greeting, final=True)
+        self.emit_transcript("Agent", greeting)
         
+    async def run_session(self):
+        """Open the session, then pump audio in and responses out"""
+        try:
+            await asyncio.wait_for(self.start_session(), CALL_CONNECT_TIMEOUT_S or None)
+            sender = asyncio.create_task(self.send_audio_loop())
+            # RTP is UDP: nothing queues behind a slow phone
+            behind = self.client_behind if self.media is None else None
+            pacer = asyncio.create_task(self.output.run(self.emit_audio, behind))
+            try:
+                await self.receive_responses()
+            finally:
+                sender.cancel()
+                pacer.cancel()
+                await asyncio.gather(sender, pacer, return_exceptions=True)
+        finally:
+            self.session_done = True
+            # However the session stopped (hang-up, error, cancellation), release it
+            await self._session_stack.aclose()
+
+    def enqueue_audio(self, audio_data, sample_rate=None):
+        """Queue caller audio without blocking (safe from any thread)"""
+        if not self.is_active or self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put_audio, audio_data, sample_rate)
+        except RuntimeError:
+            # Loop already closed; the call is ending
+            pass
+
+    def _put_audio(self, audio_data, sample_rate=None):
+        # Runs on the call's loop, so the decoder's stream state stays in order
+        try:
+            audio_data = self.decoder.decode(audio_data, sample_rate)
+        except ValueError as e:
+            logger.warning("Dropping caller audio for %s: %s", self.call_id, e)
+            return
+        if self.recorder:
+            self.recorder.write(TRACK_CALLER, audio_data)
+        # Never blocks; a full buffer sheds by AUDIO_IN_POLICY
+        self.audio_in.put(audio_data)
+        self.last_activity = time.monotonic()
+        self.timings.audio_in(len(audio_data), len(self.audio_in))
+
+    def _shed_inbound(self, event, count):
+        """Caller audio piled up because the Live session is not keeping up"""
+        if event == SHED_DISCONNECT:
+            self.shed(REASON_OVERLOAD)
+        elif event == SHED_COALESCED:
+            metrics.audio_coalesced.inc(count, self.service_type, "in")
+        else:
+            self.dropped_audio_chunks += count
+            metrics.audio_in_dropped.inc(count, self.service_type, event)
+
+    def _shed_outbound(self, event, count):
+        """Agent audio piled up because the client is not taking it"""
+        if event == SHED_DISCONNECT:
+            self.shed(REASON_SLOW_CONSUMER)
+        elif event == SHED_COALESCED:
+            metrics.audio_coalesced.inc(count, self.service_type, "out")
+        elif event == SHED_STALL:
+            metrics.client_stalls.inc(count, self.service_type)
+        else:
+            metrics.audio_out_dropped.inc(count, self.service_type, event)
+
+    def shed(self, reason):
+        """End this call to protect the others (on the call's loop, once)"""
+        if self.shed_reason is None:
+            self.shed_reason = reason
+            bridge.call(reap_call, self, reason)
+
+    def client_backlog_ms(self):
+        """Audio sent to this caller's socket but not yet written to it"""
+        if self.media is not None:
+            return 0
+        return self.client_backlog() * self.output.frame_ms
+
+    def client_behind(self):
+        return self.client_backlog_ms() > AUDIO_OUT_CLIENT_MAX_MS
+
+    async def send_audio_loop(self):
+        """Forward queued caller audio to the Live session"""
+        while self.is_active:
+            audio_data = await self.audio_in.get()
+            if audio_data is None:
+                break
+            if self.vad is None:
+                await self.process_audio(audio_data)
+                continue
+            
+            while True:
+                result = self.vad.process(audio_data)
+                if result.speech_started:
+                    self.barge_in()
+                if result.audio:
+                    await self.process_audio(result.audio)
+                if not result.speech_ended:
+                    break
+                self.timings.speech_ended()
+                await self.send_activity_end()
+                # End the turn before the rest of the chunk starts another
+                if not self.vad.pending():
+                    break
+                audio_data = b''
+
     async def process_audio(self, audio_data):
         """Process incoming audio from user"""
         if self.session and self.is_active:
             await self.session.send(input={"data": audio_data, "mime_type": "audio/pcm"})
     
+    async def send_activity_end(self):
+        """Tell the model the caller has stopped talking"""
+        if self.session and self.is_active:
+            from google.genai import types
+            await self.session.send(input=types.LiveClientContent(turn_complete=True))
+    
     async def receive_responses(self):
         """Receive and process AI responses"""
         while self.is_active and self.session:
             try:
                 turn = self.session.receive()
+                responses = 0
                 async for response in turn:
+                    responses += 1
+                    self.last_activity = time.monotonic()
+                    content = response.server_content
+                    if content and content.interrupted:
+                        self.barge_in()
                     if data := response.data:
-                        # Send audio back to client
-                        socketio.emit('audio_data', {
-                            'call_id': self.call_id,
-                            'data': base64.b64encode(data).decode()
-                        })
+                        self.timings.model_audio()
+                        # Queue audio for paced delivery to the client
+                        self.output.push(data)
                     if text := response.text:
                         self.add_to_transcript("Agent", text)
-                        socketio.emit('call_transcript', {
-                            'call_id': self.call_id,
-                            'speaker': 'Agent',
-                            'text': text
-                        })
+                        self.emit_transcript("Agent", text)
                         # Extract and store structured data
                         self.extract_call_data(text)
+                if not responses:
+                    # An empty turn means the connection is gone; do not spin on it
+                    if self.is_active:
+                        logger.warning("Live session for %s closed", self.call_id)
+                    break
+                self.output.end_of_turn()
+                self.transcript.end_utterance()
+                apply_records(self.call_data["metadata"], self.extractor.flush())
             except Exception as e:
-                print(f"Error in receive_responses: {e}")
+                # Errors after end_call are just the session being closed
+                if self.is_active:
+                    logger.error("Live session for %s failed: %r", self.call_id, e)
+                    self.call_data["metadata"]["error"] = repr(e)
                 break
     
-    def add_to_transcript(self, speaker, text):
-        """Add to transcript"""
-        entry = {
-            "speaker": speaker,
-            "text": text,
-            "timestamp": datetime.now().isoformat()
-        }
-        self.transcript.append(entry)
-        self.call_data["transcript"].append(entry)
+    def emit_audio(self, seq, timestamp_ms, data):
+        """Send one paced audio frame in the client's negotiated transport"""
+        if self.recorder:
+            self.recorder.write(TRACK_AGENT, data)
+        payload = self.encoder.encode(data)
+        first = self.timings.first_audio_s is None
+        self.timings.audio_out(len(payload), len(self.output.frames))
+        if first:
+            live_stats.first_audio(self.timings.first_audio_s)
+        sample_rate = self.encoder.format.sample_rate
+        if self.media is not None:
+            self.media.send(payload)
+        elif self.transport == TRANSPORT_BINARY:
+            bridge.emit('audio_frame', encode_frame(
+                self.call_id, seq, sample_rate, payload, timestamp_ms
+            ), to=self.room)
+        else:
+            bridge.emit('audio_data', {
+                'call_id': self.call_id,
+                'seq': seq,
+                'timestamp': timestamp_ms,
+                'sample_rate': sample_rate,
+                'codec': self.encoder.format.codec,
+                'data': base64.b64encode(payload).decode()
+            }, to=self.room)
+    
+    def barge_in(self):
+        """Caller started talking: drop unsent agent audio and tell the client"""
+        if self.output.flush() or self.output.playing():
+            bridge.emit('audio_flush', {
+                'call_id': self.call_id,
+                'seq': self.output.seq
+            }, to=self.room)
+    
+    def emit_transcript(self, speaker, text):
+        """Send a transcript line to the caller and to dashboards"""
+        bridge.emit('call_transcript', {
+            'call_id': self.call_id,
+            'speaker': speaker,
+            'text': text
+        }, to=[self.room, DASHBOARD_ROOM])
+    
+    def track_in_seq(self, seq):
+        """Count gaps in the caller's frame sequence"""
+        if self.in_seq is not None and seq > self.in_seq + 1:
+            self.lost_in_frames += seq - self.in_seq - 1
+        self.in_seq = seq
+    
+    def add_to_transcript(self, speaker, text, final=False):
+        """Add to transcript (fragments from the same speaker are merged)"""
+        self.transcript.add(speaker, text)
+        if final:
+            self.transcript.end_utterance()
+    
+    def _index_utterance(self, seq, speaker, text, timestamp):
+        call_store.index_utterance(self.call_data, seq, speaker, text, timestamp)
     
     def extract_call_data(self, text):
         """Extract structured data from conversation"""
-        text_lower = text.lower()
-        
-        # Extract order details for restaurant
-        if self.service_type == "restaurant":
-            if "order id" in text_lower or "order number" in text_lower:
-                import re
-                order_id = re.search(r'(?:order (?:id|number)[:\s]+)?([A-Z0-9-]+)', text, re.IGNORECASE)
-                if order_id:
-                    self.call_data["metadata"]["order_id"] = order_id.group(1)
-        
-        # Extract appointment details for hospital
-        elif self.service_type == "hospital":
-            if "appointment" in text_lower:
-                self.call_data["metadata"]["has_appointment"] = True
-        
-        # Extract ticket ID for support
-        elif self.service_type == "techsupport":
-            if "ticket" in text_lower or "tech-" in text_lower:
-                import re
-                ticket = re.search(r'TECH-\d+', text, re.IGNORECASE)
-                if ticket:
-                    self.call_data["metadata"]["ticket_id"] = ticket.group(0)
+        apply_records(self.call_data["metadata"], self.extractor.feed(text))
     
-    async def end_call(self):
-        """End the call session"""
+    async def end_call(self, reason=REASON_HANGUP):
+        """End the call session (only the first call does anything)"""
+        if self.ended:
+            return
+        self.ended = True
         self.is_active = False
-        self.call_data["end_time"] = datetime.now().isoformat()
-        self.call_data["status"] = "completed"
-        
-        # Store in appropriate database
-        if self.service_type == "restaurant" and "order_id" in self.call_data["metadata"]:
-            orders_db.append(self.call_data)
-        elif self.service_type == "hospital":
-            appointments_db.append(self.call_data)
-        else:
-            support_tickets.append(self.call_data)
-        
-        call_logs.append(self.call_data)
-        
-        if self.session:
-            await self.session.close()
+        try:
+            self.transcript.end_utterance()
+            self.call_data["end_time"] = datetime.now().isoformat()
+            self.call_data["status"] = "failed" if reason in FAILURE_REASONS else "completed"
+            self.call_data["metadata"]["end_reason"] = reason
+            self.call_data["metadata"]["lost_in_frames"] = self.lost_in_frames
+            self.call_data["metadata"]["dropped_in_chunks"] = self.dropped_audio_chunks
+            if self.vad:
+                self.call_data["metadata"]["vad"] = self.vad.stats()
+            if self.media is not None:
+                self.call_data["metadata"]["rtp"] = self.media.stats()
+            if self.recorder:
+                self.recorder.close()
+                self.call_data["metadata"]["recording"] = self.recorder.stats()
+            self.call_data["metadata"]["output"] = self.output.stats()
+            self.call_data["metadata"]["timings"] = self.timings.summary()
+            apply_records(self.call_data["metadata"], self.extractor.flush())
+            
+            # Store in appropriate category
+            if self.service_type == "restaurant" and "order_id" in self.call_data["metadata"]:
+                category = CATEGORY_ORDERS
+            elif self.service_type == "hospital":
+                category = CATEGORY_APPOINTMENTS
+            else:
+                category = CATEGORY_TICKETS
+            call_store.save_call(self.call_data, category)
+            live_stats.call_ended(
+                self.service_type, self.call_data["status"], category,
+                time.monotonic() - self.timings.started_at
+            )
+        finally:
+            # Wake the audio sender so it can exit
+            self.audio_in.close()
+            await self._session_stack.aclose()
 
 # Flask routes
 @app.route('/')
@@ -322,79 +578,292 @@ def mic_test():
 def get_services():
     return jsonify(SERVICES)
 
+def parse_since(since):
+    """The since filter as the ISO form start times are stored in, or None"""
+    if since in (None, ""):
+        return None
+    try:
+        return datetime.fromisoformat(since).isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid since: {since!r} (expected an ISO time)")
+
+def paged_calls(category=None):
+    """Paginated, filterable call listing shared by the /api list endpoints
+    
+    Query parameters: cursor, limit, since (ISO time), service, status and
+    include=transcript. Responses are summaries unless transcripts are asked for.
+    """
+    args = request.args
+    try:
+        limit = max(1, min(int(args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+        calls, next_cursor = call_store.query_calls(
+            category=category,
+            service=args.get('service'),
+            status=args.get('status'),
+            since=parse_since(args.get('since')),
+            cursor=args.get('cursor'),
+            limit=limit,
+            include_transcript='transcript' in args.get('include', '').split(','),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"items": calls, "next_cursor": next_cursor})
+
 @app.route('/api/call-logs')
 def get_call_logs():
-    return jsonify(call_logs)
+    return paged_calls()
 
 @app.route('/api/orders')
 def get_orders():
-    return jsonify(orders_db)
+    return paged_calls(CATEGORY_ORDERS)
 
 @app.route('/api/appointments')
 def get_appointments():
-    return jsonify(appointments_db)
+    return paged_calls(CATEGORY_APPOINTMENTS)
 
 @app.route('/api/tickets')
 def get_tickets():
-    return jsonify(support_tickets)
+    return paged_calls(CATEGORY_TICKETS)
+
+@app.route('/api/search')
+def search_calls():
+    """Calls whose transcripts match q, best first, with highlighted snippets
+    
+    Query parameters: q (words; ID-like words such as TECH-12345 match as a
+    whole, a trailing * matches prefixes), service, since (ISO time), limit.
+    Live calls are included as soon as an utterance finishes.
+    """
+    args = request.args
+    try:
+        limit = max(1, min(int(args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+        results = call_store.search(args.get('q', ''), service=args.get('service'),
+                                    since=parse_since(args.get('since')), limit=limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"query": args.get('q', ''), "items": results})
+
+@app.route('/api/calls/<call_id>/transcript')
+def get_call_transcript(call_id):
+    # Live calls are served from the agent (maybe on another worker),
+    # finished ones from the store
+    if call_id in active_calls:
+        transcript = active_calls[call_id].transcript.entries()
+    else:
+        transcript = run_blocking(cluster.request, call_id, 'transcript', {})
+        if transcript is None:
+            transcript = call_store.get_transcript(call_id)
+    if transcript is None:
+        return jsonify({"error": "call not found"}), 404
+    return jsonify({"call_id": call_id, "transcript": transcript})
+
+@app.route('/api/calls/<call_id>/recording')
+def get_call_recording(call_id):
+    """A recording's tracks and chunks (its seek index)"""
+    index = load_index(call_id)
+    if index is None:
+        return jsonify({"error": "recording not found"}), 404
+    for track in index["tracks"]:
+        index["tracks"][track]["url"] = f"/api/calls/{call_id}/recording/{track}.wav"
+    return jsonify(index)
+
+@app.route('/api/calls/<call_id>/recording/<track>.wav')
+def get_call_recording_track(call_id, track):
+    """One track as a single WAV, with HTTP range support for seeking"""
+    try:
+        found = serve_range(call_id, track, request.headers.get('Range'))
+    except ValueError as e:
+        return Response(status=416, headers={'Content-Range': str(e)})
+    if found is None:
+        return jsonify({"error": "recording not found"}), 404
+    status, headers, body = found
+    return Response(body, status=status, headers=headers, direct_passthrough=True)
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text exposition of call latency histograms and counters"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: serving HTTP with every call engine thread running"""
+    alive = engine.alive
+    return jsonify({"status": "ok" if alive else "engine stopped",
+                    "uptime_s": round(time.monotonic() - started_at, 1)}), 200 if alive else 503
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: client built, warm-up done, session pools warm, not overloaded"""
+    checks = {
+        "client": live_client.ready,
+        "warmup": warmup.done,
+        "session_pools": engine.pools_warm,
+        "engine": engine.accepting,
+        "load": shedder.reason is None,
+    }
+    ready = all(checks.values())
+    return jsonify({"ready": ready, "checks": checks, "warmup": warmup.stats(),
+                    "uptime_s": round(time.monotonic() - started_at, 1)}), 200 if ready else 503
 
 @app.route('/api/stats')
 def get_stats():
-    return jsonify({
-        "total_calls": len(call_logs),
-        "active_calls": len(active_calls),
-        "total_orders": len(orders_db),
-        "total_appointments": len(appointments_db),
-        "total_tickets": len(support_tickets)
-    })
+    stats = dashboard_stats.snapshot()
+    if cluster.distributed:
+        stats["engine"] = {worker: summary["engine"] for worker, summary in cluster.workers().items()}
+    else:
+        stats["engine"] = engine.stats()
+    stats["reaper"] = reaper.stats()
+    stats["shedder"] = shedder.stats()
+    if rtp_gateway:
+        stats["rtp"] = rtp_gateway.stats()
+    return jsonify(stats)
+
+def ensure_stats_publisher():
+    """Start the coalescing stats_update publisher once"""
+    global _stats_publisher
+    with _stats_publisher_lock:
+        if _stats_publisher is None:
+            _stats_publisher = socketio.start_background_task(
+                run_publisher, dashboard_stats,
+                lambda delta: socketio.emit('stats_update', {'full': False, 'stats': delta},
+                                            to=DASHBOARD_ROOM),
+                socketio.sleep,
+            )
+
+def new_call_id(service_type):
+    """Unique across workers and across calls started in the same second"""
+    return f"{service_type}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+def reject_call(service_type, reason, detail, status='busy'):
+    """Tell the caller why its call was refused, and count it"""
+    known = isinstance(service_type, str) and service_type in SERVICES
+    metrics.calls_rejected.inc(1, service_type if known else "unknown", reason)
+    emit('call_rejected', {'service': service_type, 'reason': status, 'detail': detail})
 
 # SocketIO events
 @socketio.on('start_call')
 def handle_start_call(data):
-    service_type = data.get('service')
-    call_id = f"{service_type}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    
-    agent = AICallAgent(service_type, call_id)
-    active_calls[call_id] = agent
+    service_type = data.get('service') if isinstance(data, dict) else None
+    # Before anything is built from it: the id, a recording, metric labels
+    if not isinstance(service_type, str) or service_type not in SERVICES:
+        reject_call(service_type, "unknown_service", f"unknown service {service_type!r}", 'unknown_service')
+        return
+    # Overloaded: refuse new calls rather than degrade the live ones
+    if shedder.reason:
+        reject_call(service_type, shedder.reason, f"server overloaded ({shedder.reason})")
+        return
+    call_id = new_call_id(service_type)
     
-    # Start agent in background
-    def run_agent():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(agent.start_session())
-        loop.run_until_complete(agent.receive_responses())
+    # Clients that understand binary frames ask for them; old ones get base64
+    transport = TRANSPORT_BINARY if data.get('transport') == TRANSPORT_BINARY else TRANSPORT_BASE64
+    # Optional codec/rate offer, e.g. {'codecs': ['mulaw'], 'sample_rate': 8000}
+    agent = AICallAgent(service_type, call_id, transport, sid=request.sid, audio_offer=data.get('audio'))
     
-    thread = threading.Thread(target=run_agent)
-    thread.start()
+    # Join first: a warm session greets the room as soon as the call starts
+    join_room(agent.room)
+    # Place the call on a shared engine worker (admission controlled)
+    try:
+        engine.submit(agent)
+    except EngineFull as e:
+        leave_room(agent.room)
+        reject_call(service_type, "capacity" if engine.accepting else "shutdown", str(e))
+        return
+    active_calls[call_id] = agent
+    cluster.register_call(call_id, service_type)
+    live_stats.call_started(service_type)
     
     emit('call_started', {
         'call_id': call_id,
-        'service': SERVICES[service_type]
+        'service': SERVICES[service_type],
+        'transport': transport,
+        'audio_out': agent.encoder.format._asdict(),
+        'audio_in': agent.decoder.format._asdict()
     })
+    socketio.emit('call_activity', {
+        'call_id': call_id,
+        'service': service_type,
+        'status': 'active'
+    }, to=DASHBOARD_ROOM)
 
 @socketio.on('send_audio')
 def handle_audio(data):
+    """Legacy base64 JSON audio path"""
     call_id = data.get('call_id')
     audio_data = base64.b64decode(data.get('audio'))
     
     if call_id in active_calls:
-        agent = active_calls[call_id]
-        # Process audio in background
-        asyncio.run(agent.process_audio(audio_data))
+        # Hand off to the call's loop; never block the Socket.IO thread
+        active_calls[call_id].enqueue_audio(audio_data)
+    else:
+        route_to_owner(call_id, 'send_audio', {'audio': data.get('audio')})
+
+@socketio.on('send_audio_frame')
+def handle_audio_frame(frame):
+    """Binary audio path: raw PCM with a small framing header"""
+    try:
+        audio = decode_frame(frame)
+    except (FrameError, TypeError, UnicodeDecodeError) as e:
+        logger.warning("Dropping bad audio frame: %s", e)
+        return
+    
+    if audio.call_id in active_calls:
+        agent = active_calls[audio.call_id]
+        agent.track_in_seq(audio.seq)
+        agent.enqueue_audio(audio.pcm, audio.sample_rate)
+    else:
+        route_to_owner(audio.call_id, 'send_audio_frame',
+                       {'frame': base64.b64encode(frame).decode()})
+
+def finish_call(agent, reason=REASON_HANGUP):
+    """End a local call and tell its room and the dashboards"""
+    # Waits on the call's engine loop
+    try:
+        clean = run_blocking(engine.end_call, agent, reason)
+    except Exception as e:
+        logger.error("Teardown of call %s failed: %r", agent.call_id, e)
+        clean = False
+    if not clean:
+        metrics.calls_leaked.inc(1, agent.service_type)
+    cluster.unregister_call(agent.call_id)
+    socketio.emit('call_ended', {
+        'call_id': agent.call_id,
+        'reason': reason,
+        'summary': project(agent.call_data)
+    }, to=agent.room)
+    socketio.emit('call_activity', {
+        'call_id': agent.call_id,
+        'service': agent.service_type,
+        'status': agent.call_data['status']
+    }, to=DASHBOARD_ROOM)
+
+def route_to_owner(call_id, event, payload):
+    """Forward a command for a call owned by another worker
+    
+    The sender joins the call's room here, so the owner's emits reach it
+    through the message queue.
+    """
+    if cluster.forward(call_id, event, payload):
+        join_room(call_id)
+        return True
+    return False
+
+def reap_call(agent, reason):
+    """End a call the caller did not hang up (teardown runs in the background)"""
+    if active_calls.pop(agent.call_id, None) is None:
+        return
+    logger.info("Reaping call %s: %s", agent.call_id, reason)
+    metrics.calls_reaped.inc(1, agent.service_type, reason)
+    socketio.start_background_task(finish_call, agent, reason)
 
 @socketio.on('end_call')
 def handle_end_call(data):
     call_id = data.get('call_id')
     
     if call_id in active_calls:
-        agent = active_calls[call_id]
-        asyncio.run(agent.end_call())
-        del active_calls[call_id]
-        
-        emit('call_ended', {
-            'call_id': call_id,
-            'summary': agent.call_data
-        })
+        agent = active_calls.pop(call_id)
+        finish_call(agent)
+        leave_room(agent.room)
+    else:
+        route_to_owner(call_id, 'end_call', {})
 
 @socketio.on('user_speech')
 def handle_user_speech(data):
@@ -404,14 +873,131 @@ def handle_user_speech(data):
     
     if call_id in active_calls:
         agent = active_calls[call_id]
-        agent.add_to_transcript("User", text)
+        agent.last_activity = time.monotonic()
+        agent.add_to_transcript("User", text, final=True)
         
-        # Broadcast to all clients
-        emit('call_transcript', {
-            'call_id': call_id,
-            'speaker': 'User',
-            'text': text
-        }, broadcast=True)
+        # Only the call's own room and the dashboards see it
+        agent.emit_transcript("User", text)
+    else:
+        route_to_owner(call_id, 'user_speech', {'text': text})
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    """The caller's socket went away without end_call: end its calls"""
+    for agent in [a for a in list(active_calls.values()) if a.sid == request.sid]:
+        reap_call(agent, REASON_DISCONNECT)
+
+@socketio.on('subscribe_dashboard')
+def handle_subscribe_dashboard():
+    """Join the transcript/metadata channel (no audio is sent there)"""
+    join_room(DASHBOARD_ROOM)
+    ensure_stats_publisher()
+    # New tabs start from a full snapshot, then receive deltas
+    emit('stats_update', {'full': True, 'stats': dashboard_stats.snapshot()})
+
+@socketio.on('unsubscribe_dashboard')
+def handle_unsubscribe_dashboard():
+    leave_room(DASHBOARD_ROOM)
+
+def handle_cluster_message(event, call_id, payload):
+    """Commands other workers forwarded for calls that live on this one"""
+    agent = active_calls.get(call_id)
+    if agent is None:
+        return None
+    if event == 'send_audio_frame':
+        audio = decode_frame(base64.b64decode(payload['frame']))
+        agent.track_in_seq(audio.seq)
+        agent.enqueue_audio(audio.pcm, audio.sample_rate)
+    elif event == 'send_audio':
+        agent.enqueue_audio(base64.b64decode(payload['audio']))
+    elif event == 'user_speech':
+        agent.add_to_transcript("User", payload['text'], final=True)
+        agent.emit_transcript("User", payload['text'])
+    elif event == 'end_call':
+        if active_calls.pop(call_id, None) is not None:
+            # Teardown waits on the engine; keep the cluster listener free
+            bridge.call(socketio.start_background_task, finish_call, agent)
+    elif event == 'transcript':
+        return agent.transcript.entries()
+    return None
+
+def worker_heartbeat():
+    """This worker's live counters and engine load, for the other workers"""
+    summary = live_stats.worker_summary()
+    summary["engine"] = engine.stats()
+    return summary
+
+def start_rtp_call(service_type, stream):
+    """Gateway callback: a new RTP stream arrived on a service's port"""
+    if shedder.reason:
+        metrics.calls_rejected.inc(1, service_type, shedder.reason)
+        return None
+    agent = AICallAgent(service_type, new_call_id(service_type), 'rtp',
+                        audio_offer={'codecs': [stream.codec], 'sample_rate': RTP_SAMPLE_RATE})
+    agent.media = stream
+    try:
+        engine.submit(agent)
+    except EngineFull:
+        metrics.calls_rejected.inc(1, service_type, "capacity" if engine.accepting else "shutdown")
+        return None
+    active_calls[agent.call_id] = agent
+    cluster.register_call(agent.call_id, service_type)
+    live_stats.call_started(service_type)
+    bridge.emit('call_activity', {
+        'call_id': agent.call_id,
+        'service': service_type,
+        'status': 'active'
+    }, to=DASHBOARD_ROOM)
+    return agent
+
+def end_rtp_call(stream):
+    """Gateway callback: the caller's stream went quiet"""
+    agent = stream.agent
+    if active_calls.pop(agent.call_id, None) is not None:
+        # Teardown waits on the engine; keep the gateway loop free
+        bridge.call(socketio.start_background_task, finish_call, agent)
+
+# Ends calls nobody hung up: idle, too long, or never connected
+reaper = Reaper(active_calls, reap_call)
+
+def audio_backlog_ms():
+    """Audio this worker has accepted but not yet delivered, across calls"""
+    total = 0.0
+    for agent in list(active_calls.values()):
+        total += agent.audio_in.depth_ms + agent.client_backlog_ms()
+    # Emits from engine threads waiting for the hub, mostly audio frames
+    return total + bridge.pending * OUTPUT_FRAME_MS
+
+# Refuses new calls while CPU or the audio backlog is past its watermark
+shedder = LoadShedder(audio_backlog_ms)
+metrics.registry.register(metrics.Gauge(
+    "call_audio_backlog_ms", "Audio accepted but not yet delivered, across calls (last sample)",
+    lambda: round(shedder.readings["queue"], 1)))
+metrics.registry.register(metrics.Gauge(
+    "call_load_shedding", "1 while new calls are refused for overload",
+    lambda: int(shedder.reason is not None)))
+
+# Phone-style callers over RTP, one UDP port per service
+rtp_gateway = None
+if RTP_GATEWAY_ENABLED:
+    rtp_gateway = RtpGateway(SERVICES, start_rtp_call, end_rtp_call)
+    atexit.register(rtp_gateway.close)
+
+@on_serve
+def start_worker():
+    """Start what runs beside the server, in the process that serves
+    
+    Nothing here runs at import, so a reloader's watcher process (or a
+    script that only imports the app) starts no second engine, session
+    pools or RTP listeners.
+    """
+    engine.start(pools=False)
+    warmup.start()
+    cluster.start(handle_cluster_message, worker_heartbeat)
+    socketio.start_background_task(reaper.run, socketio.sleep)
+    socketio.start_background_task(shedder.run, socketio.sleep)
+    if rtp_gateway:
+        rtp_gateway.start()
 
 if __name__ == '__main__':
     print("=" * 60)
@@ -426,7 +1012,13 @@ if __name__ == '__main__':
     print("\n⚠️  Note: Your browser will show a security warning for the")
     print("   self-signed certificate. Click 'Advanced' and 'Proceed' to continue.")
     print("\n📱 Phone Dialer: https://localhost:5000/dialer")
+    if rtp_gateway:
+        print("\n☎️  RTP gateway (8 kHz G.711):")
+        for key, port in rtp_gateway.ports.items():
+            print(f"   • {SERVICES[key]['phone']} → udp/{port}")
     print("=" * 60)
     
-    # Run with HTTPS using adhoc SSL context
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000, ssl_context='adhoc')
+    # SERVER_MODE=threading (default): dev server over adhoc HTTPS
+    # (SERVER_DEBUG=1 adds debug and the reloader);
+    # SERVER_MODE=eventlet: cooperative production server
+    serve(socketio, app, port=int(os.environ.get('PORT', 5000)), adhoc_tls=True)
@@ -0,0 +1,231 @@
+"""
+Audio Codecs
+============
+Per-call transcoding between the Live API's fixed formats (16 kHz PCM
+in, 24 kHz PCM out) and what the client asked for in start_call.
+
+    codecs     pcm16  16-bit little-endian PCM (2 bytes/sample)
+               mulaw  G.711 mu-law (1 byte/sample), as telephony uses
+               alaw   G.711 A-law (1 byte/sample), the European variant
+    rates      8000, 16000, 24000 Hz out; inbound frames may use any of
+               those or 48000 (browsers that ignore the requested rate)
+
+A 24 kHz PCM stream is 48 KB/s; 8 kHz mu-law is 8 KB/s. Everything is
+NumPy-vectorized. Resamplers keep filter history and their fractional
+phase across chunks, so streamed audio has no seams at chunk edges.
+G.711 uses lookup tables built once at import.
+
+The client offers
+    {"audio": {"codecs": ["mulaw", "pcm16"], "sample_rate": 8000}}
+and call_started answers with the chosen formats:
+    {"audio_out": {"codec": "mulaw", "sample_rate": 8000},
+     "audio_in": {"codec": "mulaw", "sample_rate": 8000}}
+Clients that offer nothing keep plain PCM at the Live API rates.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+CODEC_PCM16 = 'pcm16'
+CODEC_MULAW = 'mulaw'
+CODEC_ALAW = 'alaw'
+CODECS = (CODEC_PCM16, CODEC_MULAW, CODEC_ALAW)
+OUTPUT_RATES = (8000, 16000, 24000)
+INPUT_RATES = (8000, 16000, 24000, 48000)
+# Windowed-sinc low-pass length used when downsampling
+FILTER_TAPS = 31
+
+AudioFormat = namedtuple('AudioFormat', ['codec', 'sample_rate'])
+
+
+def _mulaw_tables():
+    """int16 -> mu-law byte (65536 entries) and mu-law byte -> int16"""
+    # CCITT G.711 reference algorithm on 14-bit magnitudes
+    pcm = np.arange(-32768, 32768, dtype=np.int32)
+    value = pcm >> 2
+    mask = np.where(value < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(value), 8159) + 0x21
+    segment_ends = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+    segment = np.searchsorted(segment_ends, magnitude)
+    code = np.where(segment > 7, 0x7F, (segment << 4) | ((magnitude >> (segment + 1)) & 0x0F))
+    encoded = code ^ mask
+    # Index by the int16's bit pattern, i.e. its uint16 view
+    encode = np.empty(65536, dtype=np.uint8)
+    encode[pcm.astype(np.int16).view(np.uint16)] = encoded
+
+    bias = 0x84
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + bias) << exponent) - bias
+    decode = np.where(codes & 0x80, -magnitude, magnitude).astype('<i2')
+    return encode, decode
+
+
+def _alaw_tables():
+    """int16 -> A-law byte (65536 entries) and A-law byte -> int16"""
+    # CCITT G.711 reference algorithm on 13-bit magnitudes
+    pcm = np.arange(-32768, 32768, dtype=np.int32)
+    value = pcm >> 3
+    mask = np.where(value >= 0, 0xD5, 0x55)
+    magnitude = np.where(value >= 0, value, -value - 1)
+    segment_ends = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+    segment = np.searchsorted(segment_ends, magnitude)
+    shift = np.maximum(segment, 1)
+    code = np.where(segment > 7, 0x7F, (np.minimum(segment, 7) << 4) | ((magnitude >> shift) & 0x0F))
+    encode = np.empty(65536, dtype=np.uint8)
+    encode[pcm.astype(np.int16).view(np.uint16)] = code ^ mask
+
+    codes = np.arange(256, dtype=np.int32) ^ 0x55
+    segment = (codes & 0x70) >> 4
+    base = ((codes & 0x0F) << 4) + np.where(segment == 0, 8, 0x108)
+    magnitude = np.where(segment > 1, base << np.maximum(segment - 1, 0), base)
+    decode = np.where(codes & 0x80, magnitude, -magnitude).astype('<i2')
+    return encode, decode
+
+
+MULAW_ENCODE, MULAW_DECODE = _mulaw_tables()
+ALAW_ENCODE, ALAW_DECODE = _alaw_tables()
+# Byte-per-sample codecs: (encode table, decode table)
+G711 = {CODEC_MULAW: (MULAW_ENCODE, MULAW_DECODE), CODEC_ALAW: (ALAW_ENCODE, ALAW_DECODE)}
+
+
+def g711_encode(codec, samples):
+    """int16 array -> mu-law or A-law bytes"""
+    return G711[codec][0][samples.astype(np.int16, copy=False).view(np.uint16)].tobytes()
+
+
+def g711_decode(codec, data):
+    """mu-law or A-law bytes -> int16 array"""
+    return G711[codec][1][np.frombuffer(data, dtype=np.uint8)]
+
+
+def mulaw_encode(samples):
+    return g711_encode(CODEC_MULAW, samples)
+
+
+def mulaw_decode(data):
+    return g711_decode(CODEC_MULAW, data)
+
+
+def _lowpass(cutoff):
+    """Hann-windowed sinc with unity DC gain; cutoff as a fraction of the input rate"""
+    n = np.arange(FILTER_TAPS) - (FILTER_TAPS - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hanning(FILTER_TAPS)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+class Resampler:
+    """Streaming sample-rate converter for int16 mono audio
+
+    Downsampling low-passes below the new Nyquist rate first; both
+    directions then interpolate linearly at the rate ratio, which for
+    24 kHz -> 8 kHz is plain decimation.
+    """
+
+    __slots__ = ("src_rate", "dst_rate", "step", "taps", "_history", "_last", "_pos")
+
+    def __init__(self, src_rate, dst_rate):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.step = src_rate / dst_rate
+        self.taps = _lowpass(0.45 * dst_rate / src_rate) if dst_rate < src_rate else None
+        self._history = np.zeros(FILTER_TAPS - 1, dtype=np.float32)
+        # Previous chunk's last sample, so interpolation spans chunk edges
+        self._last = np.zeros(1, dtype=np.float32)
+        # Next output position, in input samples relative to _last
+        self._pos = 1.0
+
+    def process(self, samples):
+        """int16 array in -> int16 array out"""
+        if self.src_rate == self.dst_rate:
+            return samples
+        x = samples.astype(np.float32)
+        if self.taps is not None:
+            padded = np.concatenate((self._history, x))
+            self._history = padded[len(padded) - (FILTER_TAPS - 1):]
+            x = np.convolve(padded, self.taps, mode='valid')
+        y = np.concatenate((self._last, x))
+        end = len(y) - 1
+        if self._pos > end:
+            count = 0
+        else:
+            count = int((end - self._pos) // self.step) + 1
+        positions = self._pos + self.step * np.arange(count)
+        index = positions.astype(np.int64)
+        frac = (positions - index).astype(np.float32)
+        upper = np.minimum(index + 1, end)
+        out = y[index] * (1 - frac) + y[upper] * frac
+        self._pos += self.step * count - end
+        self._last = y[end:]
+        return np.clip(np.rint(out), -32768, 32767).astype('<i2')
+
+
+def negotiate(offer, live_out_rate, live_in_rate):
+    """(audio_out, audio_in) AudioFormats for a client's start_call offer"""
+    default_out = AudioFormat(CODEC_PCM16, live_out_rate)
+    default_in = AudioFormat(CODEC_PCM16, live_in_rate)
+    if not isinstance(offer, dict):
+        return default_out, default_in
+    codecs = offer.get('codecs') or [CODEC_PCM16]
+    codec = next((c for c in codecs if c in CODECS), CODEC_PCM16)
+    try:
+        rate = int(offer.get('sample_rate') or live_out_rate)
+    except (TypeError, ValueError):
+        rate = live_out_rate
+    # Never upsample the agent's audio; that only costs bandwidth
+    out_rate = max((r for r in OUTPUT_RATES if r <= min(rate, live_out_rate)), default=OUTPUT_RATES[0])
+    in_rate = rate if rate in INPUT_RATES else live_in_rate
+    return AudioFormat(codec, out_rate), AudioFormat(codec, in_rate)
+
+
+class OutboundEncoder:
+    """Live PCM -> the client's codec and rate"""
+
+    __slots__ = ("format", "resampler")
+
+    def __init__(self, audio_format, source_rate):
+        self.format = audio_format
+        self.resampler = Resampler(source_rate, audio_format.sample_rate)
+
+    @property
+    def passthrough(self):
+        return self.format.codec == CODEC_PCM16 and self.resampler.step == 1
+
+    def encode(self, pcm):
+        if self.passthrough:
+            return pcm
+        samples = self.resampler.process(np.frombuffer(pcm, dtype='<i2'))
+        if self.format.codec in G711:
+            return g711_encode(self.format.codec, samples)
+        return samples.tobytes()
+
+
+class InboundDecoder:
+    """The client's codec and rate -> the PCM the Live API expects"""
+
+    __slots__ = ("format", "target_rate", "_resamplers")
+
+    def __init__(self, audio_format, target_rate):
+        self.format = audio_format
+        self.target_rate = target_rate
+        # One per source rate; frames carry their own rate
+        self._resamplers = {}
+
+    def decode(self, payload, sample_rate=None):
+        sample_rate = sample_rate or self.format.sample_rate
+        if self.format.codec == CODEC_PCM16 and sample_rate == self.target_rate:
+            return payload
+        if self.format.codec in G711:
+            samples = g711_decode(self.format.codec, payload)
+        else:
+            samples = np.frombuffer(payload[:len(payload) & ~1], dtype='<i2')
+        if sample_rate != self.target_rate:
+            if sample_rate not in INPUT_RATES:
+                raise ValueError(f"unsupported input sample rate {sample_rate}")
+            resampler = self._resamplers.get(sample_rate)
+            if resampler is None:
+                resampler = self._resamplers[sample_rate] = Resampler(sample_rate, self.target_rate)
+            samples = resampler.process(samples)
+        return samples.tobytes()
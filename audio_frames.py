@@ -0,0 +1,65 @@
+"""
+Binary Audio Frames
+===================
+Raw PCM audio sent as Socket.IO binary attachments instead of base64 JSON.
+
+Frame layout (network byte order):
+    version      uint8
+    call_id_len  uint8
+    sequence     uint32
+    sample_rate  uint32
+    timestamp    uint32 (media time in ms; version 2 only)
+    call_id      call_id_len bytes (UTF-8)
+    pcm          remaining bytes: 16-bit little-endian mono PCM, or the
+                 codec negotiated in start_call (see audio_codecs.py)
+"""
+
+import struct
+from collections import namedtuple
+
+FRAME_VERSION = 2
+FRAME_HEADER = struct.Struct('!BBIII')
+# Version 1 frames (no timestamp) are still accepted from older clients
+FRAME_HEADER_V1 = struct.Struct('!BBII')
+
+AudioFrame = namedtuple('AudioFrame', ['call_id', 'seq', 'sample_rate', 'timestamp_ms', 'pcm'])
+
+# Transports a client can ask for in start_call
+TRANSPORT_BINARY = 'binary'
+TRANSPORT_BASE64 = 'base64'
+
+
+class FrameError(ValueError):
+    """Raised for frames that cannot be decoded"""
+
+
+def encode_frame(call_id, seq, sample_rate, pcm, timestamp_ms=0):
+    """Pack a PCM chunk with its framing header"""
+    cid = call_id.encode('utf-8')
+    header = FRAME_HEADER.pack(
+        FRAME_VERSION, len(cid), seq & 0xFFFFFFFF, sample_rate, timestamp_ms & 0xFFFFFFFF
+    )
+    return b''.join((header, cid, pcm))
+
+
+def decode_frame(frame):
+    """Unpack a frame into an AudioFrame"""
+    if len(frame) < FRAME_HEADER_V1.size:
+        raise FrameError("frame shorter than header")
+    version = frame[0]
+    if version == FRAME_VERSION:
+        if len(frame) < FRAME_HEADER.size:
+            raise FrameError("frame shorter than header")
+        _, cid_len, seq, sample_rate, timestamp_ms = FRAME_HEADER.unpack_from(frame)
+        start = FRAME_HEADER.size
+    elif version == 1:
+        _, cid_len, seq, sample_rate = FRAME_HEADER_V1.unpack_from(frame)
+        timestamp_ms = 0
+        start = FRAME_HEADER_V1.size
+    else:
+        raise FrameError(f"unsupported frame version {version}")
+    end = start + cid_len
+    if len(frame) < end:
+        raise FrameError("truncated call_id")
+    call_id = bytes(frame[start:end]).decode('utf-8')
+    return AudioFrame(call_id, seq, sample_rate, timestamp_ms, bytes(frame[end:]))
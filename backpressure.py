@@ -0,0 +1,291 @@
+"""
+Backpressure
+============
+Bounds how much audio a call may buffer and sheds new calls when the
+worker is overloaded, so a slow client or a slow Live session degrades
+one call instead of every call.
+
+Each direction of a call has a bounded buffer and a policy for when it
+is full (AUDIO_IN_POLICY, AUDIO_OUT_POLICY):
+    drop_silence  drop the oldest silent chunk, else the oldest (default)
+    drop_oldest   drop the oldest chunk
+    coalesce      hand a consumer that fell behind everything queued as
+                  one chunk, so it catches up in one send; past the bound
+                  the oldest chunk is dropped
+    disconnect    end the call (reason overload or slow_consumer)
+
+    inbound   caller audio waiting for the Live session (InboundBuffer,
+              at most AUDIO_IN_MAX_MS)
+    outbound  agent audio waiting to be paced out (OutputPipeline in
+              jitter_buffer.py, at most AUDIO_OUT_MAX_MS). A Socket.IO
+              client with more than AUDIO_OUT_CLIENT_MAX_MS of packets
+              still unsent is slow: the pacer holds its audio until it
+              catches up, so the backlog stays in the bounded buffer
+              instead of the socket's unbounded queue. The backlog is
+              read from engine.io's per-socket queue (not public API) at
+              most every BACKLOG_SAMPLE_S; if this engine.io has no such
+              queue, slow clients go undetected (logged once).
+
+The LoadShedder samples the worker every SHED_SAMPLE_S: process CPU (in
+percent of one core, the GIL's limit) and queue depth (audio waiting in
+calls' inbound buffers and client sockets, plus emits waiting for the
+server hub). Once either passes its watermark, start_call answers
+call_rejected (reason busy) and /readyz fails, until both are back
+under SHED_RECOVER of their watermarks.
+
+Configuration (environment; 0 disables a watermark):
+    AUDIO_IN_MAX_MS          default 2000
+    AUDIO_IN_POLICY          default drop_silence
+    AUDIO_OUT_MAX_MS         default 20000
+    AUDIO_OUT_POLICY         default drop_silence
+    AUDIO_OUT_CLIENT_MAX_MS  default 1000
+    SHED_CPU_PCT             default 90
+    SHED_QUEUE_MS            default 30000
+    SHED_SAMPLE_S            default 1
+"""
+
+import asyncio
+import collections
+import os
+import time
+import logging
+
+import numpy as np
+
+from vad import VAD_ENERGY_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+POLICY_DROP_SILENCE = 'drop_silence'
+POLICY_DROP_OLDEST = 'drop_oldest'
+POLICY_COALESCE = 'coalesce'
+POLICY_DISCONNECT = 'disconnect'
+POLICIES = (POLICY_DROP_SILENCE, POLICY_DROP_OLDEST, POLICY_COALESCE, POLICY_DISCONNECT)
+
+
+def _policy(name, default):
+    policy = os.environ.get(name, default)
+    if policy not in POLICIES:
+        raise ValueError(f"{name} must be one of {', '.join(POLICIES)}, not {policy!r}")
+    return policy
+
+
+AUDIO_IN_MAX_MS = int(os.environ.get('AUDIO_IN_MAX_MS', 2000))
+AUDIO_IN_POLICY = _policy('AUDIO_IN_POLICY', POLICY_DROP_SILENCE)
+AUDIO_OUT_MAX_MS = int(os.environ.get('AUDIO_OUT_MAX_MS', 20000))
+AUDIO_OUT_POLICY = _policy('AUDIO_OUT_POLICY', POLICY_DROP_SILENCE)
+AUDIO_OUT_CLIENT_MAX_MS = int(os.environ.get('AUDIO_OUT_CLIENT_MAX_MS', 1000))
+SHED_CPU_PCT = float(os.environ.get('SHED_CPU_PCT', 90))
+SHED_QUEUE_MS = float(os.environ.get('SHED_QUEUE_MS', 30000))
+SHED_SAMPLE_S = float(os.environ.get('SHED_SAMPLE_S', 1))
+# Shedding stops once every signal is back under this share of its watermark
+SHED_RECOVER = 0.8
+# How stale a client's socket backlog may be (the pacer asks every frame)
+BACKLOG_SAMPLE_S = 0.1
+
+# What a buffer reports through on_shed(event, count)
+SHED_SILENCE = 'silence'
+SHED_OLDEST = 'oldest'
+SHED_COALESCED = 'coalesced'
+SHED_STALL = 'stall'
+SHED_DISCONNECT = 'disconnect'
+
+
+def silent_frames(pcm, frame_bytes, threshold=VAD_ENERGY_THRESHOLD):
+    """One flag per whole frame of 16-bit PCM: True where its RMS is below threshold"""
+    whole = len(pcm) - len(pcm) % frame_bytes
+    if not whole:
+        return np.zeros(0, dtype=bool)
+    samples = np.frombuffer(pcm, dtype='<i2', count=whole // 2).astype(np.float32)
+    samples = samples.reshape(-1, frame_bytes // 2)
+    return np.sqrt(np.mean(samples * samples, axis=1)) < threshold
+
+
+def is_silent(pcm, threshold=VAD_ENERGY_THRESHOLD):
+    """True if a chunk of 16-bit PCM is quiet throughout"""
+    flags = silent_frames(pcm, max(2, len(pcm) & ~1), threshold)
+    return bool(flags.size) and bool(flags.all())
+
+
+class InboundBuffer:
+    """Bounded queue of caller audio between the socket and the Live session
+
+    put() runs on the call's loop and never blocks; get() is awaited by
+    the one sender coroutine. on_shed(event, count) reports drops,
+    coalesced chunks and a disconnect verdict.
+    """
+
+    __slots__ = ("max_bytes", "bytes_per_ms", "policy", "on_shed", "chunks", "buffered",
+                 "closed", "_ready")
+
+    def __init__(self, sample_rate, max_ms=AUDIO_IN_MAX_MS, policy=AUDIO_IN_POLICY, on_shed=None):
+        self.bytes_per_ms = sample_rate * 2 / 1000
+        self.max_bytes = int(max_ms * self.bytes_per_ms)
+        self.policy = policy
+        self.on_shed = on_shed
+        self.chunks = collections.deque()
+        self.buffered = 0
+        self.closed = False
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @property
+    def depth_ms(self):
+        return self.buffered / self.bytes_per_ms
+
+    def put(self, data):
+        if self.closed:
+            return
+        self.chunks.append(data)
+        self.buffered += len(data)
+        if self.max_bytes and self.buffered > self.max_bytes:
+            self._shed()
+        self._ready.set()
+
+    def _shed(self):
+        if self.policy == POLICY_DISCONNECT:
+            self._report(SHED_DISCONNECT, 1)
+        # The newest chunk always stays; everything else may go
+        while self.buffered > self.max_bytes and len(self.chunks) > 1:
+            index = 0
+            event = SHED_OLDEST
+            if self.policy == POLICY_DROP_SILENCE:
+                for i in range(len(self.chunks) - 1):
+                    if is_silent(self.chunks[i]):
+                        index, event = i, SHED_SILENCE
+                        break
+            chunk = self.chunks[index]
+            del self.chunks[index]
+            self.buffered -= len(chunk)
+            self._report(event, 1)
+
+    def _report(self, event, count):
+        if self.on_shed is not None:
+            self.on_shed(event, count)
+
+    def close(self):
+        """Wake the consumer; get() returns None once the buffer is empty"""
+        self.closed = True
+        self._ready.set()
+
+    async def get(self):
+        """Next chunk (all of them, joined, under coalesce), or None once closed"""
+        while not self.chunks:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        if self.policy == POLICY_COALESCE and len(self.chunks) > 1:
+            count = len(self.chunks)
+            data = b''.join(self.chunks)
+            self.chunks.clear()
+            self._report(SHED_COALESCED, count - 1)
+        else:
+            data = self.chunks.popleft()
+        self.buffered -= len(data)
+        return data
+
+
+# Set once engine.io turns out not to expose its send queues
+_backlog_unsupported = False
+
+
+def client_backlog(server, sid):
+    """Packets engine.io holds for a Socket.IO client but has not written yet
+
+    0 when the client is not connected to this worker (its socket is
+    someone else's to watch), or when engine.io's internals are not the
+    ones this was written against.
+    """
+    global _backlog_unsupported
+    if sid is None or _backlog_unsupported:
+        return 0
+    try:
+        eio_sid = server.manager.eio_sid_from_sid(sid, '/')
+        socket = server.eio.sockets.get(eio_sid) if eio_sid is not None else None
+        return socket.queue.qsize() if socket is not None else 0
+    except AttributeError as e:
+        _backlog_unsupported = True
+        logger.warning("Cannot read Socket.IO send queues (%r); slow clients will not be detected", e)
+        return 0
+
+
+class BacklogSampler:
+    """Caches read() for interval seconds, so callers may ask every frame"""
+
+    __slots__ = ("read", "interval", "value", "_expires")
+
+    def __init__(self, read, interval=BACKLOG_SAMPLE_S):
+        self.read = read
+        self.interval = interval
+        self.value = 0
+        self._expires = 0.0
+
+    def __call__(self):
+        now = time.monotonic()
+        if now >= self._expires:
+            self.value = self.read()
+            self._expires = now + self.interval
+        return self.value
+
+
+class LoadShedder:
+    """Samples CPU and queue depth; says when new calls should be refused
+
+    queue_depth() returns the worker's audio backlog in ms.
+    """
+
+    def __init__(self, queue_depth, cpu_pct=SHED_CPU_PCT, queue_ms=SHED_QUEUE_MS,
+                 interval=SHED_SAMPLE_S):
+        self.queue_depth = queue_depth
+        self.watermarks = {"cpu": cpu_pct, "queue": queue_ms}
+        self.interval = interval
+        self.readings = {"cpu": 0.0, "queue": 0.0}
+        # Signal that tripped shedding, or None while calls are admitted
+        self.reason = None
+        self.episodes = 0
+        self._last = (time.monotonic(), time.process_time())
+
+    def sample(self):
+        now, cpu = time.monotonic(), time.process_time()
+        wall = now - self._last[0]
+        if wall > 0:
+            self.readings["cpu"] = 100 * (cpu - self._last[1]) / wall
+        self._last = (now, cpu)
+        self.readings["queue"] = self.queue_depth()
+
+        if self.reason is None:
+            for signal, mark in self.watermarks.items():
+                if mark and self.readings[signal] >= mark:
+                    self.reason = signal
+                    self.episodes += 1
+                    logger.warning("Shedding new calls: %s at %.0f (watermark %.0f)",
+                                   signal, self.readings[signal], mark)
+                    break
+        elif all(not mark or self.readings[signal] < mark * SHED_RECOVER
+                 for signal, mark in self.watermarks.items()):
+            logger.info("Admitting calls again (%s recovered)", self.reason)
+            self.reason = None
+        return self.reason
+
+    def run(self, sleep=time.sleep):
+        """Sample forever (sleep is socketio.sleep under a cooperative server)"""
+        if self.interval <= 0 or not any(self.watermarks.values()):
+            return
+        while True:
+            sleep(self.interval)
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Load sample failed")
+
+    def stats(self):
+        return {
+            "shedding": self.reason,
+            "episodes": self.episodes,
+            "cpu_pct": round(self.readings["cpu"], 1),
+            "queue_ms": round(self.readings["queue"], 1),
+            "watermarks": self.watermarks,
+        }
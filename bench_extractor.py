@@ -0,0 +1,155 @@
+"""
+Extractor Micro-benchmark
+=========================
+Times the per-fragment cost of the streaming extractor against the old
+extract_call_data logic, and counts what each finds.
+
+Agent lines come from recorded calls in the call store when there are
+any (CALL_STORE_PATH, default calls.db), otherwise from built-in sample
+transcripts. Each line is split into small random fragments the way the
+Live API streams text, so IDs split across fragments show up too.
+
+    python bench_extractor.py
+    python bench_extractor.py --db calls.db --repeat 50
+"""
+
+import argparse
+import os
+import random
+import re
+import time
+
+from call_store import SQLiteCallStore
+from extractors import StreamingExtractor, apply_records
+
+SAMPLE_TRANSCRIPTS = {
+    "restaurant": [
+        "Hello! Welcome to GourmetEats. Today we have Margherita Pizza: $12.99 and Cheeseburger Deluxe for $9.99.",
+        "Great choice. One Margherita Pizza with extra cheese and a Caesar Salad: $7.99.",
+        "Your total is $20.98 and delivery takes 30 to 45 minutes to 123 Main Street.",
+        "Your order is confirmed. Your order ID is ORD-FOOD-48213. Enjoy your meal!",
+    ],
+    "hospital": [
+        "Good afternoon, HealthCare Plus. How can I help you today?",
+        "For chest pains I recommend Cardiology. I can book an appointment for next Tuesday at 2:00 PM.",
+        "Thank you John. Your appointment ID is APT-HEAL-3391. Please bring your insurance card.",
+    ],
+    "techsupport": [
+        "Hi, this is TechFix Support. Could I have your name?",
+        "Please restart your router and forget the network, then reconnect.",
+        "I've created a support ticket for you, the number is TECH-55120.",
+    ],
+    "travel": [
+        "Flights to Paris on the 15th start at $649 in economy.",
+        "I recommend Hotel Eiffel Tower View at $240 a night.",
+        "You're all set, your booking reference is BKG-TRIP-7730.",
+    ],
+    "support": [
+        "I'm sorry about the wrong item on order ORD-12345.",
+        "I've arranged an exchange. Your ticket number is TKT-HELP-9087.",
+    ],
+}
+
+
+def legacy_extract(service, text, metadata):
+    """The extract_call_data logic this replaced, kept for comparison"""
+    text_lower = text.lower()
+    if service == "restaurant":
+        if "order id" in text_lower or "order number" in text_lower:
+            order_id = re.search(r'(?:order (?:id|number)[:\s]+)?([A-Z0-9-]+)', text, re.IGNORECASE)
+            if order_id:
+                metadata["order_id"] = order_id.group(1)
+    elif service == "hospital":
+        if "appointment" in text_lower:
+            metadata["has_appointment"] = True
+    elif service == "techsupport":
+        if "ticket" in text_lower or "tech-" in text_lower:
+            ticket = re.search(r'TECH-\d+', text, re.IGNORECASE)
+            if ticket:
+                metadata["ticket_id"] = ticket.group(0)
+
+
+def load_recorded(db_path, limit):
+    """Agent lines per call from a SQLite call store, if present"""
+    if not os.path.exists(db_path):
+        return []
+    store = SQLiteCallStore(db_path)
+    try:
+        calls, _ = store.query_calls(limit=limit, include_transcript=True)
+    finally:
+        store.close()
+    recorded = []
+    for call in calls:
+        lines = [entry["text"] for entry in call["transcript"] if entry["speaker"] == "Agent"]
+        if lines:
+            recorded.append((call["service"], lines))
+    return recorded
+
+
+def fragment(line, rng):
+    """Split a line into 3-25 character pieces like streamed text"""
+    pieces = []
+    i = 0
+    while i < len(line):
+        step = rng.randint(3, 25)
+        pieces.append(line[i:i + step])
+        i += step
+    return pieces
+
+
+def bench(calls, repeat):
+    fragments = sum(len(turn) for _, turns in calls for turn in turns) * repeat
+
+    started = time.perf_counter()
+    legacy_found = 0
+    for _ in range(repeat):
+        for service, turns in calls:
+            metadata = {}
+            for turn in turns:
+                for piece in turn:
+                    legacy_extract(service, piece, metadata)
+            legacy_found += len(metadata)
+    legacy_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    streaming_found = 0
+    for _ in range(repeat):
+        for service, turns in calls:
+            metadata = {}
+            extractor = StreamingExtractor(service)
+            for turn in turns:
+                for piece in turn:
+                    apply_records(metadata, extractor.feed(piece))
+                apply_records(metadata, extractor.flush())
+            streaming_found += len(metadata)
+    streaming_s = time.perf_counter() - started
+
+    return fragments, (legacy_s, legacy_found // repeat), (streaming_s, streaming_found // repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extractor micro-benchmark")
+    parser.add_argument("--db", default=os.environ.get("CALL_STORE_PATH", "calls.db"))
+    parser.add_argument("--calls", type=int, default=500, help="recorded calls to load")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    recorded = load_recorded(args.db, args.calls)
+    source = f"{len(recorded)} recorded calls from {args.db}"
+    if not recorded:
+        recorded = list(SAMPLE_TRANSCRIPTS.items())
+        source = "built-in sample transcripts"
+    calls = [(service, [fragment(line, rng) for line in lines]) for service, lines in recorded]
+
+    fragments, (legacy_s, legacy_found), (streaming_s, streaming_found) = bench(calls, args.repeat)
+    print("=" * 60)
+    print(f"🔬 Extractor benchmark: {source}, {fragments} fragments")
+    print("=" * 60)
+    print(f"  legacy     {1e6 * legacy_s / fragments:7.2f} µs/fragment   {legacy_found} fields found")
+    print(f"  streaming  {1e6 * streaming_s / fragments:7.2f} µs/fragment   {streaming_found} fields found")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Server Mode Benchmark
+=====================
+Starts the app once per server mode (offline, LIVE_BACKEND=fake) and
+compares:
+- connection capacity: how many idle Socket.IO WebSocket connections
+  the server accepts, how long each connect takes, and the server's
+  RSS and thread count while holding them
+- event latency: round trip of a dashboard subscribe -> stats_update
+  on a few probe connections while the idle ones stay open
+- call latency: a load_test.py run of simulated callers on top
+
+Idle connections are raw engine.io WebSockets on one thread, so the
+benchmark itself stays cheap at thousands of connections.
+
+    python bench_server_modes.py
+    python bench_server_modes.py --connections 2000 --callers 40 --json modes.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+import requests
+import websocket
+
+from load_test import run_load, scrape_process_metrics, percentile, _ms
+
+MODES = ("threading", "eventlet")
+
+
+def start_server(mode, port, workdir):
+    env = dict(os.environ, SERVER_MODE=mode, SERVER_DEBUG="0", LIVE_BACKEND="fake", PORT=str(port),
+               CALL_STORE_PATH=os.path.join(workdir, f"calls-{mode}.db"))
+    env.setdefault("GEMINI_API_KEY", "offline")
+    # Plain HTTP in every mode so TLS does not skew the comparison
+    code = "import app, server_mode; server_mode.serve(app.socketio, app.app, port=%d)" % port
+    process = subprocess.Popen([sys.executable, "-c", code], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{url}/metrics", timeout=1)
+            return process, url
+        except requests.RequestException:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def open_socket(url, timeout):
+    """Engine.io v4 over WebSocket, connected to the default namespace"""
+    ws = websocket.create_connection(
+        url.replace("http", "ws", 1) + "/socket.io/?EIO=4&transport=websocket", timeout=timeout)
+    if not ws.recv().startswith("0"):
+        raise ConnectionError("no engine.io open packet")
+    ws.send("40")
+    while not ws.recv().startswith("40"):
+        pass
+    return ws
+
+
+def event_round_trip(ws, timeout):
+    started = time.monotonic()
+    ws.send('42["subscribe_dashboard"]')
+    deadline = started + timeout
+    while time.monotonic() < deadline:
+        message = ws.recv()
+        if message == "2":
+            ws.send("3")
+        elif message.startswith('42["stats_update"'):
+            return time.monotonic() - started
+    return None
+
+
+def server_threads(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def bench_mode(mode, port, args, workdir):
+    process, url = start_server(mode, port, workdir)
+    result = {"mode": mode}
+    idle = []
+    try:
+        baseline = scrape_process_metrics(url, True) or {}
+        connect_times = []
+        failures = 0
+        started = time.monotonic()
+        for _ in range(args.connections):
+            t0 = time.monotonic()
+            try:
+                idle.append(open_socket(url, args.timeout))
+                connect_times.append(time.monotonic() - t0)
+            except Exception:
+                failures += 1
+                if failures >= args.max_failures:
+                    break
+        result["connections_open"] = len(idle)
+        result["connect_failures"] = failures
+        result["connect_s"] = round(time.monotonic() - started, 2)
+        result["connect_p50_ms"] = _ms(percentile(connect_times, 0.5))
+        result["connect_p99_ms"] = _ms(percentile(connect_times, 0.99))
+
+        held = scrape_process_metrics(url, True) or {}
+        result["server_threads"] = server_threads(process.pid)
+        if baseline and held:
+            rss = held["process_resident_memory_bytes"]
+            result["server_rss_mb"] = round(rss / 2**20, 1)
+            if idle:
+                per_conn = (rss - baseline["process_resident_memory_bytes"]) / len(idle)
+                result["rss_kb_per_connection"] = round(per_conn / 1024, 1)
+
+        round_trips = []
+        for _ in range(args.probes):
+            probe = open_socket(url, args.timeout)
+            for _ in range(args.probe_rounds):
+                rtt = event_round_trip(probe, args.timeout)
+                if rtt is not None:
+                    round_trips.append(rtt)
+            probe.close()
+        result["event_rtt_p50_ms"] = _ms(percentile(round_trips, 0.5))
+        result["event_rtt_p99_ms"] = _ms(percentile(round_trips, 0.99))
+
+        if args.callers:
+            load = run_load(types.SimpleNamespace(
+                url=url, callers=args.callers, turns=args.turns, service="all", ramp=args.ramp,
+                speech_ms=1500, silence_ms=1000, insecure=False, codec="pcm16", sample_rate=None,
+            ))
+            for key in ("completed", "errors", "turn_latency_p50_ms", "turn_latency_p99_ms",
+                        "first_audio_p50_ms", "first_audio_p99_ms", "server_cpu_pct"):
+                result[f"calls_{key}"] = load.get(key)
+    finally:
+        for ws in idle:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare server modes (threading vs cooperative)")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma separated server modes")
+    parser.add_argument("--connections", type=int, default=1000, help="idle connections to open")
+    parser.add_argument("--max-failures", type=int, default=20, help="stop opening after this many")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--probes", type=int, default=5)
+    parser.add_argument("--probe-rounds", type=int, default=20)
+    parser.add_argument("--callers", type=int, default=20, help="simulated callers (0 skips)")
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--ramp", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=5700)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    print("=" * 60)
+    print(f"🏁 Server modes: {', '.join(modes)} | {args.connections} idle connections, "
+          f"{args.callers} callers")
+    print("=" * 60)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for offset, mode in enumerate(modes):
+            print(f"\n▶️  {mode} ...")
+            results.append(bench_mode(mode, args.port + offset, args, workdir))
+
+    keys = [key for key in results[0] if key != "mode"]
+    print("\n" + f"{'':26}" + "".join(f"{r['mode']:>14}" for r in results))
+    for key in keys:
+        print(f"  {key:24}" + "".join(f"{str(r.get(key)):>14}" for r in results))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
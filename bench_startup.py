@@ -0,0 +1,182 @@
+"""
+Startup Benchmark
+=================
+Tracks how quickly a fresh worker can take calls (offline,
+LIVE_BACKEND=fake):
+- import: wall time of `import app` in a new interpreter, next to a
+  bare interpreter start
+- healthz: process spawn -> first 200 from /healthz (the port is bound)
+- readyz: process spawn -> first 200 from /readyz (client built, session
+  pools warm), plus the warm-up step timings the server reports
+
+Each is the median over --runs fresh processes. With --baseline it exits
+non-zero when a number grew past the tolerance, so it can gate CI.
+
+    python bench_startup.py
+    python bench_startup.py --runs 10 --json startup.json
+    python bench_startup.py --baseline startup.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+# Timed in the child; os._exit skips the engine drain at exit
+IMPORT_CODE = """
+import json, os, time
+started = time.perf_counter()
+import app
+print(json.dumps({"import_ms": 1000 * (time.perf_counter() - started)}), flush=True)
+os._exit(0)
+"""
+SERVE_CODE = "import app, server_mode; server_mode.serve(app.socketio, app.app, port=%d)"
+# Compared against a baseline; all of them are worse when larger
+METRICS = ("import_ms", "healthz_ms", "readyz_ms")
+# Children import the app from here, wherever the benchmark is run from
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def child_env(args, workdir):
+    env = dict(os.environ, SERVER_MODE=args.mode, SERVER_DEBUG="0", LIVE_BACKEND="fake",
+               CALL_STORE_PATH=os.path.join(workdir, "calls.db"))
+    env.setdefault("GEMINI_API_KEY", "offline")
+    return env
+
+
+def time_interpreter():
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return 1000 * (time.perf_counter() - started)
+
+
+def time_import(env):
+    out = subprocess.run([sys.executable, "-c", IMPORT_CODE], env=env, cwd=APP_DIR, check=True,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])["import_ms"]
+
+
+def time_ready(env, port, timeout):
+    """(healthz_ms, readyz_ms, warm-up stats) for one server start"""
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", SERVE_CODE % port], env=env, cwd=APP_DIR,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    healthz_ms = readyz_ms = None
+    warmup = None
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline and process.poll() is None:
+            try:
+                if healthz_ms is None:
+                    if requests.get(f"{url}/healthz", timeout=1).status_code == 200:
+                        healthz_ms = 1000 * (time.perf_counter() - started)
+                    continue
+                response = requests.get(f"{url}/readyz", timeout=1)
+                if response.status_code == 200:
+                    readyz_ms = 1000 * (time.perf_counter() - started)
+                    warmup = response.json().get("warmup")
+                    break
+            except requests.RequestException:
+                pass
+            time.sleep(0.01)
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    if readyz_ms is None:
+        raise RuntimeError(f"server on port {port} was not ready within {timeout}s")
+    return healthz_ms, readyz_ms, warmup
+
+
+def run_bench(args):
+    samples = {metric: [] for metric in METRICS}
+    warmups = []
+    interpreter = [time_interpreter() for _ in range(args.runs)]
+    with tempfile.TemporaryDirectory() as workdir:
+        env = child_env(args, workdir)
+        for run in range(args.runs):
+            samples["import_ms"].append(time_import(env))
+            healthz_ms, readyz_ms, warmup = time_ready(env, args.port + run, args.timeout)
+            samples["healthz_ms"].append(healthz_ms)
+            samples["readyz_ms"].append(readyz_ms)
+            warmups.append(warmup or {})
+    steps = {}
+    for warmup in warmups:
+        for name, ms in warmup.get("steps_ms", {}).items():
+            steps.setdefault(name, []).append(ms)
+    report = {
+        "runs": args.runs,
+        "mode": args.mode,
+        "python": sys.version.split()[0],
+        "interpreter_ms": round(statistics.median(interpreter), 1),
+    }
+    for metric, values in samples.items():
+        report[metric] = round(statistics.median(values), 1)
+        report[metric.replace("_ms", "_min_ms")] = round(min(values), 1)
+    report["warmup_steps_ms"] = {name: round(statistics.median(ms), 1) for name, ms in steps.items()}
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Regressions against a baseline report: (metric, old, new) rows"""
+    regressions = []
+    for metric in METRICS:
+        before, after = baseline.get(metric), report.get(metric)
+        if before is None or after is None:
+            continue
+        # Allow tolerance, plus a little scheduler noise on small numbers
+        if after > before * (1 + tolerance) + 20:
+            regressions.append((metric, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and time-to-ready of the server")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--mode", default="threading", choices=["threading", "eventlet", "gevent"])
+    parser.add_argument("--port", type=int, default=5800, help="first port (one per run)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for /readyz")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed growth over the baseline (default 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"⏱️  Startup: {args.runs} run(s), {args.mode} server, offline backend")
+    print("=" * 60)
+    report = run_bench(args)
+
+    print(f"  interpreter start     {report['interpreter_ms']:8.1f} ms")
+    print(f"  import app            {report['import_ms']:8.1f} ms  (min {report['import_min_ms']:.1f})")
+    print(f"  /healthz up           {report['healthz_ms']:8.1f} ms  (min {report['healthz_min_ms']:.1f})")
+    print(f"  /readyz ready         {report['readyz_ms']:8.1f} ms  (min {report['readyz_min_ms']:.1f})")
+    for name, ms in report["warmup_steps_ms"].items():
+        print(f"    warm-up {name:13} {ms:8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📝 Report written to {args.json}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n📉 {len(regressions)} regression(s) against {args.baseline}:")
+            for metric, before, after in regressions:
+                print(f"  {metric}: {before} -> {after}")
+            raise SystemExit(1)
+        print(f"\n✅ No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Shared Call Engine
+==================
+Hosts AI call sessions as asyncio tasks on a fixed pool of event-loop
+workers instead of starting a thread and an event loop for every call.
+
+Each worker is one OS thread running one long-lived event loop. Calls are
+placed on the least loaded worker, up to a per-worker limit (admission
+control). Shutdown stops admitting calls, lets live calls drain for a
+grace period, then ends whatever is left.
+
+Workers can also own a pool of pre-opened Live sessions (see
+session_pool.py); calls are then steered to a worker with an idle session
+for their service when one has room.
+
+Ending a call cancels its session task and waits for it to unwind, so
+nothing it opened outlives the call (see lifecycle.py).
+"""
+
+import asyncio
+import os
+import threading
+import time
+import logging
+
+from lifecycle import REASON_HANGUP, REASON_SHUTDOWN, TEARDOWN_TIMEOUT_S
+
+logger = logging.getLogger(__name__)
+
+# Engine configuration
+ENGINE_WORKERS = int(os.environ.get('CALL_ENGINE_WORKERS', os.cpu_count() or 1))
+MAX_CALLS_PER_WORKER = int(os.environ.get('MAX_CALLS_PER_WORKER', 100))
+
+
+class EngineFull(Exception):
+    """Raised when no worker can admit another call"""
+
+
+class EngineWorker:
+    """One event loop thread hosting many call tasks"""
+
+    def __init__(self, index, max_calls):
+        self.index = index
+        self.max_calls = max_calls
+        self.loop = asyncio.new_event_loop()
+        self.calls = {}
+        self.tasks = {}
+        # Pre-opened sessions bound to this worker's loop (optional)
+        self.session_pool = None
+        self.thread = threading.Thread(
+            target=self._run, name=f"call-engine-{index}", daemon=True
+        )
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    @property
+    def load(self):
+        return len(self.calls)
+
+    def has_capacity(self):
+        return self.load < self.max_calls
+
+    def pooled_sessions(self, service):
+        if self.session_pool is None:
+            return 0
+        return self.session_pool.available(service)
+
+
+class CallEngine:
+    """Fixed pool of event-loop workers that run call agents as tasks"""
+
+    def __init__(self, workers=ENGINE_WORKERS, max_calls_per_worker=MAX_CALLS_PER_WORKER,
+                 pool_factory=None, on_finished=None):
+        self.workers = [EngineWorker(i, max_calls_per_worker) for i in range(max(1, workers))]
+        # Called with each worker to build its session pool
+        self.pool_factory = pool_factory
+        # Called as on_finished(agent, error) on the worker loop when a
+        # call's session task returns, fails or is cancelled
+        self.on_finished = on_finished
+        self.accepting = False
+        self._lock = threading.Lock()
+
+    def start(self, pools=True):
+        """Start all worker loops (and their session pools unless pools=False)"""
+        for worker in self.workers:
+            worker.thread.start()
+        if pools:
+            self.start_pools()
+        self.accepting = True
+        logger.info("Call engine started: %d workers x %d calls",
+                    len(self.workers), self.workers[0].max_calls)
+
+    def start_pools(self):
+        """Start filling each worker's session pool (safe from any thread)"""
+        if self.pool_factory is None:
+            return
+        for worker in self.workers:
+            if worker.session_pool is None:
+                worker.session_pool = self.pool_factory(worker)
+                asyncio.run_coroutine_threadsafe(worker.session_pool.run(), worker.loop)
+
+    @property
+    def alive(self):
+        """Every worker loop thread is still running"""
+        return all(worker.thread.is_alive() for worker in self.workers)
+
+    @property
+    def pools_warm(self):
+        """Every worker's session pool has filled once (True without pools)"""
+        if self.pool_factory is None:
+            return True
+        return all(worker.session_pool is not None and worker.session_pool.warm
+                   for worker in self.workers)
+
+    @property
+    def capacity(self):
+        return sum(worker.max_calls for worker in self.workers)
+
+    @property
+    def active_calls(self):
+        return sum(worker.load for worker in self.workers)
+
+    def submit(self, agent):
+        """Place an agent on the least loaded worker and start its session"""
+        with self._lock:
+            if not self.accepting:
+                raise EngineFull("engine is shutting down")
+            candidates = [w for w in self.workers if w.has_capacity()]
+            if not candidates:
+                raise EngineFull("all workers at capacity")
+            # Prefer a worker holding a warm session for this service
+            service = getattr(agent, 'service_type', None)
+            worker = min(candidates, key=lambda w: (not w.pooled_sessions(service), w.load))
+            # Reserve the slot now so concurrent submits see it
+            worker.calls[agent.call_id] = agent
+        agent.loop = worker.loop
+        agent.worker = worker
+        asyncio.run_coroutine_threadsafe(self._start(worker, agent), worker.loop)
+        return worker
+
+    async def _start(self, worker, agent):
+        task = asyncio.create_task(agent.run_session())
+        worker.tasks[agent.call_id] = task
+        task.add_done_callback(lambda t: self._finished(worker, agent, t))
+
+    def _finished(self, worker, agent, task):
+        with self._lock:
+            worker.calls.pop(agent.call_id, None)
+            worker.tasks.pop(agent.call_id, None)
+        error = None if task.cancelled() else task.exception()
+        if error is not None:
+            logger.error("Call %s ended with error: %r", agent.call_id, error)
+        if self.on_finished is not None:
+            try:
+                self.on_finished(agent, error)
+            except Exception:
+                logger.exception("on_finished failed for call %s", agent.call_id)
+
+    def end_call(self, agent, reason=REASON_HANGUP, timeout=2 * TEARDOWN_TIMEOUT_S):
+        """End a call from any thread and wait for its teardown
+
+        Returns False if the session task was still running afterwards.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._end(agent, reason), agent.loop)
+        return future.result(timeout)
+
+    async def _end(self, agent, reason):
+        try:
+            await agent.end_call(reason)
+        finally:
+            task = agent.worker.tasks.get(agent.call_id)
+            if task is not None and not task.done():
+                task.cancel()
+                # Let its finally blocks close the session and child tasks
+                await asyncio.wait({task}, timeout=TEARDOWN_TIMEOUT_S)
+        return task is None or task.done()
+
+    def stats(self):
+        """Per-worker load snapshot"""
+        return {
+            "workers": len(self.workers),
+            "max_calls_per_worker": self.workers[0].max_calls,
+            "active_calls": self.active_calls,
+            "loads": [worker.load for worker in self.workers],
+            "accepting": self.accepting,
+            "session_pools": [worker.session_pool.stats() for worker in self.workers
+                              if worker.session_pool is not None],
+        }
+
+    def shutdown(self, drain_timeout=30):
+        """Stop admitting calls, drain live ones, then stop the workers"""
+        with self._lock:
+            self.accepting = False
+        deadline = time.monotonic() + drain_timeout
+        while self.active_calls and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+        # End whatever did not finish on its own
+        for worker in self.workers:
+            if not worker.loop.is_running():
+                continue
+            if worker.session_pool is not None:
+                future = asyncio.run_coroutine_threadsafe(worker.session_pool.close(), worker.loop)
+                try:
+                    future.result(5)
+                except Exception as e:
+                    logger.warning("Worker %d session pool did not close cleanly: %r", worker.index, e)
+            remaining = list(worker.calls.values())
+            if remaining:
+                future = asyncio.run_coroutine_threadsafe(
+                    self._end_all(remaining), worker.loop
+                )
+                try:
+                    future.result(5)
+                except Exception as e:
+                    logger.warning("Worker %d did not stop cleanly: %r", worker.index, e)
+            worker.loop.call_soon_threadsafe(worker.loop.stop)
+
+        for worker in self.workers:
+            if worker.thread.is_alive():
+                worker.thread.join(5)
+        logger.info("Call engine stopped")
+
+    async def _end_all(self, agents):
+        await asyncio.gather(*(self._end(agent, REASON_SHUTDOWN) for agent in agents),
+                             return_exceptions=True)
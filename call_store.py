@@ -0,0 +1,604 @@
+"""
+Call Store
+==========
+Persistent storage for completed calls, replacing the in-memory
+call_logs / orders_db / appointments_db / support_tickets lists.
+
+Backends:
+- SQLiteCallStore (default): SQLite in WAL mode. Writes go through a
+  bounded, batched write-behind queue on a background thread, so end_call
+  never waits on disk. Calls, transcript entries and extracted metadata
+  live in separate indexed tables.
+- MemoryCallStore: bounded in-process store for demos and tests.
+
+Select with CALL_STORE=sqlite|memory and CALL_STORE_PATH. Saving takes a
+snapshot of the call, so the caller may keep changing its dict.
+
+Listing is paginated newest first: query_calls() returns a page plus an
+opaque cursor for the next page, and leaves transcripts out unless asked.
+
+Transcripts are searchable while calls are still live: each finished
+utterance is passed to index_utterance() as the call goes, and search()
+returns calls ranked by relevance with highlighted snippets. SQLite keeps
+an FTS5 index (bm25 ranking) fed by the same write-behind queue; the
+memory backend scans its bounded utterance list.
+"""
+
+import copy
+import html
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Store configuration
+CALL_STORE = os.environ.get('CALL_STORE', 'sqlite')
+CALL_STORE_PATH = os.environ.get('CALL_STORE_PATH', 'calls.db')
+WRITE_BATCH_SIZE = int(os.environ.get('CALL_STORE_BATCH_SIZE', 100))
+WRITE_FLUSH_INTERVAL = float(os.environ.get('CALL_STORE_FLUSH_INTERVAL', 0.5))
+# Writes waiting for disk; past this, new ones are dropped (and logged)
+WRITE_QUEUE_MAX = int(os.environ.get('CALL_STORE_QUEUE_MAX', 10000))
+MEMORY_STORE_MAX_CALLS = int(os.environ.get('MEMORY_STORE_MAX_CALLS', 10000))
+DEFAULT_PAGE_SIZE = 50
+# Utterances the memory backend keeps searchable
+MEMORY_STORE_MAX_UTTERANCES = 20 * MEMORY_STORE_MAX_CALLS
+# Words of context around a search hit
+SNIPPET_TOKENS = 12
+
+# Where end_call files each call
+CATEGORY_ORDERS = 'orders'
+CATEGORY_APPOINTMENTS = 'appointments'
+CATEGORY_TICKETS = 'tickets'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    call_id TEXT NOT NULL UNIQUE,
+    service TEXT NOT NULL,
+    category TEXT NOT NULL,
+    status TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_calls_category ON calls (category, id);
+CREATE INDEX IF NOT EXISTS idx_calls_service_status ON calls (service, status, id);
+CREATE INDEX IF NOT EXISTS idx_calls_start_time ON calls (start_time);
+
+CREATE TABLE IF NOT EXISTS transcript_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    call_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    speaker TEXT NOT NULL,
+    text TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transcript_call ON transcript_entries (call_id, seq);
+
+CREATE TABLE IF NOT EXISTS call_metadata (
+    call_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (call_id, key)
+);
+"""
+
+# Utterances indexed as calls go; the other columns are only filtered on
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS transcript_fts USING fts5(
+    text, call_id UNINDEXED, service UNINDEXED, start_time UNINDEXED,
+    speaker UNINDEXED, timestamp UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# Snippet highlight markers, swapped for <mark> after HTML escaping
+_HIT_OPEN, _HIT_CLOSE = '\x02', '\x03'
+_WORD = re.compile(r'\w+')
+
+
+class CallStore:
+    """Interface shared by all storage backends"""
+
+    def save_call(self, call_data, category):
+        """Persist a snapshot of a completed call without blocking the caller"""
+        raise NotImplementedError
+
+    def query_calls(self, category=None, service=None, status=None, since=None,
+                    cursor=None, limit=DEFAULT_PAGE_SIZE, include_transcript=False):
+        """One page of calls, newest first; returns (calls, next_cursor)"""
+        raise NotImplementedError
+
+    def get_call(self, call_id):
+        raise NotImplementedError
+
+    def get_transcript(self, call_id):
+        """Transcript entries of a stored call, or None if unknown"""
+        call = self.get_call(call_id)
+        return list(call["transcript"]) if call else None
+
+    def group_counts(self):
+        """(service, status, category, count) rows used to seed live stats"""
+        raise NotImplementedError
+
+    def index_utterance(self, call, seq, speaker, text, timestamp):
+        """Make one finished utterance of a (live) call searchable"""
+        raise NotImplementedError
+
+    def search(self, query, service=None, since=None, limit=DEFAULT_PAGE_SIZE):
+        """Calls whose transcript matches every word of query, best first
+
+        Each result has call_id, service, start_time, score (higher is
+        better), hits and an HTML snippet with the matches in <mark>.
+        Words ending in * match as prefixes. Raises ValueError for an
+        empty query.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Flush and release resources"""
+
+
+class MemoryCallStore(CallStore):
+    """Bounded in-memory backend; oldest calls are evicted first"""
+
+    def __init__(self, max_calls=MEMORY_STORE_MAX_CALLS, max_utterances=MEMORY_STORE_MAX_UTTERANCES):
+        self.calls = deque(maxlen=max_calls)
+        self.utterances = deque(maxlen=max_utterances)
+        self.next_id = 1
+        self._lock = threading.Lock()
+
+    def save_call(self, call_data, category):
+        with self._lock:
+            self.calls.append((self.next_id, category, snapshot(call_data)))
+            self.next_id += 1
+
+    def query_calls(self, category=None, service=None, status=None, since=None,
+                    cursor=None, limit=DEFAULT_PAGE_SIZE, include_transcript=False):
+        before = parse_cursor(cursor)
+        page = []
+        with self._lock:
+            for row_id, cat, call in reversed(self.calls):
+                if before is not None and row_id >= before:
+                    continue
+                if category is not None and cat != category:
+                    continue
+                if service is not None and call["service"] != service:
+                    continue
+                if status is not None and call["status"] != status:
+                    continue
+                if since is not None and call["start_time"] < since:
+                    continue
+                page.append((row_id, call))
+                if len(page) > limit:
+                    break
+        next_cursor = str(page[limit - 1][0]) if len(page) > limit else None
+        return [project(call, include_transcript) for _, call in page[:limit]], next_cursor
+
+    def get_call(self, call_id):
+        with self._lock:
+            for _, _, call in self.calls:
+                if call.get("call_id") == call_id:
+                    return project(call, include_transcript=True)
+        return None
+
+    def group_counts(self):
+        counts = {}
+        with self._lock:
+            for _, category, call in self.calls:
+                key = (call["service"], call["status"], category)
+                counts[key] = counts.get(key, 0) + 1
+        return [(*key, n) for key, n in counts.items()]
+
+    def index_utterance(self, call, seq, speaker, text, timestamp):
+        with self._lock:
+            self.utterances.append((call["call_id"], call["service"], call["start_time"], speaker, text))
+
+    def search(self, query, service=None, since=None, limit=DEFAULT_PAGE_SIZE):
+        terms = parse_query(query)
+        patterns = [re.compile(r'\b' + r'\W+'.join(map(re.escape, words)) + (r'\w*' if prefix else r'\b'),
+                               re.IGNORECASE) for words, prefix in terms]
+        found = {}
+        with self._lock:
+            utterances = list(self.utterances)
+        for call_id, call_service, start_time, speaker, text in utterances:
+            if service is not None and call_service != service:
+                continue
+            if since is not None and start_time < since:
+                continue
+            counts = [len(pattern.findall(text)) for pattern in patterns]
+            if not all(counts):
+                continue
+            score = float(sum(counts))
+            best = found.get(call_id)
+            if best is None or score > best["score"]:
+                found[call_id] = {
+                    "call_id": call_id, "service": call_service, "start_time": start_time,
+                    "score": score, "hits": best["hits"] if best else 0, "speaker": speaker,
+                    "snippet": _highlight(text, patterns),
+                }
+            found[call_id]["hits"] += 1
+        results = sorted(found.values(), key=lambda r: (-r["score"], r["call_id"]))
+        return results[:limit]
+
+
+class SQLiteCallStore(CallStore):
+    """SQLite (WAL) backend with a batched write-behind queue"""
+
+    def __init__(self, path=CALL_STORE_PATH, batch_size=WRITE_BATCH_SIZE,
+                 flush_interval=WRITE_FLUSH_INTERVAL, queue_max=WRITE_QUEUE_MAX):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(queue_max)
+        self._local = threading.local()
+        self.writes = 0
+        self.write_errors = 0
+        self.dropped = 0
+        # Started on the first write, so a process that never stores a
+        # call (a reloader's watcher, a script) runs no writer thread
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self.fts = self._create_fts(conn)
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _create_fts(self, conn):
+        try:
+            conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning("SQLite has no FTS5 (%s); transcript search is disabled", e)
+            return False
+        # Index calls stored before the search index existed
+        if conn.execute("SELECT 1 FROM transcript_fts LIMIT 1").fetchone() is None:
+            conn.execute(
+                "INSERT INTO transcript_fts (text, call_id, service, start_time, speaker, timestamp) "
+                "SELECT t.text, t.call_id, c.service, c.start_time, t.speaker, t.timestamp "
+                "FROM transcript_entries t JOIN calls c ON c.call_id = t.call_id")
+        return True
+
+    def _reader(self):
+        # WAL lets each request thread read while the writer commits
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # Writes
+
+    def save_call(self, call_data, category):
+        # The writer runs later; the caller's dict may have changed by then
+        self._enqueue(('call', category, snapshot(call_data)))
+
+    def index_utterance(self, call, seq, speaker, text, timestamp):
+        if self.fts:
+            self._enqueue(('utterance', None, (
+                text, call["call_id"], call["service"], call["start_time"], speaker, timestamp)))
+
+    def _enqueue(self, item):
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(
+                        target=self._write_loop, name="call-store-writer", daemon=True
+                    )
+                    self._writer.start()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # The disk is not keeping up; losing a write beats stalling calls
+            self.dropped += 1
+            logger.error("Call store write queue full (%d); dropped a %s write",
+                         self._queue.maxsize, item[0])
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            batch = [item]
+            stop = False
+            # Gather whatever else arrives within the flush interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(conn, batch)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                break
+        conn.close()
+
+    def _write(self, conn, batch):
+        # A bad record must not take the writer thread, or its batch, down
+        try:
+            self._write_batch(conn, batch)
+            self.writes += len(batch)
+            return
+        except Exception:
+            if len(batch) == 1:
+                self.write_errors += 1
+                logger.exception("Failed to write %s %r", batch[0][0], _record_id(batch[0]))
+                return
+        for item in batch:
+            self._write(conn, [item])
+
+    def _write_batch(self, conn, batch):
+        calls, entries, metadata, utterances = [], [], [], []
+        for kind, category, call in batch:
+            if kind == 'utterance':
+                utterances.append(call)
+                continue
+            call_id = call["call_id"]
+            calls.append((
+                call_id, call["service"], category, call["status"],
+                call["start_time"], call.get("end_time"),
+            ))
+            entries.extend(
+                (call_id, seq, e["speaker"], e["text"], e["timestamp"])
+                for seq, e in enumerate(call.get("transcript", []))
+            )
+            metadata.extend(
+                (call_id, key, json.dumps(value))
+                for key, value in call.get("metadata", {}).items()
+            )
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO calls (call_id, service, category, status, start_time, end_time) "
+                "VALUES (?, ?, ?, ?, ?, ?)", calls)
+            conn.executemany(
+                "INSERT INTO transcript_entries (call_id, seq, speaker, text, timestamp) "
+                "VALUES (?, ?, ?, ?, ?)", entries)
+            conn.executemany(
+                "INSERT OR REPLACE INTO call_metadata (call_id, key, value) VALUES (?, ?, ?)",
+                metadata)
+            if utterances:
+                conn.executemany(
+                    "INSERT INTO transcript_fts (text, call_id, service, start_time, speaker, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", utterances)
+
+    def close(self):
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    # Reads
+
+    def _metadata(self, conn, call_ids):
+        result = {call_id: {} for call_id in call_ids}
+        for chunk in _chunks(call_ids, 500):
+            rows = conn.execute(
+                "SELECT call_id, key, value FROM call_metadata WHERE call_id IN (%s)"
+                % ",".join("?" * len(chunk)), chunk)
+            for row in rows:
+                result[row["call_id"]][row["key"]] = json.loads(row["value"])
+        return result
+
+    def _transcripts(self, conn, call_ids):
+        result = {call_id: [] for call_id in call_ids}
+        for chunk in _chunks(call_ids, 500):
+            rows = conn.execute(
+                "SELECT call_id, speaker, text, timestamp FROM transcript_entries "
+                "WHERE call_id IN (%s) ORDER BY call_id, seq"
+                % ",".join("?" * len(chunk)), chunk)
+            for row in rows:
+                result[row["call_id"]].append({
+                    "speaker": row["speaker"],
+                    "text": row["text"],
+                    "timestamp": row["timestamp"],
+                })
+        return result
+
+    def _assemble(self, conn, rows, include_transcript=True):
+        call_ids = [row["call_id"] for row in rows]
+        metadata = self._metadata(conn, call_ids)
+        transcripts = self._transcripts(conn, call_ids) if include_transcript else None
+        calls = []
+        for row in rows:
+            call = {
+                "call_id": row["call_id"],
+                "service": row["service"],
+                "start_time": row["start_time"],
+                "end_time": row["end_time"],
+                "status": row["status"],
+                "metadata": metadata[row["call_id"]],
+            }
+            if include_transcript:
+                call["transcript"] = transcripts[row["call_id"]]
+            calls.append(call)
+        return calls
+
+    def query_calls(self, category=None, service=None, status=None, since=None,
+                    cursor=None, limit=DEFAULT_PAGE_SIZE, include_transcript=False):
+        clauses, params = [], []
+        for column, value in (("category", category), ("service", service), ("status", status)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("start_time >= ?")
+            params.append(since)
+        before = parse_cursor(cursor)
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = self._reader()
+        # Fetch one extra row to learn whether another page exists
+        rows = conn.execute(
+            f"SELECT * FROM calls {where} ORDER BY id DESC LIMIT ?", (*params, limit + 1)
+        ).fetchall()
+        next_cursor = str(rows[limit - 1]["id"]) if len(rows) > limit else None
+        return self._assemble(conn, rows[:limit], include_transcript), next_cursor
+
+    def get_call(self, call_id):
+        conn = self._reader()
+        rows = conn.execute("SELECT * FROM calls WHERE call_id = ?", (call_id,)).fetchall()
+        calls = self._assemble(conn, rows)
+        return calls[0] if calls else None
+
+    def get_transcript(self, call_id):
+        conn = self._reader()
+        if conn.execute("SELECT 1 FROM calls WHERE call_id = ?", (call_id,)).fetchone() is None:
+            return None
+        return self._transcripts(conn, [call_id])[call_id]
+
+    def group_counts(self):
+        conn = self._reader()
+        return [tuple(row) for row in conn.execute(
+            "SELECT service, status, category, COUNT(*) FROM calls "
+            "GROUP BY service, status, category")]
+
+    def search(self, query, service=None, since=None, limit=DEFAULT_PAGE_SIZE):
+        match = fts_query(parse_query(query))
+        if not self.fts:
+            return []
+        clauses, params = ["transcript_fts MATCH ?"], [match]
+        if service is not None:
+            clauses.append("service = ?")
+            params.append(service)
+        if since is not None:
+            clauses.append("start_time >= ?")
+            params.append(since)
+        where = " AND ".join(clauses)
+        conn = self._reader()
+        # bm25() is lower for better matches; a call ranks by its best
+        # utterance. MATERIALIZED keeps bm25() in the FTS query, where it
+        # is allowed, rather than inside the GROUP BY.
+        ranked = conn.execute(
+            f"WITH hits AS MATERIALIZED (SELECT call_id, service, start_time, bm25(transcript_fts) AS rank"
+            f" FROM transcript_fts WHERE {where})"
+            " SELECT call_id, service, start_time, MIN(rank) AS best, COUNT(*) AS hits"
+            " FROM hits GROUP BY call_id ORDER BY best LIMIT ?", (*params, limit)).fetchall()
+        if not ranked:
+            return []
+        # Snippets only for the page: the best utterance of each call
+        call_ids = [row["call_id"] for row in ranked]
+        snippets = {}
+        for row in conn.execute(
+                "SELECT call_id, speaker, snippet(transcript_fts, 0, ?, ?, '…', ?) AS snippet"
+                f" FROM transcript_fts WHERE transcript_fts MATCH ? AND call_id IN ({','.join('?' * len(call_ids))})"
+                " ORDER BY rank", (_HIT_OPEN, _HIT_CLOSE, SNIPPET_TOKENS, match, *call_ids)):
+            snippets.setdefault(row["call_id"], row)
+        return [{
+            "call_id": row["call_id"],
+            "service": row["service"],
+            "start_time": row["start_time"],
+            "score": round(-row["best"], 4),
+            "hits": row["hits"],
+            "speaker": snippets[row["call_id"]]["speaker"],
+            "snippet": _marked(snippets[row["call_id"]]["snippet"]),
+        } for row in ranked]
+
+
+def parse_cursor(cursor):
+    """Cursors are opaque to clients; internally the last row id seen"""
+    if cursor in (None, ""):
+        return None
+    try:
+        return int(cursor)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def parse_query(query):
+    """Search words as ([tokens], prefix) terms; "TECH-12345" is one term"""
+    terms = []
+    for word in (query or "").split():
+        tokens = _WORD.findall(word)
+        if tokens:
+            terms.append((tokens, word.endswith('*')))
+    if not terms:
+        raise ValueError("Search query has no words")
+    return terms
+
+
+def fts_query(terms):
+    """FTS5 MATCH expression: every term as a quoted phrase, all required"""
+    return " ".join(
+        '"%s"%s' % (" ".join(tokens), "*" if prefix else "") for tokens, prefix in terms)
+
+
+def _marked(snippet):
+    return html.escape(snippet).replace(_HIT_OPEN, "<mark>").replace(_HIT_CLOSE, "</mark>")
+
+
+def _highlight(text, patterns):
+    """Memory-backend snippet: the text around the first hit, hits marked"""
+    words = text.split()
+    first = min((m.start() for p in patterns for m in [p.search(text)] if m), default=0)
+    # Index of the word the hit starts in
+    at = len(text[:first + 1].split()) - 1 if first else 0
+    start = max(0, at - SNIPPET_TOKENS // 2)
+    window = " ".join(words[start:start + SNIPPET_TOKENS])
+    for pattern in patterns:
+        window = pattern.sub(lambda m: _HIT_OPEN + m.group(0) + _HIT_CLOSE, window)
+    prefix = "…" if start else ""
+    suffix = "…" if start + SNIPPET_TOKENS < len(words) else ""
+    return _marked(prefix + window + suffix)
+
+
+def project(call, include_transcript=False):
+    """Summary view of a call; the transcript only when asked for
+    
+    Live calls keep a compact Transcript; it is expanded to entry dicts here.
+    """
+    view = {key: value for key, value in call.items() if key != "transcript"}
+    if include_transcript:
+        view["transcript"] = list(call.get("transcript", []))
+    return view
+
+
+def snapshot(call):
+    """A copy of a call that later changes to the live one cannot reach
+
+    The transcript is expanded to entry dicts (which are new already);
+    metadata is copied deeply.
+    """
+    view = project(call, include_transcript=True)
+    view["metadata"] = copy.deepcopy(call.get("metadata", {}))
+    return view
+
+
+def _record_id(item):
+    kind, _, record = item
+    if kind == 'utterance':
+        return record[1]
+    return record.get("call_id") if isinstance(record, dict) else None
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def create_call_store(kind=CALL_STORE):
+    """Build the configured storage backend"""
+    if kind == 'memory':
+        return MemoryCallStore()
+    if kind == 'sqlite':
+        return SQLiteCallStore()
+    raise ValueError(f"Unknown CALL_STORE backend: {kind}")
@@ -0,0 +1,261 @@
+"""
+Cluster Coordination
+====================
+Lets several app.py worker processes serve one deployment.
+
+A call lives on the worker that started it (its Live session and engine
+task are there). Workers share, through Redis:
+- a registry of active calls (call_id -> owning worker)
+- worker heartbeats carrying each worker's live counters, used to
+  aggregate /api/stats and the dashboard push
+- a channel per worker, so a command for a call that arrives at the
+  wrong worker (a reconnect that landed elsewhere) is forwarded to the
+  owner, and small request/reply lookups such as live transcripts
+
+Socket.IO emits travel over the same Redis as its message queue, so
+audio and transcripts reach clients connected to any worker. Workers
+also need to share the SQLite call store (same CALL_STORE_PATH).
+
+Without MESSAGE_QUEUE_URL the app runs as a single worker (LocalCluster).
+redis_standin.py provides a local Redis-compatible server for tests.
+
+Configuration (environment):
+    MESSAGE_QUEUE_URL    redis://host:port/db (enables multi-worker mode)
+    WORKER_ID            name of this worker (default host-pid)
+    CLUSTER_HEARTBEAT_S  heartbeat interval (default 2)
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_QUEUE_URL = os.environ.get('MESSAGE_QUEUE_URL')
+WORKER_ID = os.environ.get('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+CLUSTER_HEARTBEAT_S = float(os.environ.get('CLUSTER_HEARTBEAT_S', 2))
+# Workers silent for this long are considered gone
+WORKER_TIMEOUT_S = 3 * CLUSTER_HEARTBEAT_S
+# Owner lookups are cached briefly; forwarded audio would otherwise hit Redis per frame
+OWNER_CACHE_S = 1.0
+
+KEY_PREFIX = 'calling-agent'
+KEY_CALLS = f'{KEY_PREFIX}:calls'
+KEY_WORKERS = f'{KEY_PREFIX}:workers'
+CHANNEL_PREFIX = f'{KEY_PREFIX}:worker:'
+
+
+class LocalCluster:
+    """Single-process deployment: every call is local, nothing is shared"""
+
+    distributed = False
+
+    def __init__(self, worker_id=WORKER_ID):
+        self.worker_id = worker_id
+
+    def start(self, on_message, heartbeat):
+        """on_message(event, call_id, payload) handles forwarded commands
+        and returns a reply; heartbeat() returns this worker's summary"""
+
+    def register_call(self, call_id, service):
+        pass
+
+    def unregister_call(self, call_id):
+        pass
+
+    def owner(self, call_id):
+        return None
+
+    def forward(self, call_id, event, payload):
+        """Hand a command to the call's owner; False if it has none elsewhere"""
+        return False
+
+    def request(self, call_id, event, payload, timeout=2.0):
+        """Ask the call's owner for something; None if unavailable"""
+        return None
+
+    def workers(self):
+        return {}
+
+    def try_lead(self, role, ttl=None):
+        return True
+
+    def close(self):
+        pass
+
+
+class RedisCluster(LocalCluster):
+    """Registry, heartbeats and forwarding over Redis"""
+
+    distributed = True
+
+    def __init__(self, url, worker_id=WORKER_ID, heartbeat_s=CLUSTER_HEARTBEAT_S):
+        super().__init__(worker_id)
+        # Only needed in multi-worker mode
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.heartbeat_s = heartbeat_s
+        self.channel = CHANNEL_PREFIX + worker_id
+        self._pending = {}
+        self._owners = {}
+        self._stop = threading.Event()
+        self._pubsub = None
+        self._threads = []
+
+    def start(self, on_message, heartbeat):
+        self._on_message = on_message
+        self._heartbeat = heartbeat
+        self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(self.channel)
+        for target, name in ((self._listen, 'cluster-listen'), (self._beat, 'cluster-heartbeat')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Cluster worker %s joined", self.worker_id)
+
+    # Registry
+
+    def register_call(self, call_id, service):
+        self.redis.hset(KEY_CALLS, call_id, json.dumps({
+            "worker": self.worker_id, "service": service, "started": time.time(),
+        }))
+
+    def unregister_call(self, call_id):
+        self.redis.hdel(KEY_CALLS, call_id)
+
+    def owner(self, call_id):
+        """Owning worker of a call, if that worker is still alive"""
+        cached = self._owners.get(call_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        worker = self._lookup_owner(call_id)
+        if len(self._owners) > 10000:
+            self._owners.clear()
+        self._owners[call_id] = (worker, time.monotonic() + OWNER_CACHE_S)
+        return worker
+
+    def _lookup_owner(self, call_id):
+        entry = self.redis.hget(KEY_CALLS, call_id)
+        if entry is None:
+            return None
+        worker = json.loads(entry)["worker"]
+        if worker != self.worker_id and worker not in self.workers():
+            return None
+        return worker
+
+    def workers(self):
+        """Live workers' latest heartbeat summaries; drops stale ones"""
+        now = time.time()
+        alive = {}
+        for worker, raw in self.redis.hgetall(KEY_WORKERS).items():
+            worker = worker.decode()
+            summary = json.loads(raw)
+            if now - summary.get("at", 0) > WORKER_TIMEOUT_S:
+                self.redis.hdel(KEY_WORKERS, worker)
+                continue
+            alive[worker] = summary
+        return alive
+
+    def try_lead(self, role, ttl=None):
+        """Hold a named leadership lease (e.g. who pushes dashboard stats)"""
+        key = f'{KEY_PREFIX}:leader:{role}'
+        ttl = ttl or WORKER_TIMEOUT_S
+        if self.redis.set(key, self.worker_id, nx=True, ex=int(ttl) or 1):
+            return True
+        if self.redis.get(key) == self.worker_id.encode():
+            self.redis.expire(key, int(ttl) or 1)
+            return True
+        return False
+
+    # Forwarding
+
+    def forward(self, call_id, event, payload):
+        owner = self.owner(call_id)
+        if owner is None or owner == self.worker_id:
+            return False
+        self._publish(owner, {"event": event, "call_id": call_id, "payload": payload})
+        return True
+
+    def request(self, call_id, event, payload, timeout=2.0):
+        owner = self.owner(call_id)
+        if owner is None or owner == self.worker_id:
+            return None
+        request_id = uuid.uuid4().hex
+        waiter = self._pending[request_id] = [threading.Event(), None]
+        try:
+            self._publish(owner, {
+                "event": event, "call_id": call_id, "payload": payload,
+                "reply_to": self.worker_id, "request_id": request_id,
+            })
+            waiter[0].wait(timeout)
+            return waiter[1]
+        finally:
+            self._pending.pop(request_id, None)
+
+    def _publish(self, worker, message):
+        self.redis.publish(CHANNEL_PREFIX + worker, json.dumps(message))
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                message = self._pubsub.get_message(timeout=1.0)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                logger.warning("Cluster listener error: %r", e)
+                time.sleep(1)
+                continue
+            if message is None:
+                continue
+            try:
+                self._dispatch(json.loads(message["data"]))
+            except Exception as e:
+                logger.error("Failed to handle cluster message: %r", e)
+
+    def _dispatch(self, message):
+        if "reply" in message:
+            waiter = self._pending.get(message["reply"])
+            if waiter is not None:
+                waiter[1] = message.get("result")
+                waiter[0].set()
+            return
+        result = self._on_message(message["event"], message["call_id"], message.get("payload"))
+        if message.get("reply_to"):
+            self._publish(message["reply_to"], {"reply": message["request_id"], "result": result})
+
+    def _beat(self):
+        while not self._stop.is_set():
+            try:
+                summary = self._heartbeat()
+                summary["at"] = time.time()
+                self.redis.hset(KEY_WORKERS, self.worker_id, json.dumps(summary))
+            except Exception as e:
+                logger.warning("Cluster heartbeat failed: %r", e)
+            self._stop.wait(self.heartbeat_s)
+
+    def close(self):
+        """Leave the cluster (after the engine has ended local calls)"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(3)
+        try:
+            self.redis.hdel(KEY_WORKERS, self.worker_id)
+            owned = [call_id for call_id, entry in self.redis.hgetall(KEY_CALLS).items()
+                     if json.loads(entry)["worker"] == self.worker_id]
+            if owned:
+                self.redis.hdel(KEY_CALLS, *owned)
+            if self._pubsub is not None:
+                self._pubsub.close()
+        except Exception as e:
+            logger.warning("Could not leave the cluster cleanly: %r", e)
+
+
+def create_cluster(url=MESSAGE_QUEUE_URL):
+    """Multi-worker coordination when a message queue is configured"""
+    if url:
+        return RedisCluster(url)
+    return LocalCluster()
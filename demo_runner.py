@@ -1,17 +1,47 @@
 """
 Demo Script Runner - Simulates realistic conversations with each service
 This is useful for testing or pre-recording demos
+
+It doubles as a regression runner: the scripts are replayed as many
+concurrent conversations, with no pauses between turns. For every turn it
+records the latency to the first response and to the end of the turn,
+plus the bytes and tokens (when the Live API reports them) sent and
+received. Each conversation must end with its service's reference ID
+(ORD-, APT-, TECH-, BKG-, TKT-), found by the same extractors the calls
+use. Results go to a JSON report (and optionally a per-turn CSV) that a
+later run can be compared against.
+
+    python demo_runner.py                        # every service once
+    python demo_runner.py restaurant             # one conversation, printed
+    python demo_runner.py --repeat 20 --concurrency 25 --json report.json --csv turns.csv
+    python demo_runner.py --repeat 20 --baseline report.json
+    LIVE_BACKEND=fake python demo_runner.py ...  # offline (fake_live.py)
 """
 
+import argparse
 import asyncio
+import csv
+import json
 import os
+import sys
+import time
+from datetime import datetime
 from google import genai
 from google.genai import types
+from prompts import GREETING_CUE, PROMPTS_VERSION, system_instruction
+from extractors import StreamingExtractor, apply_records
+
+# LIVE_BACKEND=fake runs the demos offline against fake_live.py
+if os.environ.get("LIVE_BACKEND") == "fake":
+    from fake_live import FakeClient
+    client = FakeClient()
+else:
+    client = genai.Client(
+        http_options={"api_version": "v1beta"},
+        api_key=os.environ.get("GEMINI_API_KEY"),
+    )
 
-client = genai.Client(
-    http_options={"api_version": "v1beta"},
-    api_key=os.environ.get("GEMINI_API_KEY"),
-)
+LIVE_MODEL = "models/gemini-2.5-flash-preview-native-audio-dialog"
 
 # Demo conversations for each service
 DEMO_SCRIPTS = {
@@ -61,163 +91,288 @@ DEMO_SCRIPTS = {
     ]
 }
 
-MASTER_PROMPTS = {
-    "restaurant": """
-You are an AI assistant for GourmetEats Restaurant. Your job is to:
-1. Greet customers warmly
-2. Help them browse the menu (Pizza, Burgers, Pasta, Salads, Desserts)
-3. Take their order with quantities
-4. Confirm delivery address
-5. Provide estimated delivery time (30-45 minutes)
-6. Process payment confirmation
-7. Give order ID at the end
-
-Be friendly, suggest popular items, handle special requests (extra cheese, no onions, etc.).
-Example menu items with prices:
-- Margherita Pizza: $12.99
-- Cheeseburger Deluxe: $9.99
-- Spaghetti Carbonara: $14.99
-- Caesar Salad: $7.99
-- Chocolate Cake: $5.99
-
-Always confirm the complete order before finalizing. Provide order ID like: ORD-FOOD-001
-""",
-    
-    "hospital": """
-You are an AI receptionist for HealthCare Plus Hospital. Your responsibilities:
-1. Greet patients professionally
-2. Ask about their medical concern (general checkup, specialist visit, emergency)
-3. Recommend appropriate doctor/department
-4. Check available time slots (weekdays 9 AM - 5 PM)
-5. Collect patient name, phone, insurance info
-6. Confirm appointment date and time
-7. Provide appointment ID
-
-Available departments: Cardiology, Orthopedics, Pediatrics, General Medicine, Emergency.
-Be empathetic, professional, and prioritize urgent cases.
-For emergencies, immediately provide emergency number: 911
-Provide appointment ID like: APT-HEAL-001
-""",
-    
-    "techsupport": """
-You are a technical support agent for TechFix Support. Your goals:
-1. Greet customer and get their name
-2. Identify the issue (software, hardware, network, account)
-3. Ask diagnostic questions
-4. Provide step-by-step troubleshooting
-5. Offer remote assistance if needed
-6. Create support ticket with issue ID
-
-Common issues: WiFi problems, software installation, password reset, device not working.
-Be patient, explain in simple terms, and confirm each step is completed.
-Always provide a ticket number at the end: TECH-12345
-""",
-    
-    "travel": """
-You are a travel booking agent for SkyHigh Travel Agency. Your tasks:
-1. Greet the customer warmly
-2. Ask for travel preferences (destination, dates, budget)
-3. Suggest flight options with prices
-4. Offer hotel packages
-5. Handle special requests (window seat, dietary needs)
-6. Process booking with confirmation
-7. Provide booking reference number
-
-Popular destinations: New York, Paris, Tokyo, Dubai, London.
-Be enthusiastic, suggest deals, and ensure customer satisfaction.
-Flight prices range from $299 to $1,500. Hotels from $100-$400 per night.
-Provide booking reference like: BKG-TRIP-001
-""",
-    
-    "support": """
-You are a general customer service agent for Universal Customer Service. You handle:
-1. Product inquiries
-2. Return/refund requests
-3. Account issues
-4. Billing questions
-5. General complaints
-6. Feedback collection
-
-Be professional, empathetic, and solution-oriented.
-Always get: customer name, order/account number, issue description.
-Provide resolution steps and ticket number like: TKT-HELP-001
-For escalations, mention: "I'll connect you with a supervisor."
-"""
+# The reference each conversation must end with: (metadata key, prefix)
+EXPECTED_IDS = {
+    "restaurant": ("order_id", "ORD-"),
+    "hospital": ("appointment_id", "APT-"),
+    "techsupport": ("ticket_id", "TECH-"),
+    "travel": ("booking_ref", "BKG-"),
+    "support": ("ticket_id", "TKT-"),
 }
 
+# Summary fields compared against a baseline, and which way is worse
+BASELINE_METRICS = {
+    "pass_rate": -1,
+    "first_response_p50_ms": 1,
+    "first_response_p95_ms": 1,
+    "turn_p50_ms": 1,
+    "turn_p95_ms": 1,
+}
+
+CSV_FIELDS = ["service", "run", "turn", "first_response_ms", "turn_ms",
+              "bytes_out", "bytes_in", "tokens_in", "tokens_out"]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _ms(seconds):
+    return round(1000 * seconds, 1) if seconds is not None else None
+
+
+async def run_turn(session, line, turn_index, on_text=None):
+    """Send one caller line (None for the greeting cue) and read the reply turn"""
+    text = GREETING_CUE if line is None else line
+    sent = time.monotonic()
+    await session.send(input=text, end_of_turn=True)
+    first = None
+    reply = []
+    bytes_in = 0
+    usage = None
+    async for response in session.receive():
+        if first is None:
+            first = time.monotonic() - sent
+        if data := response.data:
+            bytes_in += len(data)
+        if reply_text := response.text:
+            bytes_in += len(reply_text.encode())
+            reply.append(reply_text)
+            if on_text:
+                on_text(reply_text)
+        # Not every SDK version or backend reports usage
+        usage = getattr(response, 'usage_metadata', None) or usage
+    return {
+        "turn": turn_index,
+        "first_response_ms": _ms(first),
+        "turn_ms": _ms(time.monotonic() - sent),
+        "bytes_out": len(text.encode()),
+        "bytes_in": bytes_in,
+        "tokens_in": getattr(usage, 'prompt_token_count', None),
+        "tokens_out": getattr(usage, 'response_token_count', None),
+        "text": "".join(reply),
+    }
+
+
+async def replay(service_name, run=0, modality="TEXT", verbose=False):
+    """Replay one service's script; returns the conversation's result dict"""
+    config = types.LiveConnectConfig(
+        response_modalities=[modality],
+        system_instruction=system_instruction(service_name),
+    )
+    extractor = StreamingExtractor(service_name)
+    metadata = {}
+    result = {"service": service_name, "run": run, "turns": [], "error": None}
+
+    def on_text(text):
+        apply_records(metadata, extractor.feed(text))
+        if verbose:
+            print(f"🤖 Agent: {text}")
+
+    started = time.monotonic()
+    try:
+        async with client.aio.live.connect(model=LIVE_MODEL, config=config) as session:
+            result["connect_ms"] = _ms(time.monotonic() - started)
+            # The master prompt is the system instruction; cue the greeting
+            if verbose:
+                print("\n🤖 Agent: (Greeting customer...)")
+            lines = [None] + [line for _, line in DEMO_SCRIPTS.get(service_name, [])]
+            for index, line in enumerate(lines):
+                if verbose and line is not None:
+                    print(f"\n👤 User: {line}")
+                result["turns"].append(await run_turn(session, line, index, on_text))
+                apply_records(metadata, extractor.flush())
+    except Exception as e:
+        result["error"] = repr(e)
+    result["duration_ms"] = _ms(time.monotonic() - started)
+
+    key, prefix = EXPECTED_IDS[service_name]
+    value = metadata.get(key)
+    result["expected"] = prefix
+    result["extracted"] = {k: v for k, v in metadata.items() if isinstance(v, str)}
+    result["id_ok"] = bool(value) and value.startswith(prefix)
+    result["ok"] = result["error"] is None and result["id_ok"]
+    return result
+
+
 async def run_demo_conversation(service_name):
     """Run a demo conversation for a specific service"""
     print("\n" + "=" * 70)
     print(f"🎬 Starting Demo Conversation: {service_name.upper()}")
     print("=" * 70)
     
-    config = types.LiveConnectConfig(
-        response_modalities=["TEXT"],  # Text only for demo
-    )
+    result = await replay(service_name, verbose=True)
     
-    async with client.aio.live.connect(
-        model="models/gemini-2.5-flash-preview-native-audio-dialog",
-        config=config
-    ) as session:
-        # Send master prompt
-        prompt = MASTER_PROMPTS.get(service_name, "You are a helpful assistant.")
-        await session.send(input=prompt, end_of_turn=True)
-        
-        # Initial greeting
-        print("\n🤖 Agent: (Greeting customer...)")
-        turn = session.receive()
-        async for response in turn:
-            if text := response.text:
-                print(f"🤖 Agent: {text}")
-        
-        # Run through demo script
-        for speaker, line in DEMO_SCRIPTS.get(service_name, []):
-            await asyncio.sleep(2)  # Pause between exchanges
-            
-            print(f"\n👤 {speaker}: {line}")
-            await session.send(input=line, end_of_turn=True)
-            
-            # Get response
-            turn = session.receive()
-            async for response in turn:
-                if text := response.text:
-                    print(f"🤖 Agent: {text}")
-        
+    if result["error"]:
+        print(f"\n❌ Demo failed: {result['error']}")
+    else:
+        key, prefix = EXPECTED_IDS[service_name]
+        found = result["extracted"].get(key)
+        print(f"\n{'✅' if result['id_ok'] else '⚠️ '} Reference: {found or f'no {prefix} ID given'}")
         print("\n✅ Demo conversation completed!")
-        print("=" * 70)
+    print("=" * 70)
+    return result
+
+async def run_regression(services, repeat=1, concurrency=10, modality="TEXT"):
+    """Replay every service's script `repeat` times, at most `concurrency` at once"""
+    limit = asyncio.Semaphore(max(1, concurrency))
+    
+    async def bounded(service, run):
+        async with limit:
+            return await replay(service, run, modality)
+    
+    return await asyncio.gather(*(bounded(service, run)
+                                  for run in range(repeat) for service in services))
+
+def summarize(conversations):
+    """Pass counts, latency percentiles and totals over some conversations"""
+    turns = [turn for c in conversations for turn in c["turns"]]
+    first = [t["first_response_ms"] for t in turns if t["first_response_ms"] is not None]
+    whole = [t["turn_ms"] for t in turns]
+    tokens = [t["tokens_in"] or 0 for t in turns] + [t["tokens_out"] or 0 for t in turns]
+    passed = sum(1 for c in conversations if c["ok"])
+    return {
+        "conversations": len(conversations),
+        "passed": passed,
+        "errors": sum(1 for c in conversations if c["error"]),
+        "id_failures": sum(1 for c in conversations if not c["error"] and not c["id_ok"]),
+        "pass_rate": round(passed / len(conversations), 4) if conversations else None,
+        "turns": len(turns),
+        "first_response_p50_ms": percentile(first, 0.5),
+        "first_response_p95_ms": percentile(first, 0.95),
+        "turn_p50_ms": percentile(whole, 0.5),
+        "turn_p95_ms": percentile(whole, 0.95),
+        "bytes_out": sum(t["bytes_out"] for t in turns),
+        "bytes_in": sum(t["bytes_in"] for t in turns),
+        # None when the backend never reported usage
+        "tokens": sum(tokens) if any(tokens) else None,
+    }
+
+def build_report(conversations, args, wall_s):
+    services = sorted({c["service"] for c in conversations})
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "backend": os.environ.get("LIVE_BACKEND") or "gemini",
+        "model": LIVE_MODEL,
+        "prompts_version": PROMPTS_VERSION,
+        "modality": args.modality,
+        "repeat": args.repeat,
+        "concurrency": args.concurrency,
+        "wall_s": round(wall_s, 2),
+        "summary": summarize(conversations),
+        "services": {s: summarize([c for c in conversations if c["service"] == s]) for s in services},
+        "conversations": sorted(conversations, key=lambda c: (c["service"], c["run"])),
+    }
+
+def write_csv(path, conversations):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for c in sorted(conversations, key=lambda c: (c["service"], c["run"])):
+            for turn in c["turns"]:
+                writer.writerow(dict(turn, service=c["service"], run=c["run"]))
 
-async def run_all_demos():
-    """Run demos for all services"""
+def compare(report, baseline, tolerance):
+    """Regressions against a baseline report: (scope, metric, old, new) rows"""
+    regressions = []
+    scopes = [("all", report["summary"], baseline.get("summary", {}))]
+    scopes += [(s, summary, baseline.get("services", {}).get(s, {}))
+               for s, summary in report["services"].items()]
+    for scope, new, old in scopes:
+        for metric, worse in BASELINE_METRICS.items():
+            before, after = old.get(metric), new.get(metric)
+            if before is None or after is None:
+                continue
+            if worse > 0:
+                # Latency: allow tolerance, and a few ms of noise on tiny values
+                regressed = after > before * (1 + tolerance) + 5
+            else:
+                regressed = after < before - 1e-9
+            if regressed:
+                regressions.append((scope, metric, before, after))
+    return regressions
+
+def print_summary(report):
+    print("\n" + "=" * 70)
+    header = f"  {'service':12} {'pass':>9} {'first p50':>10} {'p95':>8} {'turn p50':>9} {'p95':>8} {'bytes in':>10}"
+    print(header)
+    rows = list(report["services"].items()) + [("all", report["summary"])]
+    for name, s in rows:
+        print(f"  {name:12} {s['passed']:>4}/{s['conversations']:<4} {str(s['first_response_p50_ms']):>10} "
+              f"{str(s['first_response_p95_ms']):>8} {str(s['turn_p50_ms']):>9} {str(s['turn_p95_ms']):>8} "
+              f"{s['bytes_in']:>10}")
+    print("=" * 70)
+    print(f"⏱️  {report['summary']['conversations']} conversations, {report['summary']['turns']} turns "
+          f"in {report['wall_s']}s (concurrency {report['concurrency']})")
+    for c in report["conversations"]:
+        if not c["ok"]:
+            reason = c["error"] or f"no {c['expected']} ID (got {c['extracted'] or 'nothing'})"
+            print(f"❌ {c['service']} #{c['run']}: {reason}")
+
+async def run_all_demos(args):
+    """Run the scripted conversations for all (or some) services concurrently"""
     print("\n" + "🎯" * 35)
-    print("      AI CALLING AGENT SYSTEM - FULL DEMO")
+    print("      AI CALLING AGENT SYSTEM - REGRESSION RUN")
     print("🎯" * 35)
     
-    services = ["restaurant", "hospital", "techsupport", "travel", "support"]
+    started = time.monotonic()
+    conversations = await run_regression(args.services, args.repeat, args.concurrency, args.modality)
+    report = build_report(conversations, args, time.monotonic() - started)
+    print_summary(report)
+    
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\n📝 Report written to {args.json}")
+    if args.csv:
+        write_csv(args.csv, conversations)
+        print(f"📝 Per-turn CSV written to {args.csv}")
     
-    for i, service in enumerate(services, 1):
-        print(f"\n\n📞 Demo {i}/{len(services)}")
-        await run_demo_conversation(service)
-        
-        if i < len(services):
-            print("\n⏳ Preparing next demo...")
-            await asyncio.sleep(3)
+    ok = report["summary"]["passed"] == report["summary"]["conversations"]
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n📉 {len(regressions)} regression(s) against {args.baseline}:")
+            for scope, metric, before, after in regressions:
+                print(f"   {scope:12} {metric:22} {before} → {after}")
+            ok = False
+        else:
+            print(f"\n✅ No regressions against {args.baseline}")
     
-    print("\n\n" + "🎉" * 35)
-    print("      ALL DEMOS COMPLETED!")
-    print("🎉" * 35)
+    print("\n" + ("🎉" if ok else "❌") * 35)
+    return ok
 
-if __name__ == "__main__":
-    import sys
+def main():
+    parser = argparse.ArgumentParser(description="Replay the demo scripts as a regression run")
+    parser.add_argument("services", nargs="*", help=f"services to run (default: all of {', '.join(DEMO_SCRIPTS)})")
+    parser.add_argument("--repeat", type=int, default=1, help="conversations per service")
+    parser.add_argument("--concurrency", type=int, default=10, help="conversations at once")
+    parser.add_argument("--modality", default="TEXT", choices=["TEXT", "AUDIO"])
+    parser.add_argument("--json", help="write the full report to this file")
+    parser.add_argument("--csv", help="write one row per turn to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed latency growth over the baseline (default 0.2 = 20%%)")
+    args = parser.parse_args()
     
-    if len(sys.argv) > 1:
-        service = sys.argv[1].lower()
-        if service in DEMO_SCRIPTS:
-            print(f"\n🎬 Running single demo: {service}")
-            asyncio.run(run_demo_conversation(service))
-        else:
-            print(f"❌ Unknown service: {service}")
-            print(f"Available: {', '.join(DEMO_SCRIPTS.keys())}")
+    unknown = [s for s in args.services if s not in DEMO_SCRIPTS]
+    if unknown:
+        print(f"❌ Unknown service: {', '.join(unknown)}")
+        print(f"Available: {', '.join(DEMO_SCRIPTS.keys())}")
+        sys.exit(2)
+    args.services = args.services or list(DEMO_SCRIPTS)
+    
+    single = len(args.services) == 1 and args.repeat == 1 and not (args.json or args.csv or args.baseline)
+    if single:
+        print(f"\n🎬 Running single demo: {args.services[0]}")
+        ok = asyncio.run(run_demo_conversation(args.services[0]))["ok"]
     else:
-        print("\n🎬 Running all demos...")
-        print("Tip: Run 'python demo_runner.py restaurant' to test a single service")
-        asyncio.run(run_all_demos())
+        ok = asyncio.run(run_all_demos(args))
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
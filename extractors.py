@@ -0,0 +1,188 @@
+"""
+Call Data Extractors
+====================
+Pulls structured data (order IDs, menu items and prices, appointment
+slots, ticket IDs, booking references) out of the agent's streamed text.
+
+Each call gets a StreamingExtractor for its service. Text fragments are
+appended to a short rolling window that is rescanned with precompiled
+patterns, so an ID split across fragments ("TECH-123" + "45") is still
+found. A match with no whitespace after it yet ("$12." may become
+"$12.99") is held back until more text arrives or the turn ends.
+Fragments are gathered until SCAN_CHARS of new text are waiting, so one
+rescan serves several fragments; flush() at the end of a turn scans the
+rest. Every result is a dict record with a "type" key; apply_records()
+folds records into call metadata.
+"""
+
+import re
+
+# Characters of earlier text kept for matches that span fragments
+WINDOW_CHARS = 160
+# Longest match we expect; rescans start this far before settled text
+MAX_MATCH_CHARS = 64
+# New text gathered before a rescan; flush() scans whatever is left
+SCAN_CHARS = 48
+
+# -1234, -FOOD-1234, -2024-0042
+_REF_TAIL = r'-(?:[A-Z]+-)?\d+(?:-\d+)*\b'
+_DAYS = r'(?:next\s+)?(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)|tomorrow|today'
+_MONTHS = r'(?:january|february|march|april|may|june|july|august|september|october|november|december)'
+
+ORDER_ID = re.compile(r'\bORD' + _REF_TAIL, re.IGNORECASE)
+# "order number is 4521" style, when the model drops the ORD- prefix
+ORDER_NUMBER = re.compile(
+    r'\border\s+(?:id|number)(?:\s+is)?[:\s#]+(?P<id>(?=[A-Z-]*\d)[A-Z0-9][A-Z0-9-]{3,})\b', re.IGNORECASE)
+APPOINTMENT_ID = re.compile(r'\bAPT' + _REF_TAIL, re.IGNORECASE)
+TICKET_ID = re.compile(r'\b(?:TECH|TKT)' + _REF_TAIL, re.IGNORECASE)
+BOOKING_REF = re.compile(r'\bBKG' + _REF_TAIL, re.IGNORECASE)
+MENU_ITEM = re.compile(
+    r'\b(?P<name>[A-Z][a-z]+(?: [A-Z][a-z]+){0,3})(?::| for| at| is)? \$(?P<price>\d+(?:\.\d{2})?)')
+APPOINTMENT_SLOT = re.compile(
+    r'\b(?P<day>' + _DAYS + r'|' + _MONTHS + r'\s+\d{1,2}(?:st|nd|rd|th)?)\b[^.?!]{0,20}?'
+    r'\bat\s+(?P<time>\d{1,2}(?::\d{2})?\s*[ap]\.?m\b\.?)', re.IGNORECASE)
+DEPARTMENT = re.compile(r'\b(?P<name>Cardiology|Orthopedics|Pediatrics|General Medicine|Emergency)\b')
+APPOINTMENT_WORD = re.compile(r'\bappointment\b', re.IGNORECASE)
+
+
+def _reference(kind):
+    return lambda m: {"type": kind, "value": m.group(0).upper()}
+
+
+def _order_number(m):
+    return {"type": "order_id", "value": m.group('id').upper()}
+
+
+def _menu_item(m):
+    return {"type": "item", "name": m.group('name'), "price": float(m.group('price'))}
+
+
+def _slot(m):
+    day = " ".join(m.group('day').split()).title()
+    time = m.group('time').upper().replace('.', '').replace(' ', '')
+    return {"type": "appointment_slot", "day": day, "time": time}
+
+
+def _department(m):
+    return {"type": "department", "value": m.group('name')}
+
+
+def _mentioned(kind):
+    return lambda m: {"type": kind}
+
+
+# (pattern, record builder, hint) per service, tried in order. The hint
+# is a lowercase literal every match contains; without it the regex is
+# skipped, which is most fragments.
+SERVICE_PATTERNS = {
+    "restaurant": (
+        (ORDER_ID, _reference("order_id"), "ord-"),
+        (ORDER_NUMBER, _order_number, "order "),
+        (MENU_ITEM, _menu_item, "$"),
+    ),
+    "hospital": (
+        (APPOINTMENT_ID, _reference("appointment_id"), "apt-"),
+        (APPOINTMENT_SLOT, _slot, "at "),
+        (DEPARTMENT, _department, ""),
+        (APPOINTMENT_WORD, _mentioned("appointment_mentioned"), "appointment"),
+    ),
+    "techsupport": (
+        (TICKET_ID, _reference("ticket_id"), "-"),
+    ),
+    "travel": (
+        (BOOKING_REF, _reference("booking_ref"), "bkg-"),
+        (MENU_ITEM, _menu_item, "$"),
+    ),
+    "support": (
+        (TICKET_ID, _reference("ticket_id"), "-"),
+        (ORDER_ID, _reference("order_id"), "ord-"),
+    ),
+}
+
+
+def _record_key(record):
+    return tuple(sorted(record.items()))
+
+
+class StreamingExtractor:
+    """Incremental extractor over one call's agent text"""
+
+    __slots__ = ("patterns", "window", "settled", "seen")
+
+    def __init__(self, service):
+        self.patterns = SERVICE_PATTERNS.get(service, ())
+        self.window = ""
+        # Window offset up to which text has been scanned as final
+        self.settled = 0
+        self.seen = set()
+
+    def feed(self, text):
+        """Add a text fragment; return records that are now complete"""
+        if not self.patterns:
+            return []
+        self.window += text
+        if len(self.window) - self.settled < SCAN_CHARS:
+            return []
+        records = self._scan(final=False)
+        self._trim()
+        return records
+
+    def flush(self):
+        """End of turn: release matches that were waiting for more text"""
+        records = self._scan(final=True) if self.window else []
+        self.window = ""
+        self.settled = 0
+        return records
+
+    def _scan(self, final):
+        window = self.window
+        # Anything past the last whitespace may still be growing
+        settled = len(window) if final else max(window.rfind(" "), window.rfind("\n"))
+        previous = self.settled
+        if settled <= previous:
+            return []
+        start = max(0, previous - MAX_MATCH_CHARS)
+        self.settled = settled
+        # Settled text ends at whitespace, so stopping there cuts no match short
+        lowered = window[start:settled].lower()
+        found = []
+        for pattern, build, hint in self.patterns:
+            if hint not in lowered:
+                continue
+            for match in pattern.finditer(window, start, settled):
+                # Scanned in full before; here start may cut it ("Fish Tacos")
+                if match.end() <= previous:
+                    continue
+                record = build(match)
+                key = _record_key(record)
+                if key not in self.seen:
+                    self.seen.add(key)
+                    found.append(record)
+        return found
+
+    def _trim(self):
+        if len(self.window) <= WINDOW_CHARS:
+            return
+        tail = self.window[-WINDOW_CHARS:]
+        # Restart at a word boundary so a cut-off name is not read as a new one
+        space = tail.find(" ")
+        window = tail[space + 1:] if space >= 0 else tail
+        self.settled = max(0, self.settled - (len(self.window) - len(window)))
+        self.window = window
+
+
+def apply_records(metadata, records):
+    """Fold extractor records into a call's metadata dict"""
+    for record in records:
+        kind = record["type"]
+        if kind in ("order_id", "ticket_id", "appointment_id", "booking_ref", "department"):
+            metadata[kind] = record["value"]
+            if kind == "appointment_id":
+                metadata["has_appointment"] = True
+        elif kind == "item":
+            metadata.setdefault("items", []).append({"name": record["name"], "price": record["price"]})
+        elif kind == "appointment_slot":
+            metadata["appointment_slot"] = {"day": record["day"], "time": record["time"]}
+            metadata["has_appointment"] = True
+        elif kind == "appointment_mentioned":
+            metadata["has_appointment"] = True
@@ -0,0 +1,184 @@
+"""
+Fake Gemini Live
+================
+Offline stand-in for `client.aio.live` so the call path can be run and
+load-tested without network access or an API key.
+
+Select it with LIVE_BACKEND=fake; app.py and demo_runner.py then build a
+FakeClient instead of genai.Client. The fake session accepts the same
+send() inputs the real one does (text turns, audio chunks, turn_complete)
+and answers each completed user turn with synthetic 24 kHz PCM plus a
+text line, after configurable delays. Errors can be injected at connect
+time and per turn.
+
+Configuration (environment):
+    FAKE_LIVE_CONNECT_MS     connect delay (default 150)
+    FAKE_LIVE_RESPONSE_MS    delay before the first reply chunk (default 300)
+    FAKE_LIVE_REPLY_MS       length of each synthetic audio reply (default 1200)
+    FAKE_LIVE_CHUNK_MS       audio per response message (default 100)
+    FAKE_LIVE_ERROR_RATE     probability a turn fails mid-stream (default 0)
+    FAKE_LIVE_CONNECT_ERROR_RATE  probability connect fails (default 0)
+"""
+
+import asyncio
+import contextlib
+import math
+import os
+import random
+import re
+from array import array
+
+FAKE_LIVE_CONNECT_MS = int(os.environ.get('FAKE_LIVE_CONNECT_MS', 150))
+FAKE_LIVE_RESPONSE_MS = int(os.environ.get('FAKE_LIVE_RESPONSE_MS', 300))
+FAKE_LIVE_REPLY_MS = int(os.environ.get('FAKE_LIVE_REPLY_MS', 1200))
+FAKE_LIVE_CHUNK_MS = int(os.environ.get('FAKE_LIVE_CHUNK_MS', 100))
+FAKE_LIVE_ERROR_RATE = float(os.environ.get('FAKE_LIVE_ERROR_RATE', 0))
+FAKE_LIVE_CONNECT_ERROR_RATE = float(os.environ.get('FAKE_LIVE_CONNECT_ERROR_RATE', 0))
+
+FAKE_SAMPLE_RATE = 24000
+
+# Reference formats the prompts ask for; the fake hands them out
+REFERENCE_PATTERN = re.compile(r'\b(ORD|APT|TECH|TKT|BKG)-(?:[A-Z]+-)?[X0-9]+')
+
+
+class FakeLiveError(ConnectionError):
+    """Injected failure, shaped like a dropped Live connection"""
+
+
+class FakeServerContent:
+    def __init__(self, turn_complete=False, interrupted=False):
+        self.turn_complete = turn_complete
+        self.interrupted = interrupted
+
+
+class FakeMessage:
+    """Mimics the LiveServerMessage attributes the app reads"""
+
+    def __init__(self, data=None, text=None, turn_complete=False):
+        self.data = data
+        self.text = text
+        self.server_content = FakeServerContent(turn_complete=turn_complete)
+        self.usage_metadata = None
+
+
+_tone_cache = {}
+
+
+def synthetic_pcm(duration_ms, sample_rate=FAKE_SAMPLE_RATE, freq=220.0):
+    """A soft tone standing in for model speech (cached per length)"""
+    key = (duration_ms, sample_rate, freq)
+    if key not in _tone_cache:
+        n = sample_rate * duration_ms // 1000
+        step = 2 * math.pi * freq / sample_rate
+        _tone_cache[key] = array('h', (int(6000 * math.sin(i * step)) for i in range(n))).tobytes()
+    return _tone_cache[key]
+
+
+class FakeLiveSession:
+    def __init__(self, config):
+        self.config = config
+        self.modalities = _modalities(config)
+        self.reference = None
+        self.reference_number = random.randint(10000, 99999)
+        instruction = _system_instruction(config)
+        if instruction:
+            self._learn_reference(instruction)
+        self.turns = asyncio.Queue()
+        self.turn_count = 0
+        self.audio_bytes_in = 0
+        self.closed = False
+
+    def _learn_reference(self, text):
+        match = REFERENCE_PATTERN.search(text)
+        if match and self.reference is None:
+            self.reference = match.group(1)
+
+    async def send(self, input=None, end_of_turn=False):
+        if self.closed:
+            raise FakeLiveError("session closed")
+        if isinstance(input, dict) and 'data' in input:
+            self.audio_bytes_in += len(input['data'])
+            return
+        if isinstance(input, str):
+            self._learn_reference(input)
+            if end_of_turn:
+                self.turns.put_nowait(input)
+            return
+        # types.LiveClientContent(turn_complete=True) and similar
+        if getattr(input, 'turn_complete', False) or end_of_turn:
+            self.turns.put_nowait("")
+
+    async def receive(self):
+        """Yield one reply turn, waiting for the caller to finish theirs"""
+        if self.closed:
+            raise FakeLiveError("session closed")
+        prompt = await self.turns.get()
+        if prompt is None:
+            raise FakeLiveError("session closed")
+        self.turn_count += 1
+        await asyncio.sleep(FAKE_LIVE_RESPONSE_MS / 1000)
+
+        if 'AUDIO' in self.modalities:
+            pcm = synthetic_pcm(FAKE_LIVE_REPLY_MS)
+            step = FAKE_SAMPLE_RATE * FAKE_LIVE_CHUNK_MS // 1000 * 2
+            for start in range(0, len(pcm), step):
+                if random.random() < FAKE_LIVE_ERROR_RATE / max(1, len(pcm) // step):
+                    raise FakeLiveError("injected stream failure")
+                yield FakeMessage(data=pcm[start:start + step])
+                await asyncio.sleep(0)
+        yield FakeMessage(text=self._reply_text())
+        yield FakeMessage(turn_complete=True)
+
+    def _reply_text(self):
+        if self.reference:
+            return f"Thank you. Your reference number is {self.reference}-{self.reference_number}."
+        return "Thank you. How else can I help you today?"
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            self.turns.put_nowait(None)
+
+
+class FakeLive:
+    @contextlib.asynccontextmanager
+    async def connect(self, model, config=None):
+        await asyncio.sleep(FAKE_LIVE_CONNECT_MS / 1000)
+        if random.random() < FAKE_LIVE_CONNECT_ERROR_RATE:
+            raise FakeLiveError("injected connect failure")
+        session = FakeLiveSession(config)
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+class FakeAio:
+    def __init__(self):
+        self.live = FakeLive()
+
+
+class FakeClient:
+    """Drop-in for genai.Client as far as the Live API is concerned"""
+
+    def __init__(self, *args, **kwargs):
+        self.aio = FakeAio()
+
+
+def _modalities(config):
+    modalities = getattr(config, 'response_modalities', None)
+    if modalities is None and isinstance(config, dict):
+        modalities = config.get('response_modalities')
+    return [str(getattr(m, 'value', m)).upper() for m in (modalities or ['AUDIO'])]
+
+
+def _system_instruction(config):
+    instruction = getattr(config, 'system_instruction', None)
+    if instruction is None and isinstance(config, dict):
+        instruction = config.get('system_instruction')
+    if instruction is None:
+        return ""
+    if isinstance(instruction, str):
+        return instruction
+    parts = getattr(instruction, 'parts', None) or []
+    return " ".join(getattr(p, 'text', '') or '' for p in parts)
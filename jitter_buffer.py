@@ -0,0 +1,227 @@
+"""
+Output Audio Pipeline
+=====================
+Per-call pipeline for model audio on its way to the client. The pipeline:
+- re-chunks 24 kHz PCM of any size into fixed 20/40 ms frames
+- stamps each frame with a sequence number and a media timestamp (ms)
+- paces delivery at real-time rate, keeping the client a small, adaptive
+  lead ahead of playback instead of forwarding model bursts as they land
+- supports barge-in: flush() drops everything not yet sent
+- holds at most AUDIO_OUT_MAX_MS, shedding by AUDIO_OUT_POLICY, and stops
+  sending while the client is behind (see backpressure.py)
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+
+from backpressure import (
+    AUDIO_OUT_MAX_MS, AUDIO_OUT_POLICY, POLICY_DROP_SILENCE, POLICY_COALESCE, POLICY_DISCONNECT,
+    SHED_SILENCE, SHED_OLDEST, SHED_COALESCED, SHED_STALL, SHED_DISCONNECT, silent_frames,
+)
+
+# Output pipeline configuration
+OUTPUT_FRAME_MS = int(os.environ.get('OUTPUT_FRAME_MS', 20))
+JITTER_TARGET_MS = int(os.environ.get('JITTER_TARGET_MS', 80))
+JITTER_MIN_MS = int(os.environ.get('JITTER_MIN_MS', 40))
+JITTER_MAX_MS = int(os.environ.get('JITTER_MAX_MS', 400))
+
+# Frames sent without an underrun before the lead is shrunk again
+STABLE_FRAMES = 250
+
+
+class OutputPipeline:
+    """Re-chunking, sequencing and pacing for one call's outbound audio"""
+
+    def __init__(self, sample_rate=24000, frame_ms=OUTPUT_FRAME_MS,
+                 target_ms=JITTER_TARGET_MS, min_ms=JITTER_MIN_MS, max_ms=JITTER_MAX_MS,
+                 buffer_ms=AUDIO_OUT_MAX_MS, policy=AUDIO_OUT_POLICY, on_shed=None):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * 2
+        self.min_frames = max(1, min_ms // frame_ms)
+        self.max_frames = max(self.min_frames, max_ms // frame_ms)
+        self.target_frames = min(max(self.min_frames, target_ms // frame_ms), self.max_frames)
+        # Hard bound on queued frames (0: unbounded) and what gives when it is hit
+        self.buffer_frames = buffer_ms // frame_ms
+        self.policy = policy
+        # on_shed(event, count): frames dropped or coalesced, client stalls
+        self.on_shed = on_shed
+        self.pending = bytearray()
+        # (seq, timestamp_ms, frame, silent)
+        self.frames = deque()
+        self.seq = 0
+        self.timestamp_ms = 0
+        self.turn_done = True
+        self.ready = asyncio.Event()
+        self.stable_frames = 0
+        self.frames_sent = 0
+        # When the last frame went to the client (time.monotonic)
+        self.last_sent_at = None
+        self.underruns = 0
+        self.flushes = 0
+        self.frames_flushed = 0
+        self.frames_shed = 0
+        self.frames_coalesced = 0
+        self.stalls = 0
+
+    def push(self, pcm):
+        """Add model audio; whole frames become available for sending"""
+        self.turn_done = False
+        self.pending += pcm
+        whole = len(self.pending) - len(self.pending) % self.frame_bytes
+        # Silence flags only matter when shedding prefers silence
+        silent = None
+        if self.policy == POLICY_DROP_SILENCE and whole:
+            silent = silent_frames(self.pending[:whole], self.frame_bytes)
+        for i, start in enumerate(range(0, whole, self.frame_bytes)):
+            self._queue_frame(bytes(self.pending[start:start + self.frame_bytes]),
+                              silent is not None and bool(silent[i]))
+        del self.pending[:whole]
+
+    def end_of_turn(self):
+        """Pad out the trailing partial frame once the model's turn is done"""
+        if self.pending:
+            self.pending += bytes(self.frame_bytes - len(self.pending))
+            self._queue_frame(bytes(self.pending), False)
+            self.pending.clear()
+        self.turn_done = True
+
+    def _queue_frame(self, frame, silent):
+        self.frames.append((self.seq, self.timestamp_ms, frame, silent))
+        self.seq += 1
+        self.timestamp_ms += self.frame_ms
+        if self.buffer_frames and len(self.frames) > self.buffer_frames:
+            self._shed()
+        self.ready.set()
+
+    def _shed(self):
+        """Buffer full: apply the policy until it is back at its bound"""
+        if self.policy == POLICY_DISCONNECT:
+            self._report(SHED_DISCONNECT, 1)
+        while len(self.frames) > self.buffer_frames:
+            index, event = 0, SHED_OLDEST
+            if self.policy == POLICY_DROP_SILENCE:
+                # Shortening a pause is cheaper than losing speech
+                index = next((i for i, queued in enumerate(self.frames) if queued[3]), 0)
+                if self.frames[index][3]:
+                    event = SHED_SILENCE
+            del self.frames[index]
+            self.frames_shed += 1
+            self._report(event, 1)
+
+    def _report(self, event, count):
+        if self.on_shed is not None:
+            self.on_shed(event, count)
+
+    def flush(self):
+        """Barge-in: drop all queued audio; returns the number of frames dropped"""
+        dropped = len(self.frames)
+        self.frames.clear()
+        self.pending.clear()
+        self.turn_done = True
+        self.flushes += 1
+        self.frames_flushed += dropped
+        return dropped
+
+    def playing(self):
+        """Whether sent audio may still be playing (within the client's lead)"""
+        if self.last_sent_at is None:
+            return False
+        return time.monotonic() - self.last_sent_at < (self.target_frames + 1) * self.frame_ms / 1000
+
+    @property
+    def depth_ms(self):
+        return len(self.frames) * self.frame_ms
+
+    @property
+    def target_ms(self):
+        return self.target_frames * self.frame_ms
+
+    def _underrun(self):
+        self.underruns += 1
+        self.stable_frames = 0
+        self.target_frames = min(self.max_frames, self.target_frames + 1)
+
+    def _sent(self):
+        self.frames_sent += 1
+        self.last_sent_at = time.monotonic()
+        self.stable_frames += 1
+        if self.stable_frames >= STABLE_FRAMES and self.target_frames > self.min_frames:
+            self.target_frames -= 1
+            self.stable_frames = 0
+
+    async def run(self, send, behind=None):
+        """Pace frames out through send(seq, timestamp_ms, frame) until cancelled
+
+        behind() says the client has not taken what it was sent; frames
+        are held (in the bounded buffer) until it catches up.
+        """
+        loop = asyncio.get_running_loop()
+        frame_s = self.frame_ms / 1000
+        next_due = None
+        stalled = False
+        while True:
+            if not self.frames:
+                if self.turn_done:
+                    next_due = None
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+
+            if behind is not None and behind():
+                if not stalled:
+                    stalled = True
+                    self.stalls += 1
+                    self._report(SHED_STALL, 1)
+                await asyncio.sleep(frame_s)
+                continue
+            if stalled:
+                # Resume as a new talkspurt rather than an underrun
+                stalled = False
+                next_due = None
+                if self.policy == POLICY_COALESCE and len(self.frames) > self.target_frames:
+                    # Catch the client up in one packet instead of a burst of frames
+                    count = len(self.frames) - self.target_frames
+                    held = [self.frames.popleft() for _ in range(count)]
+                    send(held[0][0], held[0][1], b''.join(queued[2] for queued in held))
+                    self.frames_sent += count
+                    self.last_sent_at = time.monotonic()
+                    self.frames_coalesced += count - 1
+                    self._report(SHED_COALESCED, count - 1)
+                    continue
+
+            now = loop.time()
+            lead_start = now - self.target_frames * frame_s
+            if next_due is None:
+                # Start of a talkspurt: the first target_frames go out at once
+                # so the client has a lead to absorb jitter
+                next_due = lead_start
+            elif next_due < lead_start:
+                # Model audio arrived slower than real time mid-turn and the
+                # client's lead ran out; rebuild it (a bigger one)
+                self._underrun()
+                next_due = now - self.target_frames * frame_s
+            if next_due > now:
+                await asyncio.sleep(next_due - now)
+                continue
+
+            seq, timestamp_ms, frame, _ = self.frames.popleft()
+            send(seq, timestamp_ms, frame)
+            self._sent()
+            next_due += frame_s
+
+    def stats(self):
+        """Pipeline counters for call metadata"""
+        return {
+            "frame_ms": self.frame_ms,
+            "frames_sent": self.frames_sent,
+            "underruns": self.underruns,
+            "flushes": self.flushes,
+            "frames_flushed": self.frames_flushed,
+            "frames_shed": self.frames_shed,
+            "frames_coalesced": self.frames_coalesced,
+            "client_stalls": self.stalls,
+            "jitter_target_ms": self.target_ms,
+        }
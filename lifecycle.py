@@ -0,0 +1,114 @@
+"""
+Call Lifecycle
+==============
+Makes sure every call ends, however the caller leaves.
+
+A call normally ends with end_call. Everything else is reaped:
+    disconnect       the caller's Socket.IO connection went away
+    connect_timeout  no Live session within CALL_CONNECT_TIMEOUT_S
+    idle             no caller audio or model output for CALL_IDLE_TIMEOUT_S
+    max_duration     the call ran longer than CALL_MAX_DURATION_S
+    failed           the session task died (Live error, dropped connection)
+    overload         caller audio overflowed under AUDIO_IN_POLICY=disconnect
+    slow_consumer    agent audio overflowed under AUDIO_OUT_POLICY=disconnect
+
+Disconnects and dead session tasks are reaped as they happen; the Reaper
+sweeps the live calls every REAPER_INTERVAL_S for the timeouts (and
+catches anything the hooks missed). Reaped calls are stored like any
+other, with metadata["end_reason"] saying why, and counted in
+call_reaped_total. Teardowns that do not finish in time are counted in
+call_leaked_total.
+
+Configuration (environment, seconds; 0 disables a timeout):
+    CALL_CONNECT_TIMEOUT_S   default 15
+    CALL_IDLE_TIMEOUT_S      default 60
+    CALL_MAX_DURATION_S      default 1800
+    REAPER_INTERVAL_S        default 5
+"""
+
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CALL_CONNECT_TIMEOUT_S = float(os.environ.get('CALL_CONNECT_TIMEOUT_S', 15))
+CALL_IDLE_TIMEOUT_S = float(os.environ.get('CALL_IDLE_TIMEOUT_S', 60))
+CALL_MAX_DURATION_S = float(os.environ.get('CALL_MAX_DURATION_S', 1800))
+REAPER_INTERVAL_S = float(os.environ.get('REAPER_INTERVAL_S', 5))
+# How long a teardown may wait for the session task to unwind
+TEARDOWN_TIMEOUT_S = 5.0
+
+# Why a call ended (stored as metadata["end_reason"])
+REASON_HANGUP = 'hangup'
+REASON_DISCONNECT = 'disconnect'
+REASON_CONNECT_TIMEOUT = 'connect_timeout'
+REASON_IDLE = 'idle'
+REASON_MAX_DURATION = 'max_duration'
+REASON_FAILED = 'failed'
+REASON_SHUTDOWN = 'shutdown'
+# Shed by backpressure.py
+REASON_OVERLOAD = 'overload'
+REASON_SLOW_CONSUMER = 'slow_consumer'
+# Calls that end this way are stored as failed rather than completed
+FAILURE_REASONS = (REASON_CONNECT_TIMEOUT, REASON_FAILED, REASON_OVERLOAD, REASON_SLOW_CONSUMER)
+
+
+def expired(agent, now):
+    """Reason a live call should be reaped now, or None"""
+    if agent.session_done:
+        return REASON_CONNECT_TIMEOUT if agent.session is None else REASON_FAILED
+    age = now - agent.timings.started_at
+    if agent.session is None:
+        # Backstop for wait_for in run_session, e.g. a task that never started
+        if CALL_CONNECT_TIMEOUT_S and age > CALL_CONNECT_TIMEOUT_S + REAPER_INTERVAL_S:
+            return REASON_CONNECT_TIMEOUT
+        return None
+    if CALL_MAX_DURATION_S and age > CALL_MAX_DURATION_S:
+        return REASON_MAX_DURATION
+    if CALL_IDLE_TIMEOUT_S and now - agent.last_activity > CALL_IDLE_TIMEOUT_S:
+        return REASON_IDLE
+    return None
+
+
+class Reaper:
+    """Periodic sweep over the live calls
+
+    calls is the call_id -> agent dict to watch; reap(agent, reason) ends
+    one call and must remove it from calls.
+    """
+
+    def __init__(self, calls, reap, interval=REAPER_INTERVAL_S):
+        self.calls = calls
+        self.reap = reap
+        self.interval = interval
+        self.sweeps = 0
+        self.reaped = 0
+
+    def sweep(self, now=None):
+        """Reap every expired call; returns how many were reaped"""
+        now = time.monotonic() if now is None else now
+        reaped = 0
+        for agent in list(self.calls.values()):
+            reason = expired(agent, now)
+            if reason is None:
+                continue
+            try:
+                self.reap(agent, reason)
+                reaped += 1
+            except Exception:
+                logger.exception("Could not reap call %s", agent.call_id)
+        self.sweeps += 1
+        self.reaped += reaped
+        return reaped
+
+    def run(self, sleep=time.sleep):
+        """Sweep forever (sleep is socketio.sleep under a cooperative server)"""
+        if self.interval <= 0:
+            return
+        while True:
+            sleep(self.interval)
+            self.sweep()
+
+    def stats(self):
+        return {"sweeps": self.sweeps, "reaped": self.reaped, "interval_s": self.interval}
@@ -0,0 +1,232 @@
+"""
+Live Dashboard Stats
+====================
+Incrementally updated call counters pushed to dashboards over Socket.IO,
+replacing 5-second polling of the /api list endpoints.
+
+Counters are updated as calls start and end. A publisher emits only the
+keys that changed as a 'stats_update' event, coalesced to at most
+STATS_PUSH_RATE updates per second. Dashboards get a full snapshot when
+they subscribe.
+
+With several workers (see cluster.py) each worker heartbeats its own
+live counters and the calls it has ended; ClusterStats reads the shared
+call store once and keeps its totals current from those heartbeats, and
+only the worker holding the 'stats' lease pushes updates.
+"""
+
+import os
+import threading
+import time
+
+# At most this many stats_update events per second
+STATS_PUSH_RATE = float(os.environ.get('STATS_PUSH_RATE', 2))
+
+# Dashboard counter name for each call store category
+CATEGORY_TOTALS = {
+    'orders': 'total_orders',
+    'appointments': 'total_appointments',
+    'tickets': 'total_tickets',
+}
+
+
+class LiveStats:
+    """Thread-safe counters with change tracking for delta pushes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self.values = {
+            "total_calls": 0,
+            "active_calls": 0,
+            "total_orders": 0,
+            "total_appointments": 0,
+            "total_tickets": 0,
+            "calls_by_service": {},
+            "avg_call_duration_s": 0.0,
+            "avg_first_audio_ms": 0.0,
+        }
+        self._duration_sum = 0.0
+        self._duration_count = 0
+        self._first_audio_sum = 0.0
+        self._first_audio_count = 0
+        # Calls ended by this process, by (service, status, category)
+        self._ended = {}
+        # Tells a restarted worker with the same id from its predecessor
+        self.started = time.time()
+
+    def seed(self, group_counts):
+        """Start from what the call store already holds"""
+        with self._lock:
+            for service, status, category, count in group_counts:
+                self.values["total_calls"] += count
+                total = CATEGORY_TOTALS.get(category)
+                if total:
+                    self.values[total] += count
+                by_status = self.values["calls_by_service"].setdefault(service, {})
+                by_status[status] = by_status.get(status, 0) + count
+
+    def _bump_service(self, service, status, delta):
+        by_status = self.values["calls_by_service"].setdefault(service, {})
+        by_status[status] = by_status.get(status, 0) + delta
+        if not by_status[status]:
+            del by_status[status]
+        self._dirty.add("calls_by_service")
+
+    def call_started(self, service):
+        with self._lock:
+            self.values["active_calls"] += 1
+            self._bump_service(service, "active", 1)
+            self._dirty.add("active_calls")
+
+    def call_ended(self, service, status, category, duration_s):
+        with self._lock:
+            self.values["active_calls"] -= 1
+            self.values["total_calls"] += 1
+            self._bump_service(service, "active", -1)
+            self._bump_service(service, status, 1)
+            self._dirty.update(("active_calls", "total_calls"))
+            total = CATEGORY_TOTALS.get(category)
+            if total:
+                self.values[total] += 1
+                self._dirty.add(total)
+            key = (service, status, category)
+            self._ended[key] = self._ended.get(key, 0) + 1
+            self._duration_sum += duration_s
+            self._duration_count += 1
+            self.values["avg_call_duration_s"] = round(self._duration_sum / self._duration_count, 2)
+            self._dirty.add("avg_call_duration_s")
+
+    def first_audio(self, seconds):
+        """Time from start_call to the first agent audio sent to the caller"""
+        with self._lock:
+            self._first_audio_sum += seconds
+            self._first_audio_count += 1
+            self.values["avg_first_audio_ms"] = round(
+                1000 * self._first_audio_sum / self._first_audio_count, 1)
+            self._dirty.add("avg_first_audio_ms")
+
+    def snapshot(self):
+        with self._lock:
+            return _copy(self.values)
+
+    def worker_summary(self):
+        """This worker's live counters, for cluster heartbeats"""
+        with self._lock:
+            return {
+                "active_by_service": {
+                    service: by_status["active"]
+                    for service, by_status in self.values["calls_by_service"].items()
+                    if by_status.get("active")
+                },
+                "ended": [[*key, count] for key, count in self._ended.items()],
+                "started": self.started,
+                "duration": [self._duration_sum, self._duration_count],
+                "first_audio": [self._first_audio_sum, self._first_audio_count],
+            }
+
+    def take_delta(self):
+        """Changed keys since the last call (empty dict if nothing changed)"""
+        with self._lock:
+            delta = {key: _copy(self.values[key]) for key in self._dirty}
+            self._dirty.clear()
+            return delta
+
+
+class ClusterStats:
+    """Deployment-wide stats: stored totals plus every worker's live calls
+
+    The call store is counted once, on the first snapshot. After that the
+    totals grow by what each worker reports having ended since then, so a
+    push costs no query. A worker that leaves (or restarts) has its last
+    reported calls folded into the base, so totals never go backwards.
+    """
+
+    def __init__(self, call_store, cluster):
+        self.call_store = call_store
+        self.cluster = cluster
+        self._last = {}
+        self._lock = threading.Lock()
+        # (service, status, category) -> count, from the store and departed workers
+        self._base = None
+        # worker -> (started, ended counts when first seen, latest ended counts)
+        self._seen = {}
+
+    def _totals(self, workers):
+        """Stored call counts as of the workers' latest heartbeats"""
+        with self._lock:
+            # Calls the workers ended before the first snapshot are in the store
+            baseline = self._base is None
+            if baseline:
+                self._base = {}
+                _add(self._base, {tuple(row[:3]): row[3] for row in self.call_store.group_counts()}, {})
+            for worker, (started, first, latest) in list(self._seen.items()):
+                summary = workers.get(worker)
+                if summary is None or summary.get("started") != started:
+                    _add(self._base, latest, first)
+                    del self._seen[worker]
+            totals = dict(self._base)
+            for worker, summary in workers.items():
+                ended = {tuple(row[:3]): row[3] for row in summary.get("ended", ())}
+                seen = self._seen.get(worker)
+                first = seen[1] if seen else (ended if baseline else {})
+                self._seen[worker] = (summary.get("started"), first, ended)
+                _add(totals, ended, first)
+            return totals
+
+    def snapshot(self):
+        stats = LiveStats()
+        workers = self.cluster.workers()
+        stats.seed((*key, count) for key, count in self._totals(workers).items())
+        duration = [0.0, 0]
+        first_audio = [0.0, 0]
+        values = stats.values
+        for summary in workers.values():
+            for service, active in summary["active_by_service"].items():
+                values["active_calls"] += active
+                by_status = values["calls_by_service"].setdefault(service, {})
+                by_status["active"] = by_status.get("active", 0) + active
+            for total, (value_sum, count) in ((duration, summary["duration"]),
+                                              (first_audio, summary["first_audio"])):
+                total[0] += value_sum
+                total[1] += count
+        if duration[1]:
+            values["avg_call_duration_s"] = round(duration[0] / duration[1], 2)
+        if first_audio[1]:
+            values["avg_first_audio_ms"] = round(1000 * first_audio[0] / first_audio[1], 1)
+        values["workers"] = len(workers)
+        return values
+
+    def take_delta(self):
+        """Changed keys since the last push, if this worker is the pusher"""
+        if not self.cluster.try_lead('stats'):
+            self._last = {}
+            return {}
+        current = self.snapshot()
+        delta = {key: value for key, value in current.items() if self._last.get(key) != value}
+        self._last = current
+        return delta
+
+
+def _add(totals, counts, minus):
+    """totals += counts - minus, per (service, status, category)"""
+    for key, count in counts.items():
+        count -= minus.get(key, 0)
+        if count:
+            totals[key] = totals.get(key, 0) + count
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    return value
+
+
+def run_publisher(stats, emit, sleep, rate=STATS_PUSH_RATE):
+    """Push coalesced deltas forever; emit/sleep come from the Socket.IO server"""
+    interval = 1.0 / rate
+    while True:
+        sleep(interval)
+        delta = stats.take_delta()
+        if delta:
+            emit(delta)
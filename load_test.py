@@ -0,0 +1,281 @@
+"""
+Load Generator
+==============
+Drives N simulated callers against a running server over Socket.IO
+(start_call / send_audio_frame / end_call) and reports throughput, turn
+latency percentiles and the server's CPU and RSS (scraped from /metrics).
+
+Each caller speaks a synthetic utterance in real time, goes quiet so the
+server-side VAD ends the turn, and measures the time from its last
+speech frame to the first agent audio frame that comes back.
+
+Run the server offline first:
+    LIVE_BACKEND=fake python app.py
+Then:
+    python load_test.py --callers 50 --turns 3
+    python load_test.py --url https://localhost:5000 --callers 200 --ramp 20 --json report.json
+    python load_test.py --codec mulaw --sample-rate 8000   # telephony-style clients
+
+Needs python-socketio's client extras (requests, websocket-client).
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from array import array
+
+import requests
+import socketio
+
+import numpy as np
+
+from audio_frames import encode_frame, decode_frame
+from audio_codecs import CODEC_MULAW, mulaw_encode
+
+SERVICES = ["restaurant", "hospital", "techsupport", "travel", "support"]
+SAMPLE_RATE = 16000
+CHUNK_SAMPLES = 4096  # what the browser's ScriptProcessor sends
+
+
+def make_chunk(speech):
+    if not speech:
+        return bytes(CHUNK_SAMPLES * 2)
+    step = 2 * math.pi * 180 / SAMPLE_RATE
+    return array('h', (int(5000 * math.sin(i * step)) for i in range(CHUNK_SAMPLES))).tobytes()
+
+
+SPEECH_CHUNK = make_chunk(True)
+SILENCE_CHUNK = make_chunk(False)
+CHUNK_SECONDS = CHUNK_SAMPLES / SAMPLE_RATE
+
+
+class SimulatedCaller:
+    def __init__(self, index, url, service, turns, speech_chunks, silence_chunks, verify_ssl,
+                 audio_offer=None):
+        self.index = index
+        self.url = url
+        self.service = service
+        self.turns = turns
+        self.speech_chunks = speech_chunks
+        self.silence_chunks = silence_chunks
+        self.audio_offer = audio_offer
+        self.audio_in = None
+        self.sio = socketio.Client(reconnection=False, ssl_verify=verify_ssl)
+        self.call_id = None
+        self.started = threading.Event()
+        self.rejected = False
+        self.awaiting_reply_since = None
+        self.reply_event = threading.Event()
+        self.turn_latencies = []
+        self.first_audio_s = None
+        self.start_sent_at = None
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.error = None
+
+        self.sio.on('call_started', self._on_started)
+        self.sio.on('call_rejected', self._on_rejected)
+        self.sio.on('audio_frame', self._on_audio_frame)
+
+    def _on_started(self, data):
+        self.call_id = data['call_id']
+        self.audio_in = data.get('audio_in')
+        self.started.set()
+
+    def _on_rejected(self, data):
+        self.rejected = True
+        self.started.set()
+
+    def _on_audio_frame(self, frame):
+        now = time.monotonic()
+        audio = decode_frame(frame)
+        if audio.call_id != self.call_id:
+            return
+        self.frames_in += 1
+        self.bytes_in += len(audio.pcm)
+        if self.first_audio_s is None:
+            self.first_audio_s = now - self.start_sent_at
+        if self.awaiting_reply_since is not None:
+            self.turn_latencies.append(now - self.awaiting_reply_since)
+            self.awaiting_reply_since = None
+            self.reply_event.set()
+
+    def _send(self, seq, chunk):
+        if self.audio_in and self.audio_in['codec'] == CODEC_MULAW:
+            chunk = mulaw_encode(np.frombuffer(chunk, dtype='<i2'))
+        frame = encode_frame(self.call_id, seq, SAMPLE_RATE, chunk, int(seq * CHUNK_SECONDS * 1000))
+        self.bytes_out += len(frame)
+        self.sio.emit('send_audio_frame', frame)
+
+    def run(self):
+        try:
+            self.sio.connect(self.url, transports=['websocket'])
+            self.start_sent_at = time.monotonic()
+            start = {'service': self.service, 'transport': 'binary'}
+            if self.audio_offer:
+                start['audio'] = self.audio_offer
+            self.sio.emit('start_call', start)
+            if not self.started.wait(30):
+                raise TimeoutError("no call_started")
+            if self.rejected:
+                return
+
+            seq = 0
+            next_due = time.monotonic()
+            for _ in range(self.turns):
+                self.reply_event.clear()
+                for i in range(self.speech_chunks + self.silence_chunks):
+                    speaking = i < self.speech_chunks
+                    self._send(seq, SPEECH_CHUNK if speaking else SILENCE_CHUNK)
+                    seq += 1
+                    if i == self.speech_chunks - 1:
+                        self.awaiting_reply_since = time.monotonic()
+                    # Real-time pacing, like a microphone
+                    next_due += CHUNK_SECONDS
+                    time.sleep(max(0.0, next_due - time.monotonic()))
+                self.reply_event.wait(15)
+                time.sleep(0.5)
+                next_due = time.monotonic()
+            self.sio.emit('end_call', {'call_id': self.call_id})
+            time.sleep(0.2)
+        except Exception as e:
+            self.error = repr(e)
+        finally:
+            if self.sio.connected:
+                self.sio.disconnect()
+
+
+def scrape_process_metrics(url, verify_ssl):
+    try:
+        text = requests.get(f"{url}/metrics", timeout=5, verify=verify_ssl).text
+    except requests.RequestException:
+        return None
+    values = {}
+    for name in ("process_cpu_seconds_total", "process_resident_memory_bytes"):
+        match = re.search(rf"^{name} ([0-9.e+]+)$", text, re.MULTILINE)
+        if match:
+            values[name] = float(match.group(1))
+    return values
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_load(args):
+    verify_ssl = not args.insecure
+    before = scrape_process_metrics(args.url, verify_ssl)
+    peak_rss = [before.get("process_resident_memory_bytes", 0) if before else 0]
+    stop_sampling = threading.Event()
+
+    def sample_rss():
+        while not stop_sampling.wait(1.0):
+            sample = scrape_process_metrics(args.url, verify_ssl)
+            if sample:
+                peak_rss[0] = max(peak_rss[0], sample.get("process_resident_memory_bytes", 0))
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+
+    services = SERVICES if args.service == "all" else [args.service]
+    speech_chunks = max(1, round(args.speech_ms / 1000 / CHUNK_SECONDS))
+    silence_chunks = max(1, round(args.silence_ms / 1000 / CHUNK_SECONDS))
+    audio_offer = None
+    if args.codec != "pcm16" or args.sample_rate:
+        audio_offer = {"codecs": [args.codec], "sample_rate": args.sample_rate}
+    callers = [
+        SimulatedCaller(i, args.url, random.choice(services), args.turns,
+                        speech_chunks, silence_chunks, verify_ssl, audio_offer)
+        for i in range(args.callers)
+    ]
+    threads = [threading.Thread(target=c.run, daemon=True) for c in callers]
+
+    started = time.monotonic()
+    for i, thread in enumerate(threads):
+        thread.start()
+        if args.ramp:
+            time.sleep(args.ramp / args.callers)
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - started
+
+    stop_sampling.set()
+    after = scrape_process_metrics(args.url, verify_ssl)
+
+    latencies = [lat for c in callers for lat in c.turn_latencies]
+    first_audio = [c.first_audio_s for c in callers if c.first_audio_s is not None]
+    completed = [c for c in callers if not c.error and not c.rejected and c.call_id]
+    report = {
+        "callers": args.callers,
+        "completed": len(completed),
+        "rejected": sum(c.rejected for c in callers),
+        "errors": sum(bool(c.error) for c in callers),
+        "wall_s": round(wall, 2),
+        "calls_per_min": round(60 * len(completed) / wall, 2) if wall else 0,
+        "turns": len(latencies),
+        "turn_latency_p50_ms": _ms(percentile(latencies, 0.5)),
+        "turn_latency_p95_ms": _ms(percentile(latencies, 0.95)),
+        "turn_latency_p99_ms": _ms(percentile(latencies, 0.99)),
+        "turn_latency_mean_ms": _ms(statistics.mean(latencies)) if latencies else None,
+        "first_audio_p50_ms": _ms(percentile(first_audio, 0.5)),
+        "first_audio_p99_ms": _ms(percentile(first_audio, 0.99)),
+        "audio_frames_in": sum(c.frames_in for c in callers),
+        "bytes_up": sum(c.bytes_out for c in callers),
+        "bytes_down": sum(c.bytes_in for c in callers),
+    }
+    if before and after:
+        cpu = after["process_cpu_seconds_total"] - before["process_cpu_seconds_total"]
+        report["server_cpu_s"] = round(cpu, 2)
+        report["server_cpu_pct"] = round(100 * cpu / wall, 1) if wall else None
+        report["server_rss_mb_peak"] = round(max(peak_rss[0], after["process_resident_memory_bytes"]) / 2**20, 1)
+    sample_errors = sorted({c.error for c in callers if c.error})[:5]
+    if sample_errors:
+        report["sample_errors"] = sample_errors
+    return report
+
+
+def _ms(seconds):
+    return round(1000 * seconds, 1) if seconds is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated-caller load test")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--callers", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--service", default="all", choices=SERVICES + ["all"])
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which callers join")
+    parser.add_argument("--speech-ms", type=int, default=1500)
+    parser.add_argument("--silence-ms", type=int, default=1000)
+    parser.add_argument("--codec", default="pcm16", choices=["pcm16", "mulaw"],
+                        help="audio codec to offer in start_call")
+    parser.add_argument("--sample-rate", type=int, help="sample rate to offer (e.g. 8000)")
+    parser.add_argument("--insecure", action="store_true", help="skip TLS verification (adhoc certs)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"📈 Load test: {args.callers} callers x {args.turns} turns against {args.url}")
+    print("=" * 60)
+    report = run_load(args)
+    for key, value in report.items():
+        print(f"  {key:24} {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📝 Report written to {args.json}")
+    return 0 if report["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+Call Metrics
+============
+Minimal Prometheus-style metrics (no client library needed) plus the
+per-call timing record kept by each AICallAgent.
+
+Histograms are exported in the standard text format. Each one also gets
+a companion `<name>_quantile` gauge with p50/p95/p99 estimates per service,
+interpolated from the buckets.
+"""
+
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time"""
+
+    def __init__(self, name, help, read, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}",
+                f"{self.name} {self.read()}"]
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=('service',), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+            series[2] += 1
+
+    def quantile(self, q, *labels):
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        with self._lock:
+            series = self.series.get(labels)
+            if not series or not series[2]:
+                return None
+            counts, total = series[0], series[2]
+            rank = q * total
+            seen = 0
+            lower = 0.0
+            for i, count in enumerate(counts):
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                if count and seen + count >= rank:
+                    return lower + (upper - lower) * (rank - seen) / count
+                seen += count
+                lower = upper
+            return self.buckets[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        quantile_lines = []
+        with self._lock:
+            items = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self.series.items())
+        for labels, (counts, total_sum, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = (("le", bound),)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total_sum}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {total}")
+            for q in QUANTILES:
+                value = self.quantile(q, *labels)
+                quantile_lines.append(
+                    f"{self.name}_quantile{_labels(self.labelnames, labels, (('quantile', q),))} {value}")
+        if quantile_lines:
+            lines += [f"# HELP {self.name}_quantile Estimated quantiles of {self.name}",
+                      f"# TYPE {self.name}_quantile gauge"] + quantile_lines
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def process_cpu_seconds():
+    return round(time.process_time(), 3)
+
+
+def process_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, AttributeError, ValueError):
+        if resource is None:
+            return 0
+        # Falls back to peak RSS (KiB on Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Shared registry and call metrics
+registry = Registry()
+connect_seconds = registry.register(Histogram(
+    "call_connect_seconds", "Time to get a Live session at call start (warm or fresh)"))
+first_audio_seconds = registry.register(Histogram(
+    "call_first_audio_seconds", "Time from start_call to the first agent audio frame"))
+turn_latency_seconds = registry.register(Histogram(
+    "call_turn_latency_seconds", "Time from end of caller speech to the first model audio"))
+audio_in_bytes = registry.register(Counter(
+    "call_audio_in_bytes_total", "Caller audio bytes received", ("service",)))
+audio_out_bytes = registry.register(Counter(
+    "call_audio_out_bytes_total", "Agent audio bytes sent to callers", ("service",)))
+audio_in_dropped = registry.register(Counter(
+    "call_audio_in_dropped_total", "Caller audio chunks dropped on a full inbound buffer (silence, oldest)",
+    ("service", "reason")))
+audio_out_dropped = registry.register(Counter(
+    "call_audio_out_dropped_total", "Agent audio frames dropped on a full outbound buffer (silence, oldest)",
+    ("service", "reason")))
+audio_coalesced = registry.register(Counter(
+    "call_audio_coalesced_total", "Audio chunks merged into a neighbour to catch up a backlog",
+    ("service", "direction")))
+client_stalls = registry.register(Counter(
+    "call_client_stalls_total", "Times a caller's socket fell behind and agent audio was held", ("service",)))
+calls_rejected = registry.register(Counter(
+    "call_rejected_total", "start_call refused (unknown_service, capacity, shutdown, cpu, queue)", ("service", "reason")))
+session_pool_requests = registry.register(Counter(
+    "call_session_pool_requests_total", "Session pool lookups at call start", ("service", "result")))
+rtp_packets = registry.register(Counter(
+    "call_rtp_packets_total", "RTP packets at the media gateway (received, lost, late)", ("service", "result")))
+calls_reaped = registry.register(Counter(
+    "call_reaped_total", "Calls ended by the server, not the caller (see lifecycle.py)", ("service", "reason")))
+recording_dropped = registry.register(Counter(
+    "call_recording_dropped_total", "Audio blocks not recorded because the writer fell behind", ("service",)))
+calls_leaked = registry.register(Counter(
+    "call_leaked_total", "Calls whose teardown failed or left the session task running", ("service",)))
+registry.register(Gauge("process_cpu_seconds_total", "CPU time used by this process",
+                        process_cpu_seconds, kind="counter"))
+registry.register(Gauge("process_resident_memory_bytes", "Resident memory of this process", process_rss_bytes))
+
+
+class CallTimings:
+    """Per-call timing and volume counters, summarised into call metadata"""
+
+    def __init__(self, service):
+        self.service = service
+        self.started_at = time.monotonic()
+        self.connect_s = None
+        self.first_audio_s = None
+        self.speech_ended_at = None
+        self.turn_latencies = []
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.max_inbound_queue = 0
+        self.max_emit_backlog = 0
+
+    def connected(self, seconds):
+        self.connect_s = seconds
+        connect_seconds.observe(seconds, self.service)
+
+    def audio_in(self, nbytes, queue_depth):
+        self.bytes_in += nbytes
+        self.max_inbound_queue = max(self.max_inbound_queue, queue_depth)
+        audio_in_bytes.inc(nbytes, self.service)
+
+    def audio_out(self, nbytes, backlog):
+        if self.first_audio_s is None:
+            self.first_audio_s = time.monotonic() - self.started_at
+            first_audio_seconds.observe(self.first_audio_s, self.service)
+        self.bytes_out += nbytes
+        self.max_emit_backlog = max(self.max_emit_backlog, backlog)
+        audio_out_bytes.inc(nbytes, self.service)
+
+    def speech_ended(self):
+        self.speech_ended_at = time.monotonic()
+
+    def model_audio(self):
+        """First model audio after the caller stopped talking closes a turn"""
+        if self.speech_ended_at is not None:
+            latency = time.monotonic() - self.speech_ended_at
+            self.speech_ended_at = None
+            self.turn_latencies.append(latency)
+            turn_latency_seconds.observe(latency, self.service)
+
+    def summary(self):
+        turns = sorted(self.turn_latencies)
+
+        def ms(seconds):
+            return round(1000 * seconds, 1) if seconds is not None else None
+
+        def pick(q):
+            return ms(turns[min(len(turns) - 1, int(q * len(turns)))]) if turns else None
+
+        return {
+            "connect_ms": ms(self.connect_s),
+            "first_audio_ms": ms(self.first_audio_s),
+            "turns": len(turns),
+            "turn_latency_p50_ms": pick(0.5),
+            "turn_latency_p95_ms": pick(0.95),
+            "turn_latency_max_ms": ms(turns[-1]) if turns else None,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "max_inbound_queue": self.max_inbound_queue,
+            "max_emit_backlog": self.max_emit_backlog,
+        }
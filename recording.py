@@ -0,0 +1,357 @@
+"""
+Call Recording
+==============
+Optional per-service recording of both sides of a call, written to disk
+as it happens.
+
+Each recorded call gets a directory under RECORDINGS_DIR with one track
+per direction:
+    caller   what the caller said, decoded to 16 kHz PCM
+    agent    what the agent played, 24 kHz PCM as paced out
+Tracks are split into chunk files of RECORDING_CHUNK_S seconds, each a
+complete 16-bit mono WAV, so no file grows without bound and a crash
+loses at most the chunk being written. index.json lists every chunk's
+start sample and size (a small seek index); it is rewritten atomically
+whenever a chunk closes.
+
+Both tracks share the call's wall clock: when a track has been silent
+(the agent between turns, a caller whose client stopped sending) the
+gap is filled with silence, so the two play back in step.
+
+Recorder.write() only puts the audio on a queue. One background thread
+does all file I/O, so recording never blocks a call loop and never holds
+a whole call in memory. If the writer falls behind by more than
+RECORDING_QUEUE_SIZE blocks, audio is dropped and counted rather than
+queued without limit.
+
+serve_range() exposes a track as one virtual WAV file (a header plus the
+chunks' PCM back to back) with HTTP range support, reading the chunks
+through mmap.
+
+Configuration (environment):
+    RECORD_SERVICES        comma separated services to record, or "all" (default none)
+    RECORDINGS_DIR         where recordings go (default recordings)
+    RECORDING_CHUNK_S      seconds of audio per chunk file (default 60)
+    RECORDING_QUEUE_SIZE   audio blocks waiting for the writer (default 2048)
+"""
+
+import json
+import mmap
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import logging
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RECORD_SERVICES = {s.strip() for s in os.environ.get('RECORD_SERVICES', '').split(',') if s.strip()}
+RECORDINGS_DIR = os.environ.get('RECORDINGS_DIR', 'recordings')
+RECORDING_CHUNK_S = float(os.environ.get('RECORDING_CHUNK_S', 60))
+RECORDING_QUEUE_SIZE = int(os.environ.get('RECORDING_QUEUE_SIZE', 2048))
+
+TRACK_CALLER = 'caller'
+TRACK_AGENT = 'agent'
+SAMPLE_WIDTH = 2
+WAV_HEADER_SIZE = 44
+INDEX_FILE = 'index.json'
+# Late audio within this much of the track's position is appended as is
+GAP_TOLERANCE_S = 0.1
+# Largest slice of a chunk copied per response block
+SERVE_BLOCK = 64 * 1024
+_CALL_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+_ZEROS = bytes(64 * 1024)
+
+
+def recording_enabled(service):
+    return 'all' in RECORD_SERVICES or service in RECORD_SERVICES
+
+
+def wav_header(sample_rate, data_bytes):
+    """44-byte header for 16-bit mono PCM"""
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_bytes, b'WAVE', b'fmt ', 16, 1, 1,
+        sample_rate, sample_rate * SAMPLE_WIDTH, SAMPLE_WIDTH, 8 * SAMPLE_WIDTH, b'data', data_bytes)
+
+
+class _Track:
+    """Writer-thread state for one direction of one call"""
+
+    __slots__ = ("name", "rate", "directory", "chunk_bytes", "chunks", "file", "file_bytes",
+                 "total_bytes")
+
+    def __init__(self, name, rate, directory):
+        self.name = name
+        self.rate = rate
+        self.directory = directory
+        chunk_samples = max(1, int(RECORDING_CHUNK_S * rate))
+        self.chunk_bytes = chunk_samples * SAMPLE_WIDTH
+        self.chunks = []
+        self.file = None
+        self.file_bytes = 0
+        self.total_bytes = 0
+
+    def write(self, pcm, at_s):
+        """Append PCM heard at at_s seconds into the call; returns True if a chunk closed"""
+        behind = int(at_s * self.rate) * SAMPLE_WIDTH - self.total_bytes
+        closed = False
+        if behind > GAP_TOLERANCE_S * self.rate * SAMPLE_WIDTH:
+            # The track was quiet: keep it on the call's clock
+            while behind > 0:
+                size = min(behind, len(_ZEROS))
+                closed |= self._append(memoryview(_ZEROS)[:size])
+                behind -= size
+        return self._append(memoryview(pcm)[:len(pcm) & ~1]) or closed
+
+    def _append(self, data):
+        closed = False
+        while data:
+            if self.file is None:
+                self._open_chunk()
+            room = self.chunk_bytes - self.file_bytes
+            part, data = data[:room], data[room:]
+            self.file.write(part)
+            self.file_bytes += len(part)
+            self.total_bytes += len(part)
+            if self.file_bytes >= self.chunk_bytes:
+                self._close_chunk()
+                closed = True
+        return closed
+
+    def _open_chunk(self):
+        name = f"{self.name}-{len(self.chunks):04d}.wav"
+        self.file = open(os.path.join(self.directory, name), 'wb')
+        self.file.write(wav_header(self.rate, 0))
+        self.file_bytes = 0
+        self.chunks.append({"file": name, "start_sample": self.total_bytes // SAMPLE_WIDTH,
+                            "bytes": 0})
+
+    def _close_chunk(self):
+        # Patch the sizes now that the chunk is complete
+        self.file.seek(0)
+        self.file.write(wav_header(self.rate, self.file_bytes))
+        self.file.close()
+        self.file = None
+        self.chunks[-1]["bytes"] = self.file_bytes
+
+    def close(self):
+        if self.file is not None:
+            self._close_chunk()
+
+    def index(self):
+        # Only completed chunks; the open one is not readable yet
+        done = self.chunks if self.file is None else self.chunks[:-1]
+        return {
+            "sample_rate": self.rate,
+            "samples": sum(c["bytes"] for c in done) // SAMPLE_WIDTH,
+            "chunks": done,
+        }
+
+
+class Recorder:
+    """Per-call handle; write() is safe from any thread and never blocks"""
+
+    __slots__ = ("writer", "call_id", "service", "rates", "started", "dropped", "closed")
+
+    def __init__(self, writer, call_id, service, rates):
+        self.writer = writer
+        self.call_id = call_id
+        self.service = service
+        self.rates = rates
+        self.started = time.monotonic()
+        self.dropped = 0
+        self.closed = False
+        writer.queue.put(('open', self, None, None))
+
+    def write(self, track, pcm):
+        if self.closed:
+            return
+        if self.writer.queue.qsize() >= self.writer.queue_size:
+            self.dropped += 1
+            metrics.recording_dropped.inc(1, self.service)
+            return
+        self.writer.queue.put(('write', self, track, (pcm, time.monotonic() - self.started)))
+
+    def close(self):
+        """Finish the recording; the writer finalizes it in the background"""
+        if not self.closed:
+            self.closed = True
+            self.writer.queue.put(('close', self, None, None))
+
+    def stats(self):
+        return {"dropped_blocks": self.dropped, "url": f"/api/calls/{self.call_id}/recording"}
+
+
+class RecordingWriter:
+    """The background thread that owns every open recording file"""
+
+    def __init__(self, directory=RECORDINGS_DIR, queue_size=RECORDING_QUEUE_SIZE):
+        self.directory = directory
+        # Unbounded so open/close always get through; write() bounds the audio
+        self.queue = queue.SimpleQueue()
+        self.queue_size = queue_size
+        self.recordings = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, call_id, service, rates):
+        """Recorder for a call, or None if its service is not recorded"""
+        if not recording_enabled(service):
+            return None
+        if not _CALL_ID.match(call_id or ''):
+            logger.warning("Not recording call with unsafe id %r", call_id)
+            return None
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='recording-writer', daemon=True)
+                self._thread.start()
+        return Recorder(self, call_id, service, rates)
+
+    def _run(self):
+        while True:
+            kind, recorder, track, payload = self.queue.get()
+            if kind == 'stop':
+                break
+            try:
+                if kind == 'write':
+                    self._write(recorder, track, *payload)
+                elif kind == 'open':
+                    self._open(recorder)
+                elif kind == 'close':
+                    self._finish(recorder)
+            except OSError as e:
+                logger.error("Recording %s failed: %s", recorder.call_id, e)
+        for recorder in list(self.recordings):
+            self._finish(recorder)
+
+    def _open(self, recorder):
+        # The id names a directory; never let it leave RECORDINGS_DIR
+        if not _CALL_ID.match(recorder.call_id or ''):
+            logger.error("Refusing to record call with unsafe id %r", recorder.call_id)
+            return
+        directory = os.path.join(self.directory, recorder.call_id)
+        os.makedirs(directory, exist_ok=True)
+        self.recordings[recorder] = {name: _Track(name, rate, directory)
+                                     for name, rate in recorder.rates.items()}
+        self._write_index(recorder, complete=False)
+
+    def _write(self, recorder, track, pcm, at_s):
+        tracks = self.recordings.get(recorder)
+        if tracks is not None and tracks[track].write(pcm, at_s):
+            self._write_index(recorder, complete=False)
+
+    def _finish(self, recorder):
+        tracks = self.recordings.get(recorder)
+        if tracks is None:
+            return
+        for track in tracks.values():
+            track.close()
+        self._write_index(recorder, complete=True)
+        del self.recordings[recorder]
+
+    def _write_index(self, recorder, complete):
+        tracks = self.recordings[recorder]
+        index = {
+            "call_id": recorder.call_id,
+            "service": recorder.service,
+            "complete": complete,
+            "dropped_blocks": recorder.dropped,
+            "tracks": {name: track.index() for name, track in tracks.items()},
+        }
+        path = os.path.join(self.directory, recorder.call_id, INDEX_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(index, f)
+        os.replace(path + '.tmp', path)
+
+    def close(self, timeout=10):
+        """Finish open recordings and stop the thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self.queue.put(('stop', None, None, None))
+        thread.join(timeout)
+
+
+def load_index(call_id, directory=RECORDINGS_DIR):
+    """A recording's index.json, or None"""
+    if not _CALL_ID.match(call_id or ''):
+        return None
+    try:
+        with open(os.path.join(directory, call_id, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single 'bytes=' range, None for the whole
+    body, or ValueError if it cannot be satisfied"""
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        # Multiple ranges are not supported; send everything
+        return None
+    first, _, last = spec.strip().partition('-')
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        raise ValueError("empty range")
+    if start > end or start >= size:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def serve_range(call_id, track, range_header, directory=RECORDINGS_DIR):
+    """(status, headers, body iterator) for a track as one WAV, or None if absent
+
+    Raises ValueError for an unsatisfiable range.
+    """
+    index = load_index(call_id, directory)
+    if index is None or track not in index["tracks"]:
+        return None
+    info = index["tracks"][track]
+    data_bytes = info["samples"] * SAMPLE_WIDTH
+    size = WAV_HEADER_SIZE + data_bytes
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        raise ValueError(f"bytes */{size}")
+    start, end = byte_range or (0, size - 1)
+    headers = {
+        'Content-Type': 'audio/wav',
+        'Accept-Ranges': 'bytes',
+        'Content-Length': str(end - start + 1),
+    }
+    if byte_range:
+        headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+    folder = os.path.join(directory, call_id)
+    body = _read_range(folder, info, wav_header(info["sample_rate"], data_bytes), start, end + 1)
+    return (206 if byte_range else 200), headers, body
+
+
+def _read_range(folder, info, header, start, stop):
+    """Yield bytes [start, stop) of the virtual WAV (header + chunk data)"""
+    if start < WAV_HEADER_SIZE:
+        yield header[start:min(stop, WAV_HEADER_SIZE)]
+    offset = WAV_HEADER_SIZE
+    for chunk in info["chunks"]:
+        chunk_stop = offset + chunk["bytes"]
+        if chunk_stop > start and offset < stop and chunk["bytes"]:
+            lo = max(start, offset) - offset + WAV_HEADER_SIZE
+            hi = min(stop, chunk_stop) - offset + WAV_HEADER_SIZE
+            with open(os.path.join(folder, chunk["file"]), 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                for block in range(lo, hi, SERVE_BLOCK):
+                    yield view[block:min(hi, block + SERVE_BLOCK)]
+        offset = chunk_stop
+        if offset >= stop:
+            break
@@ -0,0 +1,328 @@
+"""
+Redis Stand-in
+==============
+A small in-process server speaking the Redis protocol (RESP2), enough
+for the Socket.IO message queue and the cluster registry to run locally
+and in tests without installing Redis.
+
+Supported: PING, ECHO, SELECT, CLIENT, INFO, QUIT, GET, SET (EX/PX/NX/XX),
+DEL, EXISTS, EXPIRE, TTL, KEYS, INCR, INCRBY, HSET, HGET, HDEL, HGETALL,
+HLEN, PUBLISH, SUBSCRIBE, UNSUBSCRIBE, PSUBSCRIBE, PUNSUBSCRIBE.
+Data lives in memory only. Not for production.
+
+    python redis_standin.py --port 6379
+    MESSAGE_QUEUE_URL=redis://127.0.0.1:6379/0 python app.py
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import threading
+import time
+
+
+class RespError(Exception):
+    pass
+
+
+def _encode(value):
+    """Python value -> RESP2 bytes"""
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        # Simple strings are status replies ("OK", "PONG")
+        return b"+" + value.encode() + b"\r\n"
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, RespError):
+        return b"-" + str(value).encode() + b"\r\n"
+    if isinstance(value, (list, tuple)):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(v) for v in value)
+    raise TypeError(f"Cannot encode {type(value)}")
+
+
+async def _read_command(reader):
+    """One command as a list of bytes (array or inline form), None on EOF"""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        header = await reader.readline()
+        if not header.startswith(b"$"):
+            raise RespError("ERR Protocol error")
+        size = int(header[1:])
+        data = await reader.readexactly(size + 2)
+        args.append(data[:-2])
+    return args
+
+
+class RedisStandIn:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        # channel/pattern -> set of client writers
+        self.channels = {}
+        self.patterns = {}
+
+    # Keyspace
+
+    def _alive(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _get(self, key, kind):
+        if not self._alive(key):
+            return None
+        value = self.data[key]
+        if not isinstance(value, kind):
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def cmd_ping(self, client, *args):
+        return args[0] if args else "PONG"
+
+    def cmd_echo(self, client, message):
+        return message
+
+    def cmd_select(self, client, db):
+        return "OK"
+
+    def cmd_client(self, client, *args):
+        return "OK"
+
+    def cmd_info(self, client, *args):
+        return b"# Server\r\nredis_version:7.0.0-standin\r\n"
+
+    def cmd_get(self, client, key):
+        return self._get(key, bytes)
+
+    def cmd_set(self, client, key, value, *options):
+        options = [o.upper() for o in options]
+        ttl = None
+        if b"EX" in options:
+            ttl = float(options[options.index(b"EX") + 1])
+        if b"PX" in options:
+            ttl = float(options[options.index(b"PX") + 1]) / 1000
+        exists = self._alive(key)
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return None
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if ttl is not None:
+            self.expires[key] = time.monotonic() + ttl
+        return "OK"
+
+    def cmd_del(self, client, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self.data[key]
+                self.expires.pop(key, None)
+                removed += 1
+        return removed
+
+    def cmd_exists(self, client, *keys):
+        return sum(self._alive(key) for key in keys)
+
+    def cmd_expire(self, client, key, seconds):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + float(seconds)
+        return 1
+
+    def cmd_ttl(self, client, key):
+        if not self._alive(key):
+            return -2
+        deadline = self.expires.get(key)
+        return -1 if deadline is None else int(deadline - time.monotonic())
+
+    def cmd_keys(self, client, pattern):
+        pattern = pattern.decode()
+        return [key for key in list(self.data) if self._alive(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+
+    def cmd_incr(self, client, key):
+        return self.cmd_incrby(client, key, b"1")
+
+    def cmd_incrby(self, client, key, amount):
+        value = int(self._get(key, bytes) or 0) + int(amount)
+        self.data[key] = str(value).encode()
+        return value
+
+    def cmd_hset(self, client, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise RespError("ERR wrong number of arguments for 'hset' command")
+        table = self._get(key, dict)
+        if table is None:
+            table = self.data[key] = {}
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in table
+            table[field] = value
+        return added
+
+    def cmd_hget(self, client, key, field):
+        table = self._get(key, dict)
+        return table.get(field) if table else None
+
+    def cmd_hdel(self, client, key, *fields):
+        table = self._get(key, dict)
+        if not table:
+            return 0
+        removed = sum(table.pop(field, None) is not None for field in fields)
+        if not table:
+            del self.data[key]
+        return removed
+
+    def cmd_hgetall(self, client, key):
+        table = self._get(key, dict) or {}
+        return [item for pair in table.items() for item in pair]
+
+    def cmd_hlen(self, client, key):
+        return len(self._get(key, dict) or {})
+
+    # Pub/sub
+
+    def cmd_publish(self, client, channel, message):
+        receivers = 0
+        for writer in list(self.channels.get(channel, ())):
+            writer.write(_encode([b"message", channel, message]))
+            receivers += 1
+        for pattern, writers in list(self.patterns.items()):
+            if fnmatch.fnmatchcase(channel.decode(), pattern.decode()):
+                for writer in list(writers):
+                    writer.write(_encode([b"pmessage", pattern, channel, message]))
+                    receivers += 1
+        return receivers
+
+    def _subscriptions(self, client):
+        return (sum(client in writers for writers in self.channels.values())
+                + sum(client in writers for writers in self.patterns.values()))
+
+    def _subscribe(self, client, table, kind, names):
+        for name in names:
+            table.setdefault(name, set()).add(client)
+            client.write(_encode([kind, name, self._subscriptions(client)]))
+
+    def _unsubscribe(self, client, table, kind, names):
+        names = names or [name for name, writers in table.items() if client in writers]
+        if not names:
+            client.write(_encode([kind, None, self._subscriptions(client)]))
+        for name in names:
+            writers = table.get(name)
+            if writers:
+                writers.discard(client)
+                if not writers:
+                    del table[name]
+            client.write(_encode([kind, name, self._subscriptions(client)]))
+
+    def cmd_subscribe(self, client, *channels):
+        self._subscribe(client, self.channels, b"subscribe", channels)
+
+    def cmd_unsubscribe(self, client, *channels):
+        self._unsubscribe(client, self.channels, b"unsubscribe", channels)
+
+    def cmd_psubscribe(self, client, *patterns):
+        self._subscribe(client, self.patterns, b"psubscribe", patterns)
+
+    def cmd_punsubscribe(self, client, *patterns):
+        self._unsubscribe(client, self.patterns, b"punsubscribe", patterns)
+
+    # Connections
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    command = await _read_command(reader)
+                except (RespError, ValueError) as e:
+                    writer.write(_encode(RespError(str(e) or "ERR Protocol error")))
+                    break
+                if command is None:
+                    break
+                if not command:
+                    continue
+                name = command[0].decode().lower()
+                if name == "quit":
+                    writer.write(_encode("OK"))
+                    break
+                handler = getattr(self, f"cmd_{name}", None)
+                if handler is None:
+                    reply = RespError(f"ERR unknown command '{name}'")
+                else:
+                    try:
+                        reply = handler(writer, *command[1:])
+                    except RespError as e:
+                        reply = e
+                    except (TypeError, ValueError, IndexError):
+                        reply = RespError(f"ERR wrong arguments for '{name}' command")
+                if name in ("subscribe", "unsubscribe", "psubscribe", "punsubscribe"):
+                    if isinstance(reply, RespError):
+                        writer.write(_encode(reply))
+                elif name == "ping" and self._subscriptions(writer):
+                    writer.write(_encode([b"pong", command[1] if len(command) > 1 else b""]))
+                else:
+                    writer.write(_encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for table in (self.channels, self.patterns):
+                for name in [n for n, writers in table.items() if writer in writers]:
+                    table[name].discard(writer)
+                    if not table[name]:
+                        del table[name]
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=6379):
+    standin = RedisStandIn()
+    server = await asyncio.start_server(standin.handle, host, port)
+    return server
+
+
+def start_in_thread(host="127.0.0.1", port=6379):
+    """Run a stand-in on a daemon thread; returns once it is listening"""
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(serve(host, port))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="redis-standin", daemon=True).start()
+    ready.wait(5)
+    return f"redis://{host}:{port}/0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis-compatible stand-in for local runs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    async def run():
+        server = await serve(args.host, args.port)
+        print(f"🧪 Redis stand-in listening on redis://{args.host}:{args.port}/0")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n✅ Stand-in stopped")
+
+
+if __name__ == "__main__":
+    main()
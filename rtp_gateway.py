@@ -0,0 +1,346 @@
+"""
+RTP Media Gateway
+=================
+Phone-style entry into the same call pipeline the browser uses.
+
+Each service listens on its own UDP port, like a number on a trunk.
+Service i of SERVICES gets RTP_BASE_PORT + 2 * i, leaving the odd port
+for RTCP. A new source address on a port starts a call for that
+service. Its 8 kHz G.711 payload (PT 0 mu-law or PT 8 A-law) feeds the
+agent, and the agent's paced 20 ms output frames go back to the same
+address as RTP (symmetric RTP). The call ends after RTP_IDLE_TIMEOUT_S
+without packets. There is no SIP signalling: the port picks the service,
+and whoever sends to it is the caller.
+
+Receive path, built for hundreds of 20 ms streams per process:
+- one non-blocking socket per port, read with recvfrom_into() into a
+  single preallocated buffer (no bytes object per packet)
+- payloads are copied into a preallocated per-stream batch buffer and
+  handed to the agent every RTP_BATCH_MS, one bytes object per batch
+- counters are plain ints on the stream, folded into metrics per batch
+
+The gateway runs its own selector event loop on a thread. Outbound
+packets are sent straight from the call's engine loop with the port's
+socket; UDP sendto() needs no hop between loops.
+
+Configuration (environment):
+    RTP_GATEWAY          1 to start the gateway with app.py (default off)
+    RTP_HOST             bind address (default 0.0.0.0)
+    RTP_BASE_PORT        first service port (default 40000)
+    RTP_BATCH_MS         inbound audio per hand-off (default 40)
+    RTP_IDLE_TIMEOUT_S   end a call after this long without packets (default 5)
+
+rtp_sender.py is a local RTP caller for trying it out.
+"""
+
+import asyncio
+import os
+import random
+import socket
+import struct
+import threading
+import time
+import logging
+
+from audio_codecs import CODEC_MULAW, CODEC_ALAW
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RTP_GATEWAY_ENABLED = os.environ.get('RTP_GATEWAY', '0') == '1'
+RTP_HOST = os.environ.get('RTP_HOST', '0.0.0.0')
+RTP_BASE_PORT = int(os.environ.get('RTP_BASE_PORT', 40000))
+RTP_BATCH_MS = int(os.environ.get('RTP_BATCH_MS', 40))
+RTP_IDLE_TIMEOUT_S = float(os.environ.get('RTP_IDLE_TIMEOUT_S', 5))
+
+RTP_SAMPLE_RATE = 8000
+RTP_HEADER = struct.Struct('!BBHII')
+RTP_VERSION = 2
+# Static payload types for 8 kHz G.711
+PAYLOAD_TYPES = {0: CODEC_MULAW, 8: CODEC_ALAW}
+PAYLOAD_TYPE_OF = {codec: pt for pt, codec in PAYLOAD_TYPES.items()}
+MAX_PACKET = 2048
+# Packets drained per readiness callback before yielding to other ports
+READ_BUDGET = 64
+SWEEP_INTERVAL_S = 1.0
+
+
+def service_ports(services, base_port=RTP_BASE_PORT):
+    """service -> RTP port, in SERVICES order"""
+    return {service: base_port + 2 * index for index, service in enumerate(services)}
+
+
+def parse_header(buf, size):
+    """(payload_type, seq, timestamp, ssrc, payload_start, payload_end) or None"""
+    if size < RTP_HEADER.size:
+        return None
+    first, second, seq, timestamp, ssrc = RTP_HEADER.unpack_from(buf)
+    if first >> 6 != RTP_VERSION:
+        return None
+    start = RTP_HEADER.size + 4 * (first & 0x0F)
+    if first & 0x10:
+        if size < start + 4:
+            return None
+        start += 4 + 4 * int.from_bytes(buf[start + 2:start + 4], 'big')
+    end = size
+    if first & 0x20:
+        end -= buf[size - 1]
+    if start > end:
+        return None
+    return second & 0x7F, seq, timestamp, ssrc, start, end
+
+
+class RtpStream:
+    """One caller: inbound batching and sequence tracking, outbound packetizing"""
+
+    __slots__ = ("service", "addr", "sock", "codec", "payload_type", "agent", "batch",
+                 "batch_view", "batch_bytes", "fill", "last_seq", "last_packet_at",
+                 "received", "lost", "late", "reported", "out_buf", "out_seq", "out_ssrc",
+                 "out_ts", "out_last_sent", "sent", "started_at")
+
+    def __init__(self, service, addr, sock, payload_type):
+        self.service = service
+        self.addr = addr
+        self.sock = sock
+        self.payload_type = payload_type
+        self.codec = PAYLOAD_TYPES[payload_type]
+        self.agent = None
+        self.batch_bytes = RTP_SAMPLE_RATE * RTP_BATCH_MS // 1000
+        self.batch = bytearray(self.batch_bytes + MAX_PACKET)
+        self.batch_view = memoryview(self.batch)
+        self.fill = 0
+        self.last_seq = None
+        self.last_packet_at = time.monotonic()
+        self.started_at = self.last_packet_at
+        self.received = 0
+        self.lost = 0
+        self.late = 0
+        # Counters already folded into metrics
+        self.reported = (0, 0, 0)
+        self.out_buf = bytearray(RTP_HEADER.size + MAX_PACKET)
+        self.out_seq = random.getrandbits(16)
+        self.out_ssrc = random.getrandbits(32)
+        self.out_ts = random.getrandbits(32)
+        self.out_last_sent = None
+        self.sent = 0
+
+    def accept(self, seq):
+        """Sequence check; False for late or duplicate packets"""
+        if self.last_seq is not None:
+            gap = (seq - self.last_seq) & 0xFFFF
+            if gap == 0 or gap >= 0x8000:
+                self.late += 1
+                return False
+            self.lost += gap - 1
+        self.last_seq = seq
+        self.received += 1
+        return True
+
+    def take_batch(self):
+        chunk = bytes(self.batch_view[:self.fill])
+        self.fill = 0
+        return chunk
+
+    def report(self):
+        received, lost, late = self.reported
+        if self.received > received:
+            metrics.rtp_packets.inc(self.received - received, self.service, "received")
+        if self.lost > lost:
+            metrics.rtp_packets.inc(self.lost - lost, self.service, "lost")
+        if self.late > late:
+            metrics.rtp_packets.inc(self.late - late, self.service, "late")
+        self.reported = (self.received, self.lost, self.late)
+
+    def send(self, payload):
+        """Send one agent frame as an RTP packet (called on the call's engine loop)"""
+        now = time.monotonic()
+        samples = len(payload)
+        marker = 0
+        if self.out_last_sent is None or now - self.out_last_sent > 2 * samples / RTP_SAMPLE_RATE:
+            # New talkspurt: timestamps follow the wall clock across the silence
+            marker = 0x80
+            if self.out_last_sent is not None:
+                self.out_ts += int((now - self.out_last_sent) * RTP_SAMPLE_RATE)
+        self.out_last_sent = now
+        RTP_HEADER.pack_into(self.out_buf, 0, RTP_VERSION << 6, marker | self.payload_type,
+                             self.out_seq, self.out_ts & 0xFFFFFFFF, self.out_ssrc)
+        end = RTP_HEADER.size + samples
+        self.out_buf[RTP_HEADER.size:end] = payload
+        try:
+            self.sock.sendto(memoryview(self.out_buf)[:end], self.addr)
+        except (BlockingIOError, InterruptedError):
+            # Socket buffer full: drop the packet rather than stall the loop
+            return
+        except OSError as e:
+            logger.debug("RTP send to %s failed: %s", self.addr, e)
+            return
+        self.out_seq = (self.out_seq + 1) & 0xFFFF
+        self.out_ts += samples
+        self.sent += 1
+
+    def stats(self):
+        """Stream counters for call metadata"""
+        return {
+            "remote": f"{self.addr[0]}:{self.addr[1]}",
+            "codec": self.codec,
+            "packets_in": self.received,
+            "packets_lost": self.lost,
+            "packets_late": self.late,
+            "packets_out": self.sent,
+        }
+
+
+class RtpGateway:
+    """UDP listeners for every service port and the streams on them
+
+    on_start(service, stream) returns the agent that will handle a new
+    stream (with stream set as its media sink) or None to refuse it.
+    on_end(stream) is called once the stream goes idle.
+    Both run on the gateway thread.
+    """
+
+    def __init__(self, services, on_start, on_end, host=RTP_HOST, base_port=RTP_BASE_PORT):
+        self.ports = service_ports(services, base_port)
+        self.host = host
+        self.on_start = on_start
+        self.on_end = on_end
+        # (service, addr) -> RtpStream; a media proxy may use one source
+        # address towards several service ports
+        self.streams = {}
+        self.sockets = {}
+        self.loop = None
+        self._buf = bytearray(MAX_PACKET)
+        self._view = memoryview(self._buf)
+        self._thread = None
+        self._ready = threading.Event()
+        # Why the gateway thread could not start listening, if it could not
+        self._error = None
+
+    def start(self, timeout=5):
+        """Listen on every service port; raises if any of them cannot be bound"""
+        self._thread = threading.Thread(target=self._run, name='rtp-gateway', daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError(f"RTP gateway did not start listening within {timeout}s")
+        if self._error is not None:
+            raise RuntimeError(f"RTP gateway could not listen: {self._error}") from self._error
+        logger.info("RTP gateway listening: %s",
+                    ", ".join(f"{service}={port}" for service, port in self.ports.items()))
+
+    def _run(self):
+        # add_reader needs a selector loop (Windows defaults to proactor)
+        self.loop = asyncio.SelectorEventLoop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            for service, port in self.ports.items():
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.sockets[service] = sock
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+                sock.bind((self.host, port))
+                sock.setblocking(False)
+                self.loop.add_reader(sock.fileno(), self._on_readable, service, sock)
+        except OSError as e:
+            self._error = e
+            for sock in self.sockets.values():
+                sock.close()
+            self.sockets.clear()
+            self.loop.close()
+            return
+        finally:
+            # start() reads _error once this is set
+            self._ready.set()
+        self.loop.call_later(SWEEP_INTERVAL_S, self._sweep)
+        self.loop.run_forever()
+
+    def _on_readable(self, service, sock):
+        buf, view, streams = self._buf, self._view, self.streams
+        for _ in range(READ_BUDGET):
+            try:
+                size, addr = sock.recvfrom_into(buf)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                # e.g. ICMP port unreachable from a caller that went away
+                logger.debug("RTP receive on %s failed: %s", service, e)
+                continue
+            header = parse_header(buf, size)
+            if header is None:
+                continue
+            payload_type, seq, _, _, start, end = header
+            stream = streams.get((service, addr))
+            if stream is None:
+                if payload_type not in PAYLOAD_TYPES:
+                    continue
+                stream = self._open(service, addr, sock, payload_type)
+            stream.last_packet_at = time.monotonic()
+            agent = stream.agent
+            if agent is None or payload_type != stream.payload_type or not stream.accept(seq):
+                continue
+            fill = stream.fill + end - start
+            stream.batch_view[stream.fill:fill] = view[start:end]
+            stream.fill = fill
+            if fill >= stream.batch_bytes:
+                agent.enqueue_audio(stream.take_batch(), RTP_SAMPLE_RATE)
+                stream.report()
+
+    def _open(self, service, addr, sock, payload_type):
+        stream = RtpStream(service, addr, sock, payload_type)
+        self.streams[service, addr] = stream
+        try:
+            stream.agent = self.on_start(service, stream)
+        except Exception:
+            logger.exception("Could not start an RTP call from %s", addr)
+        if stream.agent is None:
+            # Refused: remembered until idle so later packets are dropped cheaply
+            logger.warning("Refused RTP stream from %s on %s", addr, service)
+        return stream
+
+    def _sweep(self):
+        now = time.monotonic()
+        for key, stream in list(self.streams.items()):
+            idle = now - stream.last_packet_at > RTP_IDLE_TIMEOUT_S
+            if stream.agent is not None and (idle or not stream.agent.is_active):
+                self._close_stream(stream)
+                # Ended by the server (e.g. reaped): drop the caller's packets
+                # until it goes quiet instead of starting a new call
+                stream.agent = None
+            if idle:
+                del self.streams[key]
+        self.loop.call_later(SWEEP_INTERVAL_S, self._sweep)
+
+    def _close_stream(self, stream):
+        if stream.agent is None:
+            return
+        if stream.fill:
+            stream.agent.enqueue_audio(stream.take_batch(), RTP_SAMPLE_RATE)
+        stream.report()
+        try:
+            self.on_end(stream)
+        except Exception:
+            logger.exception("Error ending RTP call from %s", stream.addr)
+
+    def stats(self):
+        return {
+            "streams": len(self.streams),
+            "ports": dict(self.ports),
+        }
+
+    def close(self):
+        """End every stream and stop listening"""
+        if self.loop is None or self.loop.is_closed():
+            return
+        done = threading.Event()
+
+        def shutdown():
+            for stream in list(self.streams.values()):
+                self._close_stream(stream)
+            self.streams.clear()
+            for sock in self.sockets.values():
+                self.loop.remove_reader(sock.fileno())
+                sock.close()
+            self.loop.stop()
+            done.set()
+
+        self.loop.call_soon_threadsafe(shutdown)
+        done.wait(5)
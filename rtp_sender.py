@@ -0,0 +1,198 @@
+"""
+RTP Test Sender
+===============
+Calls the RTP gateway like a phone would. Each stream sends 20 ms G.711
+packets to a service's port and plays the part of a caller: a spoken
+phrase (a WAV file, or a synthetic tone), then silence while it waits
+for the agent to answer. It reports packets sent and received, turn
+latency, and the inter-arrival jitter of the agent's packets. The agent
+audio from the first stream can be saved as a WAV.
+
+Start the server with the gateway on (offline backend shown):
+    RTP_GATEWAY=1 LIVE_BACKEND=fake python app.py
+Then:
+    python rtp_sender.py --service restaurant
+    python rtp_sender.py --service hospital --wav question.wav --out reply.wav
+    python rtp_sender.py --streams 200 --turns 2 --codec alaw
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import socket
+import statistics
+import time
+import wave
+
+import numpy as np
+
+from audio_codecs import CODEC_MULAW, CODEC_ALAW, Resampler, g711_encode, g711_decode
+from rtp_gateway import (
+    RTP_HEADER, RTP_VERSION, RTP_SAMPLE_RATE, RTP_BASE_PORT, PAYLOAD_TYPE_OF, parse_header,
+    service_ports,
+)
+
+SERVICES = ["restaurant", "hospital", "techsupport", "travel", "support"]
+PACKET_MS = 20
+PACKET_SAMPLES = RTP_SAMPLE_RATE * PACKET_MS // 1000
+
+
+def load_phrase(path, seconds):
+    """8 kHz int16 samples from a WAV file, or a warbling tone"""
+    if path:
+        with wave.open(path, 'rb') as wav:
+            if wav.getsampwidth() != 2:
+                raise SystemExit("WAV must be 16-bit PCM")
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+            if wav.getnchannels() > 1:
+                samples = samples[::wav.getnchannels()]
+            return Resampler(wav.getframerate(), RTP_SAMPLE_RATE).process(samples)
+    t = np.arange(int(seconds * RTP_SAMPLE_RATE)) / RTP_SAMPLE_RATE
+    pitch = 180 + 40 * np.sin(2 * math.pi * 3 * t)
+    return (6000 * np.sin(2 * math.pi * np.cumsum(pitch) / RTP_SAMPLE_RATE)).astype('<i2')
+
+
+class SenderStream(asyncio.DatagramProtocol):
+    def __init__(self, index, codec, phrase, silence_packets, turns, keep_audio):
+        self.index = index
+        self.codec = codec
+        self.payload_type = PAYLOAD_TYPE_OF[codec]
+        self.silence = g711_encode(codec, np.zeros(PACKET_SAMPLES, dtype='<i2'))
+        speech = g711_encode(codec, phrase[:len(phrase) - len(phrase) % PACKET_SAMPLES])
+        self.speech = [speech[i:i + PACKET_SAMPLES] for i in range(0, len(speech), PACKET_SAMPLES)]
+        self.script = ([(packet, True) for packet in self.speech]
+                       + [(self.silence, False)] * silence_packets) * turns
+        self.position = 0
+        self.seq = random.getrandbits(16)
+        self.timestamp = random.getrandbits(32)
+        self.ssrc = random.getrandbits(32)
+        self.transport = None
+        self.sent = 0
+        self.received = 0
+        self.awaiting_since = None
+        self.turn_latencies = []
+        self.last_arrival = None
+        self.last_rtp_ts = None
+        self.jitter = 0.0
+        self.audio = [] if keep_audio else None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    @property
+    def done(self):
+        return self.position >= len(self.script)
+
+    def send_next(self):
+        payload, speaking = self.script[self.position]
+        self.position += 1
+        marker = 0x80 if self.position == 1 else 0
+        packet = RTP_HEADER.pack(RTP_VERSION << 6, marker | self.payload_type,
+                                 self.seq, self.timestamp, self.ssrc) + payload
+        self.transport.sendto(packet)
+        self.sent += 1
+        self.seq = (self.seq + 1) & 0xFFFF
+        self.timestamp = (self.timestamp + PACKET_SAMPLES) & 0xFFFFFFFF
+        if speaking and self.position < len(self.script) and not self.script[self.position][1]:
+            # Last packet of the phrase: the agent's reply is due
+            self.awaiting_since = time.monotonic()
+
+    def datagram_received(self, data, addr):
+        now = time.monotonic()
+        header = parse_header(data, len(data))
+        if header is None:
+            return
+        payload_type, _, rtp_ts, _, start, end = header
+        self.received += 1
+        # The reply is the agent's next talkspurt (marker bit), not the tail of the last one
+        if self.awaiting_since is not None and data[1] & 0x80:
+            self.turn_latencies.append(now - self.awaiting_since)
+            self.awaiting_since = None
+        # RFC 3550 interarrival jitter, in seconds
+        if self.last_arrival is not None:
+            transit_delta = (now - self.last_arrival) - ((rtp_ts - self.last_rtp_ts) & 0xFFFFFFFF) / RTP_SAMPLE_RATE
+            self.jitter += (abs(transit_delta) - self.jitter) / 16
+        self.last_arrival, self.last_rtp_ts = now, rtp_ts
+        if self.audio is not None:
+            self.audio.append(g711_decode(self.codec, data[start:end]))
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    port = args.port or service_ports(SERVICES, args.base_port)[args.service]
+    phrase = load_phrase(args.wav, args.speech_ms / 1000)
+    silence_packets = args.silence_ms // PACKET_MS
+    streams = []
+    for index in range(args.streams):
+        _, stream = await loop.create_datagram_endpoint(
+            lambda i=index: SenderStream(i, args.codec, phrase, silence_packets, args.turns,
+                                         keep_audio=(i == 0 and bool(args.out))),
+            remote_addr=(args.host, port), family=socket.AF_INET)
+        streams.append(stream)
+
+    print(f"📞 {len(streams)} stream(s) → {args.host}:{port} ({args.service}, {args.codec})")
+    started = loop.time()
+    tick = 0
+    # One clock for every stream, scheduled against absolute time so it never drifts
+    while not all(stream.done for stream in streams):
+        for stream in streams:
+            if not stream.done:
+                stream.send_next()
+        tick += 1
+        await asyncio.sleep(max(0.0, started + tick * PACKET_MS / 1000 - loop.time()))
+    # Let the last reply drain, then go quiet so the gateway ends the calls
+    await asyncio.sleep(args.tail_ms / 1000)
+    for stream in streams:
+        stream.transport.close()
+    return streams
+
+
+def report(streams, out_path):
+    latencies = [lat for stream in streams for lat in stream.turn_latencies]
+    jitter = [stream.jitter for stream in streams if stream.received > 1]
+    answered = sum(1 for stream in streams if stream.received)
+    print("=" * 60)
+    print(f"  streams answered      {answered}/{len(streams)}")
+    print(f"  packets sent          {sum(s.sent for s in streams)}")
+    print(f"  packets received      {sum(s.received for s in streams)}")
+    if latencies:
+        ordered = sorted(latencies)
+        print(f"  turn latency p50      {1000 * ordered[len(ordered) // 2]:.1f} ms")
+        print(f"  turn latency p95      {1000 * ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]:.1f} ms")
+    if jitter:
+        print(f"  jitter (mean)         {1000 * statistics.mean(jitter):.2f} ms")
+    first = streams[0]
+    if out_path and first.audio:
+        with wave.open(out_path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(RTP_SAMPLE_RATE)
+            wav.writeframes(np.concatenate(first.audio).tobytes())
+        print(f"\n📝 Agent audio written to {out_path}")
+    return answered == len(streams)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send RTP calls to the media gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--service", default="restaurant", choices=SERVICES)
+    parser.add_argument("--port", type=int, help="override the service's port")
+    parser.add_argument("--base-port", type=int, default=RTP_BASE_PORT)
+    parser.add_argument("--codec", default=CODEC_MULAW, choices=[CODEC_MULAW, CODEC_ALAW])
+    parser.add_argument("--streams", type=int, default=1)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--wav", help="caller phrase (16-bit WAV, any rate)")
+    parser.add_argument("--speech-ms", type=int, default=1500, help="synthetic phrase length")
+    parser.add_argument("--silence-ms", type=int, default=2500, help="quiet time after each phrase")
+    parser.add_argument("--tail-ms", type=int, default=1000)
+    parser.add_argument("--out", help="write the first stream's agent audio to this WAV")
+    args = parser.parse_args()
+
+    streams = asyncio.run(run(args))
+    ok = report(streams, args.out)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
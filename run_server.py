@@ -1,11 +1,27 @@
 """
 Simple launcher for the AI Calling Agent Demo
 Checks for API key and starts the server
+
+    python run_server.py                 # development (threading)
+    python run_server.py --production    # eventlet, no debug/reloader
+    python run_server.py --mode gevent
 """
 
+import argparse
 import os
 import sys
 
+parser = argparse.ArgumentParser(description="Start the AI Calling Agent server")
+parser.add_argument("--mode", choices=["threading", "eventlet", "gevent"],
+                    default=os.environ.get("SERVER_MODE", "threading"),
+                    help="server mode (default: SERVER_MODE or threading)")
+parser.add_argument("--production", action="store_const", const="eventlet", dest="mode",
+                    help="shorthand for --mode eventlet")
+parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 5000)))
+args = parser.parse_args()
+# server_mode reads this when app is imported
+os.environ["SERVER_MODE"] = args.mode
+
 print("=" * 70)
 print("🚀 AI Calling Agent System - Starting...")
 print("=" * 70)
@@ -42,7 +58,8 @@ print("  ✈️  SkyHigh Travel Agency     : +1-555-TRIP-004")
 print("  📞 Universal Customer Service: +1-555-HELP-005")
 
 print("\n" + "=" * 70)
-print("🌐 Dashboard will be available at: http://localhost:5000")
+print(f"🌐 Dashboard will be available at: http://localhost:{args.port}")
+print(f"⚙️  Server mode: {args.mode}")
 print("📝 Press Ctrl+C to stop the server")
 print("=" * 70)
 print("\n")
@@ -50,7 +67,8 @@ print("\n")
 # Import and run the app
 try:
     from app import socketio, app
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000)
+    from server_mode import serve
+    serve(socketio, app, port=args.port)
 except KeyboardInterrupt:
     print("\n\n✅ Server stopped. Goodbye!")
 except Exception as e:
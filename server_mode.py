@@ -0,0 +1,232 @@
+"""
+Server Mode
+===========
+How the Socket.IO front end runs.
+
+    threading  Werkzeug dev server, one OS thread per connection (default,
+               for local development)
+    eventlet   cooperative eventlet WSGI server: every WebSocket is a
+               green thread, so thousands of idle callers and dashboards
+               cost kilobytes instead of a thread each (production)
+    gevent     the same on gevent (needs gevent installed)
+
+Call media does not run on green threads. Gemini Live sessions stay on
+the CallEngine's asyncio loops in real OS threads, and nothing is monkey
+patched: green sockets under those loops break asyncio's TLS. The two
+worlds meet here:
+- Bridge.call() runs a function on the server's hub. Engine threads and
+  the cluster listener emit through it; calls made on the hub run inline.
+- run_blocking() moves a blocking wait (ending a call on its engine
+  loop, a cluster request) onto a real thread so the hub keeps serving.
+- BridgedRedisManager keeps the Socket.IO message queue's Redis I/O on
+  OS threads, since its stock manager requires a patched socket module.
+
+Importing the app starts nothing. What runs beside the server (engine
+threads, session pools, RTP listeners, background tasks) registers with
+on_serve() and is started by serve() in the process that serves. With
+SERVER_DEBUG=1 the reloader's watcher process never serves, so it never
+starts a second engine or binds the RTP ports.
+
+Configuration (environment):
+    SERVER_MODE     threading | eventlet | gevent (default threading)
+    SERVER_DEBUG    1/0: Flask debug and the code reloader (default off)
+    SSL_CERTFILE    TLS certificate and key; without them production
+    SSL_KEYFILE     modes serve plain HTTP (terminate TLS at the proxy)
+"""
+
+import os
+import queue
+import threading
+import collections
+import logging
+
+from socketio import PubSubManager, RedisManager
+
+logger = logging.getLogger(__name__)
+
+SERVER_MODES = ('threading', 'eventlet', 'gevent')
+SERVER_MODE = os.environ.get('SERVER_MODE', 'threading')
+if SERVER_MODE not in SERVER_MODES:
+    raise ValueError(f"SERVER_MODE must be one of {', '.join(SERVER_MODES)}, not {SERVER_MODE!r}")
+COOPERATIVE = SERVER_MODE != 'threading'
+SERVER_DEBUG = os.environ.get('SERVER_DEBUG', '0') == '1'
+SSL_CERTFILE = os.environ.get('SSL_CERTFILE')
+SSL_KEYFILE = os.environ.get('SSL_KEYFILE')
+
+# Run by serve() before it starts serving, in registration order
+_serve_hooks = []
+
+
+def on_serve(fn):
+    """Have serve() call fn() in the process that serves (usable as a decorator)"""
+    _serve_hooks.append(fn)
+    return fn
+
+
+def run_blocking(fn, *args, **kwargs):
+    """Call fn without stalling the hub (plain call in threading mode)"""
+    if SERVER_MODE == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(fn, *args, **kwargs)
+    if SERVER_MODE == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+    return fn(*args, **kwargs)
+
+
+def _wait_readable(fd):
+    if SERVER_MODE == 'eventlet':
+        from eventlet.hubs import trampoline
+        trampoline(fd, read=True)
+    else:
+        from gevent.socket import wait_read
+        wait_read(fd)
+
+
+class Bridge:
+    """Runs callables from OS threads on the cooperative server's hub
+
+    Work is queued and a pipe byte wakes a green task that drains it, so
+    order is kept per calling thread and nothing polls.
+    """
+
+    def __init__(self):
+        self.socketio = None
+        self._pending = collections.deque()
+        # The hub runs on the thread that imports the app and serves it
+        self._hub_thread = threading.get_ident()
+        self._wake_r = self._wake_w = None
+        self._signalled = False
+
+    def start(self, socketio):
+        self.socketio = socketio
+        if COOPERATIVE:
+            self._wake_r, self._wake_w = os.pipe()
+            os.set_blocking(self._wake_r, False)
+            os.set_blocking(self._wake_w, False)
+            socketio.start_background_task(self._drain)
+
+    @property
+    def pending(self):
+        """Calls queued for the hub and not yet run"""
+        return len(self._pending)
+
+    def call(self, fn, *args, **kwargs):
+        if not COOPERATIVE or threading.get_ident() == self._hub_thread:
+            return fn(*args, **kwargs)
+        self._pending.append((fn, args, kwargs))
+        if self._signalled:
+            return
+        self._signalled = True
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            # Pipe full: the hub is already due to wake
+            pass
+
+    def emit(self, event, *args, **kwargs):
+        """socketio.emit that is safe from any thread"""
+        self.call(self.socketio.emit, event, *args, **kwargs)
+
+    def _drain(self):
+        while True:
+            _wait_readable(self._wake_r)
+            try:
+                os.read(self._wake_r, 4096)
+            except BlockingIOError:
+                pass
+            # Work queued from here on signals again
+            self._signalled = False
+            while self._pending:
+                fn, args, kwargs = self._pending.popleft()
+                try:
+                    fn(*args, **kwargs)
+                except Exception:
+                    logger.exception("Bridged call failed")
+
+
+class BridgedRedisManager(RedisManager):
+    """Socket.IO Redis message queue for an unpatched cooperative server
+
+    Listening and publishing happen on OS threads; messages from other
+    workers are applied on the hub through the bridge.
+    """
+
+    def __init__(self, url, bridge, **kwargs):
+        self.bridge = bridge
+        self._outbox = queue.Queue()
+        super().__init__(url, **kwargs)
+
+    def initialize(self):
+        # Skip RedisManager's patched-socket check and the green listener
+        super(PubSubManager, self).initialize()
+        threading.Thread(target=self._send_loop, name='sio-queue-publish', daemon=True).start()
+        if not self.write_only:
+            threading.Thread(target=self._thread, name='sio-queue-listen', daemon=True).start()
+
+    def _publish(self, data):
+        self._outbox.put(data)
+
+    def _send_loop(self):
+        while True:
+            data = self._outbox.get()
+            try:
+                super()._publish(data)
+            except Exception:
+                logger.exception("Message queue publish failed")
+
+    def _handle_emit(self, message):
+        self.bridge.call(super()._handle_emit, message)
+
+    def _handle_disconnect(self, message):
+        self.bridge.call(super()._handle_disconnect, message)
+
+    def _handle_enter_room(self, message):
+        self.bridge.call(super()._handle_enter_room, message)
+
+    def _handle_leave_room(self, message):
+        self.bridge.call(super()._handle_leave_room, message)
+
+    def _handle_close_room(self, message):
+        self.bridge.call(super()._handle_close_room, message)
+
+    def _handle_callback(self, message):
+        self.bridge.call(super()._handle_callback, message)
+
+
+def socketio_options(message_queue, bridge):
+    """SocketIO() keyword arguments for the configured mode"""
+    options = {'async_mode': SERVER_MODE}
+    if message_queue and COOPERATIVE:
+        # Same channel Flask-SocketIO uses, so mixed-mode workers interoperate
+        options['client_manager'] = BridgedRedisManager(message_queue, bridge, channel='flask-socketio')
+    else:
+        options['message_queue'] = message_queue
+    return options
+
+
+def serve(socketio, app, host='0.0.0.0', port=5000, adhoc_tls=False):
+    """socketio.run() with the mode's server, debug and TLS settings
+
+    adhoc_tls: without SSL_CERTFILE, serve the dev server over a
+    throwaway self-signed certificate (browsers need HTTPS for the mic).
+    """
+    options = {'host': host, 'port': port, 'debug': SERVER_DEBUG, 'use_reloader': SERVER_DEBUG}
+    if SERVER_MODE == 'threading':
+        if SSL_CERTFILE:
+            options['ssl_context'] = (SSL_CERTFILE, SSL_KEYFILE)
+        elif adhoc_tls:
+            options['ssl_context'] = 'adhoc'
+        # Explicitly the dev server; production runs a cooperative mode
+        options['allow_unsafe_werkzeug'] = True
+    elif SSL_CERTFILE:
+        options['certfile'] = SSL_CERTFILE
+        options['keyfile'] = SSL_KEYFILE
+    if COOPERATIVE:
+        options['log_output'] = SERVER_DEBUG
+    # Under the reloader this process only watches files; its child serves
+    if not options['use_reloader'] or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        for hook in _serve_hooks:
+            hook()
+    logger.info("Serving in %s mode (debug %s)", SERVER_MODE, "on" if SERVER_DEBUG else "off")
+    socketio.run(app, **options)
@@ -0,0 +1,172 @@
+"""
+Live Session Pool
+=================
+Keeps pre-connected Live sessions ready for each service so start_call
+does not wait on the connect round trip.
+
+Sessions belong to the event loop that opened them, so each call engine
+worker owns its own pool. A background task on the worker loop tops the
+pool up to SESSION_POOL_SIZE idle sessions per service, and closes idle
+sessions older than SESSION_POOL_TTL_S (Live sessions have a bounded
+lifetime, so a stale one is worse than a fresh connect).
+
+Sessions are opened with the service's config, prompt included as the
+system instruction, so a pooled session is ready to greet the caller.
+
+Configuration (environment):
+    SESSION_POOL_SIZE      idle sessions per service per worker (0 disables)
+    SESSION_POOL_TTL_S     close idle sessions older than this (default 240)
+    SESSION_POOL_REFILL_S  refill check interval (default 1)
+"""
+
+import asyncio
+import collections
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+SESSION_POOL_SIZE = int(os.environ.get('SESSION_POOL_SIZE', 1))
+SESSION_POOL_TTL_S = float(os.environ.get('SESSION_POOL_TTL_S', 240))
+SESSION_POOL_REFILL_S = float(os.environ.get('SESSION_POOL_REFILL_S', 1))
+
+# Wait this long after a failed connect before trying again
+RETRY_BACKOFF_S = 5.0
+
+
+class PooledSession:
+    """An open Live session plus the exit stack that closes it"""
+
+    def __init__(self, service, session, stack, connect_s):
+        self.service = service
+        self.session = session
+        self.stack = stack
+        self.connect_s = connect_s
+        self.created_at = time.monotonic()
+
+    @property
+    def age(self):
+        return time.monotonic() - self.created_at
+
+    async def close(self):
+        try:
+            await self.stack.aclose()
+        except Exception as e:
+            logger.debug("Pooled %s session closed with error: %r", self.service, e)
+
+
+class SessionPool:
+    """Per-worker idle sessions keyed by service, refilled in the background
+
+    open_session(service) is a coroutine returning a PooledSession; it runs
+    on the pool's loop. acquire() and run() must be called on that loop.
+    """
+
+    def __init__(self, open_session, services, size=SESSION_POOL_SIZE,
+                 ttl=SESSION_POOL_TTL_S, refill_interval=SESSION_POOL_REFILL_S):
+        self.open_session = open_session
+        self.services = list(services)
+        self.size = size
+        self.ttl = ttl
+        self.refill_interval = refill_interval
+        self.idle = {service: collections.deque() for service in self.services}
+        self.opening = collections.Counter()
+        self.retry_at = {}
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.failures = 0
+        # Set once every service has had an idle session (what /readyz checks)
+        self.warm = size <= 0
+        self.closed = False
+        self._wake = None
+
+    def available(self, service):
+        """Idle sessions ready for a service (safe to read from any thread)"""
+        return len(self.idle.get(service, ()))
+
+    async def acquire(self, service):
+        """Take a fresh idle session, or None if the pool has none"""
+        idle = self.idle.get(service)
+        while idle:
+            pooled = idle.popleft()
+            if pooled.age < self.ttl:
+                self.hits += 1
+                self._request_refill()
+                return pooled
+            self.expired += 1
+            await pooled.close()
+        self.misses += 1
+        self._request_refill()
+        return None
+
+    def _request_refill(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def run(self):
+        """Refill loop; runs until close()"""
+        self._wake = asyncio.Event()
+        if self.size <= 0:
+            return
+        while not self.closed:
+            await self._expire()
+            self._refill()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _expire(self):
+        for service, idle in self.idle.items():
+            while idle and idle[0].age >= self.ttl:
+                self.expired += 1
+                await idle.popleft().close()
+
+    def _refill(self):
+        now = time.monotonic()
+        for service in self.services:
+            if self.retry_at.get(service, 0) > now:
+                continue
+            missing = self.size - len(self.idle[service]) - self.opening[service]
+            for _ in range(max(0, missing)):
+                self.opening[service] += 1
+                asyncio.create_task(self._open(service))
+
+    async def _open(self, service):
+        try:
+            pooled = await self.open_session(service)
+        except Exception as e:
+            self.failures += 1
+            self.retry_at[service] = time.monotonic() + RETRY_BACKOFF_S
+            logger.warning("Could not pre-open a %s session: %r", service, e)
+            return
+        finally:
+            self.opening[service] -= 1
+        if self.closed:
+            await pooled.close()
+        else:
+            self.idle[service].append(pooled)
+            if not self.warm and all(self.idle.values()):
+                self.warm = True
+
+    async def close(self):
+        """Stop refilling and close every idle session"""
+        self.closed = True
+        self._request_refill()
+        pending = [pooled for idle in self.idle.values() for pooled in idle]
+        for idle in self.idle.values():
+            idle.clear()
+        await asyncio.gather(*(pooled.close() for pooled in pending), return_exceptions=True)
+
+    def stats(self):
+        return {
+            "idle": {service: len(idle) for service, idle in self.idle.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "failures": self.failures,
+            "warm": self.warm,
+        }
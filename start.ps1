@@ -42,9 +42,6 @@ if ($LASTEXITCODE -eq 0) {
     Write-Host "✅ Dependencies installed successfully" -ForegroundColor Green
 } else {
     Write-Host "⚠️  Some dependencies may have failed to install" -ForegroundColor Yellow
-    Write-Host "Note: PyAudio can be tricky on Windows. If it fails:" -ForegroundColor Gray
-    Write-Host "  1. Download from: https://www.lfd.uci.edu/~gohlke/pythonlibs/#pyaudio" -ForegroundColor Gray
-    Write-Host "  2. Install with: pip install PyAudio-X.X.X-cpXX-cpXX-win_amd64.whl" -ForegroundColor Gray
 }
 
 # Display system info
@@ -0,0 +1,113 @@
+"""
+Startup
+=======
+Keeps importing the app cheap and tells a load balancer when a worker can
+take calls.
+
+google.genai takes about half a second to import and nothing needs it
+until the first Live session opens, so the Gemini client (and the SDK
+with it) is built on first use. A background warm-up, started as the
+server starts serving, builds it, then the per-service Live configs,
+then starts the session pools, so the server binds its port without
+waiting on any of it.
+
+    LiveClient   the client, built once on first use (any thread)
+    Warmup       named startup steps run once on a background thread
+
+Probes (see app.py):
+    /healthz  liveness: the process serves HTTP and its call engine
+              threads are alive
+    /readyz   readiness: client built, warm-up finished, every service
+              has had a warm session, engine admitting calls; 503 with
+              the failing checks otherwise
+
+Configuration (environment):
+    LIVE_BACKEND    fake uses the offline stand-in (fake_live.py)
+    GEMINI_API_KEY  key for the real client
+"""
+
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+LIVE_BACKEND = os.environ.get('LIVE_BACKEND', 'gemini')
+
+
+class LiveClient:
+    """Lazily built Gemini client (or the offline stand-in)"""
+
+    def __init__(self, backend=LIVE_BACKEND):
+        self.backend = backend
+        self.build_s = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._client is not None
+
+    def get(self):
+        """The client, built on the first call; later calls take no lock"""
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    started = time.monotonic()
+                    self._client = self._build()
+                    self.build_s = time.monotonic() - started
+                    logger.info("Live client (%s) built in %.0f ms", self.backend, 1000 * self.build_s)
+                client = self._client
+        return client
+
+    def _build(self):
+        if self.backend == 'fake':
+            from fake_live import FakeClient
+            return FakeClient()
+        from google import genai
+        return genai.Client(
+            http_options={"api_version": "v1beta"},
+            api_key=os.environ.get("GEMINI_API_KEY"),
+        )
+
+
+class Warmup:
+    """Runs (name, fn) steps in order on a daemon thread, once
+
+    A failing step stops the warm-up; its error shows in stats() and
+    keeps /readyz failing. Anything it skipped still happens on first use.
+    """
+
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.done = False
+        self.error = None
+        self.timings = {}
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def run(self):
+        started = time.monotonic()
+        for name, fn in self.steps:
+            step_started = time.monotonic()
+            try:
+                fn()
+            except Exception as e:
+                self.error = f"{name}: {e!r}"
+                logger.exception("Warm-up step %s failed", name)
+                return
+            self.timings[name] = time.monotonic() - step_started
+        self.done = True
+        logger.info("Warm-up finished in %.0f ms", 1000 * (time.monotonic() - started))
+
+    def stats(self):
+        return {
+            "done": self.done,
+            "error": self.error,
+            "steps_ms": {name: round(1000 * s, 1) for name, s in self.timings.items()},
+        }
@@ -0,0 +1,82 @@
+# Tests for transcoding and resampling (audio_codecs.py): python -m pytest test_audio_codecs.py
+import numpy as np
+import pytest
+
+from audio_codecs import (
+    CODEC_ALAW, CODEC_MULAW, CODEC_PCM16, AudioFormat, InboundDecoder, OutboundEncoder, Resampler,
+    g711_decode, g711_encode, negotiate,
+)
+
+
+@pytest.mark.parametrize("codec", [CODEC_MULAW, CODEC_ALAW])
+def test_g711_round_trip(codec):
+    samples = np.arange(-32768, 32768, 7, dtype=np.int16)
+    decoded = g711_decode(codec, g711_encode(codec, samples)).astype(np.int32)
+    amplitude = np.abs(samples.astype(np.int32))
+    error = np.abs(decoded - samples)
+    # Logarithmic quantisation: the step grows with the amplitude
+    loud = amplitude >= 256
+    assert np.all(error[loud] <= amplitude[loud] / 16)
+    assert np.all(error[~loud] <= 16)
+
+
+@pytest.mark.parametrize("codec", [CODEC_MULAW, CODEC_ALAW])
+def test_g711_codes_are_stable(codec):
+    codes = bytes(range(256))
+    once = g711_decode(codec, codes)
+    assert np.array_equal(g711_decode(codec, g711_encode(codec, once)), once)
+
+
+@pytest.mark.parametrize("src, dst", [(24000, 8000), (24000, 16000), (16000, 24000), (48000, 16000),
+                                      (8000, 16000)])
+def test_resampler_length_across_chunks(src, dst):
+    resampler = Resampler(src, dst)
+    rng = np.random.default_rng(7)
+    total_in = total_out = 0
+    for size in rng.integers(1, 2000, 200):
+        chunk = rng.integers(-1000, 1000, size).astype('<i2')
+        total_in += size
+        total_out += len(resampler.process(chunk))
+    # No samples lost or invented at chunk edges, whatever the chunk sizes
+    assert abs(total_out - total_in * dst / src) <= 1
+
+
+def test_resampler_keeps_a_tone():
+    resampler = Resampler(24000, 8000)
+    t = np.arange(24000) / 24000
+    out = resampler.process((8000 * np.sin(2 * np.pi * 440 * t)).astype('<i2'))
+    peak = np.abs(np.fft.rfft(out[800:].astype(np.float32))).argmax()
+    assert len(out) == 8000
+    # 7200 samples at 8 kHz: bin spacing 10/9 Hz
+    assert abs(peak * 8000 / 7200 - 440) < 2
+
+
+def test_pcm16_at_the_live_rate_passes_through():
+    encoder = OutboundEncoder(AudioFormat(CODEC_PCM16, 24000), 24000)
+    decoder = InboundDecoder(AudioFormat(CODEC_PCM16, 16000), 16000)
+    assert encoder.passthrough
+    assert encoder.encode(b'\x01\x02' * 10) == b'\x01\x02' * 10
+    assert decoder.decode(b'\x03\x04' * 10) == b'\x03\x04' * 10
+
+
+def test_mulaw_phone_leg():
+    audio_out, audio_in = negotiate({"codecs": ["mulaw"], "sample_rate": 8000}, 24000, 16000)
+    assert audio_out == (CODEC_MULAW, 8000) and audio_in == (CODEC_MULAW, 8000)
+    # 20 ms of agent audio at 24 kHz is 160 one-byte samples at 8 kHz
+    assert len(OutboundEncoder(audio_out, 24000).encode(bytes(960))) == 160
+    # 20 ms of caller audio becomes 320 samples of 16 kHz PCM (interpolation
+    # holds back the last one until the next frame)
+    decoder = InboundDecoder(audio_in, 16000)
+    assert [len(decoder.decode(bytes([0xFF]) * 160)) for _ in range(3)] == [638, 640, 640]
+
+
+def test_negotiate_without_offer_keeps_live_formats():
+    assert negotiate(None, 24000, 16000) == ((CODEC_PCM16, 24000), (CODEC_PCM16, 16000))
+    # Never upsampled: a 48 kHz offer still gets 24 kHz agent audio
+    assert negotiate({"sample_rate": 48000}, 24000, 16000)[0] == (CODEC_PCM16, 24000)
+
+
+def test_inbound_rejects_unknown_rate():
+    decoder = InboundDecoder(AudioFormat(CODEC_PCM16, 16000), 16000)
+    with pytest.raises(ValueError):
+        decoder.decode(bytes(100), sample_rate=11025)
@@ -0,0 +1,138 @@
+# Tests for call storage, paging and search (call_store.py): python -m pytest test_call_store.py
+import pytest
+
+from call_store import MemoryCallStore, SQLiteCallStore
+
+SERVICES = ["restaurant", "hospital", "techsupport", "support"]
+
+UTTERANCES = [
+    ("call_1", "Caller", "Two pizzas please, pizza with extra cheese and a pizza for the kids"),
+    ("call_2", "Caller", "I need an appointment with cardiology next week about my heart and my blood pressure"),
+    ("call_2", "Agent", "Cardiology has a slot on Tuesday, and we also offer a pizza voucher"),
+    ("call_3", "Caller", "My router keeps dropping the connection"),
+    ("call_3", "Agent", "Your ticket number is TECH-12345"),
+    ("call_4", "Caller", "<script>alert(1)</script> the router is broken"),
+]
+
+
+def call(n):
+    return {
+        "call_id": f"call_{n}",
+        "service": SERVICES[(n - 1) % len(SERVICES)],
+        "status": "completed" if n % 3 else "failed",
+        "start_time": f"2026-01-{n:02d}T10:00:00",
+        "end_time": f"2026-01-{n:02d}T10:05:00",
+        "transcript": [{"speaker": "Caller", "text": f"hello {n}", "timestamp": "t"}],
+        "metadata": {"n": n},
+    }
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    """A store of either backend holding calls 1-9 and UTTERANCES, readable"""
+    path = str(tmp_path / "calls.db")
+    store = MemoryCallStore() if request.param == "memory" else SQLiteCallStore(path)
+    if request.param == "sqlite" and not store.fts:
+        pytest.skip("SQLite built without FTS5")
+    calls = {n: call(n) for n in range(1, 10)}
+    for n, c in calls.items():
+        store.save_call(c, "tickets" if n % 2 else "orders")
+    for seq, (call_id, speaker, text) in enumerate(UTTERANCES):
+        store.index_utterance(calls[int(call_id[5:])], seq, speaker, text, "t")
+    if request.param == "sqlite":
+        # Closing drains the write-behind queue; read through a new instance
+        store.close()
+        store = SQLiteCallStore(path)
+    yield store
+    store.close()
+
+
+def walk(store, **filters):
+    """Every page of query_calls, as lists of call ids"""
+    pages, cursor = [], None
+    while True:
+        calls, cursor = store.query_calls(cursor=cursor, **filters)
+        pages.append([c["call_id"] for c in calls])
+        if cursor is None:
+            return pages
+
+
+def test_cursor_walks_every_page_newest_first(store):
+    pages = walk(store, limit=4)
+    assert pages == [["call_9", "call_8", "call_7", "call_6"], ["call_5", "call_4", "call_3", "call_2"],
+                     ["call_1"]]
+    # An exact last page has no cursor after it
+    assert walk(store, limit=3)[-1] == ["call_3", "call_2", "call_1"]
+
+
+def test_pages_apply_filters(store):
+    assert walk(store, category="orders", limit=2) == [["call_8", "call_6"], ["call_4", "call_2"]]
+    assert walk(store, service="restaurant", status="completed", limit=1) == [["call_5"], ["call_1"]]
+    assert walk(store, since="2026-01-07T00:00:00") == [["call_9", "call_8", "call_7"]]
+
+
+def test_page_leaves_transcripts_out_unless_asked(store):
+    calls, _ = store.query_calls(limit=1)
+    assert "transcript" not in calls[0] and calls[0]["metadata"] == {"n": 9}
+    calls, _ = store.query_calls(limit=1, include_transcript=True)
+    assert calls[0]["transcript"] == [{"speaker": "Caller", "text": "hello 9", "timestamp": "t"}]
+    assert store.get_transcript("call_9") == calls[0]["transcript"]
+    assert store.get_transcript("call_99") is None
+
+
+def test_invalid_cursor(store):
+    with pytest.raises(ValueError):
+        store.query_calls(cursor="abc")
+
+
+def ids(results):
+    return [r["call_id"] for r in results]
+
+
+def test_search_requires_every_word(store):
+    assert sorted(ids(store.search("router"))) == ["call_3", "call_4"]
+    assert ids(store.search("router connection")) == ["call_3"]
+    assert store.search("router pizza") == []
+
+
+def test_search_ranks_by_best_utterance(store):
+    results = store.search("pizza")
+    # Three mentions in one short line beat one in a longer line
+    assert ids(results) == ["call_1", "call_2"]
+    assert results[0]["score"] > results[1]["score"] > 0
+    assert results[1]["hits"] == 1
+
+
+def test_search_counts_hits_per_call(store):
+    (result,) = store.search("cardiology")
+    assert result["call_id"] == "call_2" and result["hits"] == 2
+    assert (result["service"], result["start_time"]) == ("hospital", "2026-01-02T10:00:00")
+
+
+def test_search_prefix_and_reference_terms(store):
+    assert ids(store.search("cardio*")) == ["call_2"]
+    assert store.search("cardio") == []
+    # A ticket number is one phrase, whatever the case
+    assert ids(store.search("tech-12345")) == ["call_3"]
+    assert store.search("TECH-54321") == []
+
+
+def test_search_filters(store):
+    assert ids(store.search("router", service="support")) == ["call_4"]
+    assert ids(store.search("router", since="2026-01-04T00:00:00")) == ["call_4"]
+    assert len(store.search("router", limit=1)) == 1
+
+
+def test_snippet_is_escaped_and_marked(store):
+    (result,) = store.search("broken")
+    snippet = result["snippet"]
+    assert "<script>" not in snippet
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in snippet
+    assert "<mark>broken</mark>" in snippet
+    assert result["speaker"] == "Caller"
+
+
+@pytest.mark.parametrize("query", ["", "   ", "!!! ?"])
+def test_search_without_words(store, query):
+    with pytest.raises(ValueError):
+        store.search(query)
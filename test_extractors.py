@@ -0,0 +1,64 @@
+# Tests for the streaming transcript extractor (extractors.py): python -m pytest test_extractors.py
+import random
+
+import pytest
+
+from bench_extractor import SAMPLE_TRANSCRIPTS, fragment, legacy_extract
+from extractors import MAX_MATCH_CHARS, StreamingExtractor, apply_records
+
+
+def extract(service, lines, pieces=None):
+    """Metadata from agent lines, each fed whole or split by pieces(line)"""
+    metadata = {}
+    extractor = StreamingExtractor(service)
+    for line in lines:
+        for piece in (pieces(line) if pieces else [line]):
+            apply_records(metadata, extractor.feed(piece))
+        apply_records(metadata, extractor.flush())
+    return metadata
+
+
+@pytest.mark.parametrize("service", sorted(SAMPLE_TRANSCRIPTS))
+@pytest.mark.parametrize("seed", range(5))
+def test_fragments_find_what_whole_lines_do(service, seed):
+    rng = random.Random(seed)
+    lines = SAMPLE_TRANSCRIPTS[service]
+    assert extract(service, lines, lambda line: fragment(line, rng)) == extract(service, lines)
+
+
+@pytest.mark.parametrize("service", ["hospital", "techsupport"])
+def test_agrees_with_legacy(service):
+    rng = random.Random(1)
+    legacy = {}
+    for line in SAMPLE_TRANSCRIPTS[service]:
+        legacy_extract(service, line, legacy)
+    streaming = extract(service, SAMPLE_TRANSCRIPTS[service], lambda line: fragment(line, rng))
+    assert legacy
+    assert {key: streaming.get(key) for key in legacy} == legacy
+
+
+def test_split_reference_is_kept_whole():
+    text = "Your appointment ID is APT-2024-0042, see you then. "
+    metadata = extract("hospital", [text], lambda line: [line[i:i + 1] for i in range(len(line))])
+    assert metadata["appointment_id"] == "APT-2024-0042"
+    assert metadata["has_appointment"]
+
+
+def test_ticket_at_end_of_turn_waits_for_flush():
+    extractor = StreamingExtractor("techsupport")
+    assert extractor.feed("I've created a support ticket for you, the number is TECH-5") == []
+    assert extractor.feed("5120") == []
+    assert extractor.flush() == [{"type": "ticket_id", "value": "TECH-55120"}]
+
+
+def test_rescan_does_not_report_a_cut_off_name():
+    # The second scan looks back MAX_MATCH_CHARS from where the first
+    # stopped, which lands inside "Fish"
+    first = "We have Fish Tacos: $8.25".ljust(len("We have F") + MAX_MATCH_CHARS) + " "
+    pieces = [first, "and plenty more on the menu today " * 2 + "or Fish Tacos: $8.25 again."]
+    metadata = extract("restaurant", ["".join(pieces)], lambda line: pieces)
+    assert metadata["items"] == [{"name": "Fish Tacos", "price": 8.25}]
+
+
+def test_unknown_service_finds_nothing():
+    assert extract("weather", ["Order ORD-1234 and ticket TECH-99 "]) == {}
@@ -0,0 +1,134 @@
+# Tests for the outbound audio pipeline (jitter_buffer.py): python -m pytest test_jitter_buffer.py
+import asyncio
+
+import numpy as np
+
+from backpressure import POLICY_DROP_OLDEST, POLICY_DROP_SILENCE, POLICY_DISCONNECT, SHED_DISCONNECT
+from jitter_buffer import OutputPipeline
+
+RATE = 24000
+FRAME_MS = 20
+FRAME_BYTES = RATE * FRAME_MS // 1000 * 2
+
+
+def tone(frames, amplitude=8000):
+    t = np.arange(frames * FRAME_BYTES // 2) / RATE
+    return (amplitude * np.sin(2 * np.pi * 300 * t)).astype('<i2').tobytes()
+
+
+def pipeline(**kwargs):
+    kwargs.setdefault("buffer_ms", 0)
+    return OutputPipeline(RATE, frame_ms=FRAME_MS, target_ms=40, min_ms=20, max_ms=200, **kwargs)
+
+
+def test_rechunks_into_sequenced_frames():
+    out = pipeline()
+    audio = tone(3)
+    out.push(audio[:1000])
+    out.push(audio[1000:])
+    assert [(seq, ts) for seq, ts, _, _ in out.frames] == [(0, 0), (1, 20), (2, 40)]
+    assert b''.join(frame for _, _, frame, _ in out.frames) == audio
+
+
+def test_end_of_turn_pads_partial_frame():
+    out = pipeline()
+    out.push(b'\x01\x00' * 100)
+    assert not out.frames
+    out.end_of_turn()
+    assert len(out.frames) == 1 and len(out.frames[0][2]) == FRAME_BYTES
+    assert out.turn_done
+
+
+def test_flush_drops_queued_and_pending():
+    out = pipeline()
+    out.push(tone(5) + b'\x01\x00')
+    assert out.flush() == 5
+    assert not out.frames and not out.pending
+    # Sequence numbers keep counting across a barge-in
+    out.push(tone(1))
+    assert out.frames[0][0] == 5
+    assert out.stats()["frames_flushed"] == 5
+
+
+def test_overflow_drops_oldest():
+    shed = []
+    out = pipeline(buffer_ms=3 * FRAME_MS, policy=POLICY_DROP_OLDEST,
+                   on_shed=lambda event, count: shed.append(event))
+    out.push(tone(5))
+    assert [seq for seq, _, _, _ in out.frames] == [2, 3, 4]
+    assert out.frames_shed == 2 and len(shed) == 2
+
+
+def test_overflow_prefers_silence():
+    out = pipeline(buffer_ms=3 * FRAME_MS, policy=POLICY_DROP_SILENCE)
+    out.push(tone(1) + bytes(FRAME_BYTES) + tone(2))
+    # The silent frame goes first, speech is kept
+    assert [seq for seq, _, _, _ in out.frames] == [0, 2, 3]
+
+
+def test_overflow_disconnect_is_reported():
+    shed = []
+    out = pipeline(buffer_ms=2 * FRAME_MS, policy=POLICY_DISCONNECT,
+                   on_shed=lambda event, count: shed.append(event))
+    out.push(tone(3))
+    assert SHED_DISCONNECT in shed
+
+
+def test_underrun_grows_the_lead():
+    out = pipeline()
+    sent = []
+
+    async def scenario():
+        pacer = asyncio.create_task(out.run(lambda seq, ts, frame: sent.append(seq)))
+        out.push(tone(2))
+        await asyncio.sleep(0.1)
+        # Mid-turn gap longer than the client's lead
+        out.push(tone(2))
+        await asyncio.sleep(0.1)
+        pacer.cancel()
+
+    asyncio.run(scenario())
+    assert sent == [0, 1, 2, 3]
+    assert out.underruns == 1
+    assert out.target_ms == 60
+
+
+def test_stalls_while_client_is_behind():
+    out = pipeline()
+    sent = []
+    behind = [True]
+
+    async def scenario():
+        pacer = asyncio.create_task(out.run(lambda seq, ts, frame: sent.append(seq), lambda: behind[0]))
+        out.push(tone(2))
+        out.end_of_turn()
+        await asyncio.sleep(0.1)
+        assert sent == []
+        behind[0] = False
+        await asyncio.sleep(0.1)
+        pacer.cancel()
+
+    asyncio.run(scenario())
+    assert sent == [0, 1]
+    assert out.stats()["client_stalls"] == 1
+
+
+def test_playing_only_within_the_lead():
+    out = pipeline()
+    played = []
+
+    async def scenario():
+        pacer = asyncio.create_task(out.run(lambda seq, ts, frame: None))
+        out.push(tone(1))
+        out.end_of_turn()
+        await asyncio.sleep(0.01)
+        played.append(out.playing())
+        # Lead of 40 ms plus the frame itself
+        await asyncio.sleep(0.1)
+        played.append(out.playing())
+        pacer.cancel()
+
+    assert not out.playing()
+    asyncio.run(scenario())
+    assert played == [True, False]
+    assert out.frames_sent == 1 and out.flush() == 0
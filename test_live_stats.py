@@ -0,0 +1,70 @@
+# Tests for dashboard stats (live_stats.py): python -m pytest test_live_stats.py
+from live_stats import ClusterStats, LiveStats
+
+
+class Store:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def group_counts(self):
+        self.queries += 1
+        return self.rows
+
+
+class Cluster:
+    def __init__(self):
+        self.summaries = {}
+
+    def workers(self):
+        return self.summaries
+
+    def try_lead(self, role, ttl=None):
+        return True
+
+
+def worker(*ended):
+    stats = LiveStats()
+    for service, status, category in ended:
+        stats.call_started(service)
+        stats.call_ended(service, status, category, 10.0)
+    return stats
+
+
+def test_store_is_counted_once():
+    store = Store([("restaurant", "completed", "orders", 5)])
+    cluster = Cluster()
+    stats = ClusterStats(store, cluster)
+    a = worker(("restaurant", "completed", "orders"))
+    cluster.summaries["a"] = a.worker_summary()
+    # Worker a's call is already in the store when stats start
+    assert stats.snapshot()["total_orders"] == 5
+    a.call_started("hospital")
+    a.call_ended("hospital", "completed", "appointments", 20.0)
+    cluster.summaries["a"] = a.worker_summary()
+    snapshot = stats.snapshot()
+    assert (snapshot["total_calls"], snapshot["total_appointments"]) == (6, 1)
+    assert snapshot["calls_by_service"]["hospital"] == {"completed": 1}
+    assert stats.take_delta()["total_calls"] == 6
+    assert stats.take_delta() == {}
+    assert store.queries == 1
+
+
+def test_departed_and_restarted_workers_keep_their_calls():
+    store = Store([])
+    cluster = Cluster()
+    stats = ClusterStats(store, cluster)
+    stats.snapshot()
+    a = worker(("support", "completed", "tickets"), ("support", "completed", "tickets"))
+    b = worker(("travel", "completed", "tickets"))
+    cluster.summaries.update(a=a.worker_summary(), b=b.worker_summary())
+    assert stats.snapshot()["total_tickets"] == 3
+    # a stops heartbeating; b restarts under the same id
+    del cluster.summaries["a"]
+    b = worker(("travel", "failed", "tickets"))
+    b.started += 1
+    cluster.summaries["b"] = b.worker_summary()
+    snapshot = stats.snapshot()
+    assert snapshot["total_tickets"] == 4
+    assert snapshot["calls_by_service"]["travel"] == {"completed": 1, "failed": 1}
+    assert store.queries == 1
@@ -0,0 +1,88 @@
+# Tests for call recordings and range serving (recording.py): python -m pytest test_recording.py
+import pytest
+
+import recording
+from recording import WAV_HEADER_SIZE, RecordingWriter, load_index, parse_range, serve_range, wav_header
+
+RATE = 8000
+# 500 samples of a ramp, so every byte position is recognisable
+PCM = bytes(i % 251 for i in range(1000))
+SIZE = WAV_HEADER_SIZE + len(PCM)
+
+
+@pytest.fixture
+def recorded(tmp_path, monkeypatch):
+    """Directory holding one finished caller track split over 160-byte chunks"""
+    monkeypatch.setattr(recording, "RECORD_SERVICES", {"all"})
+    monkeypatch.setattr(recording, "RECORDING_CHUNK_S", 0.01)
+    writer = RecordingWriter(str(tmp_path))
+    recorder = writer.start("call_1", "restaurant", {"caller": RATE})
+    recorder.write("caller", PCM)
+    recorder.close()
+    writer.close()
+    return str(tmp_path)
+
+
+def body(found):
+    return b''.join(bytes(block) for block in found[2])
+
+
+def test_index_lists_chunks(recorded):
+    index = load_index("call_1", recorded)
+    track = index["tracks"]["caller"]
+    assert index["complete"]
+    assert track["samples"] == len(PCM) // 2
+    assert [chunk["start_sample"] for chunk in track["chunks"]] == [0, 80, 160, 240, 320, 400, 480]
+
+
+def test_whole_file_without_range(recorded):
+    status, headers, _ = found = serve_range("call_1", "caller", None, recorded)
+    assert status == 200 and 'Content-Range' not in headers
+    assert body(found) == wav_header(RATE, len(PCM)) + PCM
+    assert headers['Content-Length'] == str(SIZE)
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-9", 0, 9),
+    # Across the header and several chunk files
+    ("bytes=40-400", 40, 400),
+    # Open-ended, and an end past the file is clamped
+    ("bytes=500-", 500, SIZE - 1),
+    ("bytes=1000-5000", 1000, SIZE - 1),
+    # Suffix: the last n bytes, or everything if n is larger
+    ("bytes=-100", SIZE - 100, SIZE - 1),
+    ("bytes=-99999", 0, SIZE - 1),
+])
+def test_ranges(recorded, header, start, end):
+    status, headers, _ = found = serve_range("call_1", "caller", header, recorded)
+    whole = wav_header(RATE, len(PCM)) + PCM
+    assert status == 206
+    assert headers['Content-Range'] == f"bytes {start}-{end}/{SIZE}"
+    assert headers['Content-Length'] == str(end - start + 1)
+    assert body(found) == whole[start:end + 1]
+
+
+@pytest.mark.parametrize("header", ["bytes=5000-", f"bytes={SIZE}-", "bytes=-0", "bytes=20-10", "bytes=-"])
+def test_unsatisfiable_range(recorded, header):
+    # The app answers 416 with this as the Content-Range
+    with pytest.raises(ValueError, match=rf"^bytes \*/{SIZE}$"):
+        serve_range("call_1", "caller", header, recorded)
+
+
+def test_unsupported_ranges_send_everything():
+    assert parse_range("bytes=0-1,5-9", SIZE) is None
+    assert parse_range("items=0-1", SIZE) is None
+
+
+def test_missing_recording_or_track(recorded):
+    assert serve_range("call_2", "caller", None, recorded) is None
+    assert serve_range("call_1", "agent", None, recorded) is None
+
+
+def test_unsafe_call_id_is_not_recorded(tmp_path, monkeypatch):
+    monkeypatch.setattr(recording, "RECORD_SERVICES", {"all"})
+    writer = RecordingWriter(str(tmp_path / "recordings"))
+    assert writer.start("../escape", "restaurant", {"caller": RATE}) is None
+    assert load_index("../escape", str(tmp_path / "recordings")) is None
+    writer.close()
+    assert not (tmp_path / "escape").exists()
@@ -0,0 +1,195 @@
+# Tests for the RTP media gateway (rtp_gateway.py): python -m pytest test_rtp_gateway.py
+import socket
+import struct
+import time
+
+import pytest
+
+from rtp_gateway import RTP_HEADER, RtpGateway, RtpStream, parse_header, service_ports
+
+
+def packet(seq=1, pt=0, payload=b'\xff' * 160, ts=0, ssrc=7, marker=0, csrcs=(), extension=None,
+           padding=0):
+    first = 0x80 | len(csrcs)
+    if extension is not None:
+        first |= 0x10
+    if padding:
+        first |= 0x20
+    data = RTP_HEADER.pack(first, marker | pt, seq, ts, ssrc)
+    data += b''.join(struct.pack('!I', csrc) for csrc in csrcs)
+    if extension is not None:
+        data += struct.pack('!HH', 0xBEDE, len(extension) // 4) + extension
+    data += payload
+    if padding:
+        data += bytes(padding - 1) + bytes([padding])
+    return data
+
+
+def parsed(data):
+    return parse_header(bytearray(data), len(data))
+
+
+def test_parse_plain_header():
+    data = packet(seq=513, pt=8, ts=160, ssrc=99, marker=0x80)
+    pt, seq, ts, ssrc, start, end = parsed(data)
+    assert (pt, seq, ts, ssrc) == (8, 513, 160, 99)
+    assert data[start:end] == b'\xff' * 160
+
+
+def test_parse_skips_csrcs_extension_and_padding():
+    data = packet(payload=b'abcd', csrcs=(1, 2), extension=bytes(8), padding=4)
+    _, _, _, _, start, end = parsed(data)
+    assert data[start:end] == b'abcd'
+
+
+@pytest.mark.parametrize("data", [
+    b'\x80\x00\x00',
+    # RTP version 1
+    bytes([0x40]) + packet()[1:],
+    # Extension header cut off
+    bytes([0x90]) + packet(payload=b'')[1:],
+    # More padding than packet
+    packet(payload=b'', padding=1)[:-1] + b'\xff',
+])
+def test_parse_rejects_malformed(data):
+    assert parsed(data) is None
+
+
+def stream():
+    return RtpStream("restaurant", ("127.0.0.1", 9), None, 0)
+
+
+def test_sequence_counts_loss_and_rejects_late():
+    rtp = stream()
+    assert rtp.accept(100) and rtp.accept(101)
+    assert rtp.accept(104)
+    assert rtp.lost == 2
+    # Duplicate and reordered packets are dropped
+    assert not rtp.accept(104) and not rtp.accept(103)
+    assert (rtp.received, rtp.late) == (3, 2)
+
+
+def test_sequence_wraps():
+    rtp = stream()
+    assert rtp.accept(0xFFFE) and rtp.accept(0xFFFF) and rtp.accept(0)
+    assert rtp.lost == 0
+    # Loss across the wrap
+    assert rtp.accept(3)
+    assert rtp.lost == 2
+    assert not rtp.accept(0xFFFF)
+
+
+def test_outbound_sequence_wraps():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(2)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        rtp = RtpStream("restaurant", receiver.getsockname(), sender, 0)
+        rtp.out_seq, rtp.out_ts = 0xFFFF, 0xFFFFFF00
+        rtp.send(b'\x01' * 160)
+        rtp.send(b'\x02' * 160)
+        headers = [RTP_HEADER.unpack_from(receiver.recv(2048)) for _ in range(2)]
+    finally:
+        receiver.close()
+        sender.close()
+    (first, marked, seq1, ts1, ssrc1), (_, unmarked, seq2, ts2, ssrc2) = headers
+    assert first >> 6 == 2
+    # First packet of a talkspurt carries the marker bit
+    assert marked == 0x80 and unmarked == 0
+    assert (seq1, seq2) == (0xFFFF, 0)
+    assert (ts2 - ts1) & 0xFFFFFFFF == 160
+    assert ssrc1 == ssrc2 and rtp.sent == 2
+
+
+def free_base_port(count):
+    """A base port with count even ports free after it (best effort)"""
+    for _ in range(20):
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.bind(("127.0.0.1", 0))
+        base = probe.getsockname()[1] & ~1
+        probe.close()
+        if base + 2 * count < 65536:
+            return base
+    pytest.skip("no free UDP ports")
+
+
+def test_service_ports_leave_room_for_rtcp():
+    assert service_ports(["a", "b", "c"], 40000) == {"a": 40000, "b": 40002, "c": 40004}
+
+
+def test_start_raises_when_a_port_is_taken():
+    base = free_base_port(2)
+    blocker = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    blocker.bind(("127.0.0.1", base + 2))
+    try:
+        gateway = RtpGateway(["a", "b"], None, None, host="127.0.0.1", base_port=base)
+        with pytest.raises(RuntimeError, match="could not listen"):
+            gateway.start()
+        gateway.close()
+    finally:
+        blocker.close()
+
+
+class FakeAgent:
+    def __init__(self):
+        self.batches = []
+
+    def enqueue_audio(self, data, sample_rate):
+        self.batches.append((data, sample_rate))
+
+
+def test_gateway_batches_a_new_caller():
+    agents = []
+
+    def on_start(service, rtp):
+        agents.append((service, FakeAgent()))
+        return agents[-1][1]
+
+    base = free_base_port(1)
+    gateway = RtpGateway(["restaurant"], on_start, lambda rtp: None, host="127.0.0.1", base_port=base)
+    gateway.start()
+    caller = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for seq in range(4):
+            caller.sendto(packet(seq=seq, payload=bytes([seq]) * 160), ("127.0.0.1", base))
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline and not (agents and len(agents[0][1].batches) == 2):
+            time.sleep(0.01)
+    finally:
+        caller.close()
+        gateway.close()
+    assert [service for service, _ in agents] == ["restaurant"]
+    # 40 ms batches of 8 kHz G.711: two packets each
+    batches = agents[0][1].batches
+    assert [(len(data), rate) for data, rate in batches] == [(320, 8000), (320, 8000)]
+    assert batches[1][0] == bytes([2]) * 160 + bytes([3]) * 160
+
+
+def test_one_source_on_two_service_ports_makes_two_calls():
+    agents = {}
+
+    def on_start(service, rtp):
+        agents[service] = FakeAgent()
+        return agents[service]
+
+    base = free_base_port(2)
+    gateway = RtpGateway(["restaurant", "hospital"], on_start, lambda rtp: None, host="127.0.0.1",
+                         base_port=base)
+    gateway.start()
+    # One socket, as a media proxy reusing its address for both legs
+    caller = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for seq in range(2):
+            caller.sendto(packet(seq=seq, payload=b'\x01' * 160), ("127.0.0.1", base))
+            caller.sendto(packet(seq=seq, payload=b'\x02' * 160), ("127.0.0.1", base + 2))
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline and sum(len(agent.batches) for agent in agents.values()) < 2:
+            time.sleep(0.01)
+        streams = len(gateway.streams)
+    finally:
+        caller.close()
+        gateway.close()
+    assert sorted(agents) == ["hospital", "restaurant"] and streams == 2
+    assert agents["restaurant"].batches == [(b'\x01' * 320, 8000)]
+    assert agents["hospital"].batches == [(b'\x02' * 320, 8000)]
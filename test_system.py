@@ -25,7 +25,10 @@ def test_api_endpoints():
             print(f"✅ {endpoint}: {response.status_code}")
             if response.status_code == 200:
                 data = response.json()
-                print(f"   Data: {len(data) if isinstance(data, list) else 'dict'} items")
+                if isinstance(data, dict) and "items" in data:
+                    print(f"   Data: {len(data['items'])} items (next_cursor={data['next_cursor']})")
+                else:
+                    print(f"   Data: {len(data) if isinstance(data, list) else 'dict'} items")
         except Exception as e:
             print(f"❌ {endpoint}: {str(e)}")
     
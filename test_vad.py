@@ -0,0 +1,83 @@
+# Tests for the server-side VAD (vad.py): python -m pytest test_vad.py
+import numpy as np
+
+from vad import VoiceActivityDetector
+
+RATE = 16000
+FRAME_MS = 20
+
+
+def tone(ms, amplitude=8000, hz=300):
+    t = np.arange(RATE * ms // 1000) / RATE
+    return (amplitude * np.sin(2 * np.pi * hz * t)).astype('<i2').tobytes()
+
+
+def silence(ms):
+    return bytes(RATE * ms // 1000 * 2)
+
+
+def detector():
+    return VoiceActivityDetector(RATE, frame_ms=FRAME_MS, energy_threshold=500,
+                                 hangover_ms=100, preroll_ms=40)
+
+
+def test_silence_is_dropped():
+    vad = detector()
+    result = vad.process(silence(200))
+    assert result == (b'', False, False)
+    assert not vad.in_speech
+
+
+def test_speech_start_carries_preroll():
+    vad = detector()
+    vad.process(silence(100))
+    result = vad.process(tone(100))
+    assert result.speech_started and not result.speech_ended
+    # Two pre-roll frames of silence, then the speech itself
+    assert len(result.audio) == len(silence(40)) + len(tone(100))
+
+
+def test_speech_ends_after_hangover():
+    vad = detector()
+    vad.process(tone(100))
+    # A pause shorter than the hangover stays inside the utterance
+    short = vad.process(silence(60))
+    assert not short.speech_ended and vad.in_speech
+    assert len(short.audio) == len(silence(60))
+    ended = vad.process(silence(60))
+    assert ended.speech_ended and not vad.in_speech
+    # Only the frames up to the end of the hangover are forwarded
+    assert len(ended.audio) == len(silence(40))
+    assert vad.process(silence(100)).audio == b''
+
+
+def test_next_utterance_is_not_reported_with_the_end():
+    vad = detector()
+    vad.process(tone(100))
+    # One chunk: the rest of the hangover, then the caller talks again
+    ended = vad.process(silence(100) + tone(100))
+    assert ended.speech_ended and not ended.speech_started
+    assert len(ended.audio) == len(silence(100))
+    assert vad.pending()
+    started = vad.process(b'')
+    assert started.speech_started and not started.speech_ended
+    assert len(started.audio) == len(tone(100))
+    assert not vad.pending()
+
+
+def test_partial_frames_carry_over():
+    vad = detector()
+    speech = tone(100)
+    first = vad.process(speech[:1000])
+    second = vad.process(speech[1000:])
+    assert first.speech_started and not second.speech_started
+    assert len(first.audio) + len(second.audio) == len(speech)
+
+
+def test_stats_count_frames():
+    vad = detector()
+    vad.process(tone(100) + silence(100))
+    stats = vad.stats()
+    assert stats["speech_ms"] == 100
+    assert stats["silence_ms"] == 100
+    assert stats["speech_ratio"] == 0.5
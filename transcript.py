@@ -0,0 +1,111 @@
+"""
+Call Transcript
+===============
+Compact per-call transcript. Streamed text arrives as many small
+fragments; consecutive fragments from the same speaker are merged into
+one utterance instead of each becoming its own dict.
+
+Utterances are kept column-wise: speaker codes in a byte array, start
+offsets (monotonic seconds since the call started) in a double array
+and the merged text in a list. The familiar entry dicts
+({"speaker", "text", "timestamp"} with an ISO timestamp) are only built
+when the transcript is read or persisted.
+
+An optional on_utterance(seq, speaker, text, timestamp) callback sees
+each utterance once it is complete (the search index uses it).
+"""
+
+import threading
+import time
+from array import array
+from datetime import datetime
+
+# Speaker name <-> small int code (grows if a new speaker ever shows up)
+SPEAKERS = ["Agent", "User"]
+_speaker_codes = {name: code for code, name in enumerate(SPEAKERS)}
+_speakers_lock = threading.Lock()
+
+
+def speaker_code(name):
+    code = _speaker_codes.get(name)
+    if code is None:
+        with _speakers_lock:
+            code = _speaker_codes.get(name)
+            if code is None:
+                code = len(SPEAKERS)
+                SPEAKERS.append(name)
+                _speaker_codes[name] = code
+    return code
+
+
+class Transcript:
+    """Append-only utterances with same-speaker fragment merging"""
+
+    __slots__ = ("_speakers", "_offsets", "_texts", "_tail", "_open",
+                 "_wall_start", "_mono_start", "_lock", "_on_utterance")
+
+    def __init__(self, on_utterance=None):
+        self._speakers = array('B')
+        self._offsets = array('d')
+        self._texts = []
+        # Fragments of the utterance still being spoken
+        self._tail = []
+        self._open = False
+        self._wall_start = time.time()
+        self._mono_start = time.monotonic()
+        # Agent text arrives on the engine loop, caller text on socket threads
+        self._lock = threading.Lock()
+        self._on_utterance = on_utterance
+
+    def add(self, speaker, text):
+        """Append a fragment, merging it into the open utterance if same speaker"""
+        code = speaker_code(speaker)
+        with self._lock:
+            if self._open and self._speakers[-1] == code:
+                self._tail.append(text)
+                return
+            self._close()
+            self._speakers.append(code)
+            self._offsets.append(time.monotonic() - self._mono_start)
+            self._texts.append("")
+            self._tail = [text]
+            self._open = True
+
+    def end_utterance(self):
+        """The speaker finished (end of a model turn, a final caller phrase)"""
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._open:
+            text = self._texts[-1] = "".join(self._tail)
+            self._tail = []
+            self._open = False
+            if self._on_utterance is not None and text:
+                seq = len(self._texts) - 1
+                self._on_utterance(seq, SPEAKERS[self._speakers[seq]], text,
+                                   datetime.fromtimestamp(self._wall_start + self._offsets[seq]).isoformat())
+
+    def __len__(self):
+        return len(self._speakers)
+
+    def __iter__(self):
+        return iter(self.entries())
+
+    def entries(self):
+        """Entries in the stored JSON shape"""
+        with self._lock:
+            texts = list(self._texts)
+            if self._open:
+                texts[-1] = "".join(self._tail)
+            speakers = self._speakers.tolist()
+            offsets = self._offsets.tolist()
+        wall_start = self._wall_start
+        return [
+            {
+                "speaker": SPEAKERS[code],
+                "text": text,
+                "timestamp": datetime.fromtimestamp(wall_start + offset).isoformat(),
+            }
+            for code, offset, text in zip(speakers, offsets, texts)
+        ]
@@ -0,0 +1,121 @@
+"""
+Voice Activity Detection
+========================
+Server-side VAD for the inbound audio path. Caller PCM is split into
+20 ms frames and each frame is classified from its RMS energy and
+zero-crossing rate. Silent frames are dropped before they reach the Live
+session, a short pre-roll keeps word onsets intact, and a hangover keeps
+short pauses inside an utterance. When the caller stops talking the
+detector reports an activity end so the model can take its turn.
+"""
+
+import os
+from collections import deque, namedtuple
+
+import numpy as np
+
+# VAD configuration
+VAD_ENABLED = os.environ.get('VAD_ENABLED', '1') != '0'
+VAD_FRAME_MS = 20
+VAD_ENERGY_THRESHOLD = float(os.environ.get('VAD_ENERGY_THRESHOLD', 500))
+VAD_HANGOVER_MS = int(os.environ.get('VAD_HANGOVER_MS', 400))
+VAD_PREROLL_MS = int(os.environ.get('VAD_PREROLL_MS', 100))
+
+# Unvoiced consonants ("s", "f") are quiet but cross zero often
+FRICATIVE_ZCR = 0.25
+
+VadResult = namedtuple('VadResult', ['audio', 'speech_started', 'speech_ended'])
+
+
+class VoiceActivityDetector:
+    """Energy + zero-crossing VAD over 16-bit mono PCM"""
+
+    def __init__(self, sample_rate=16000, frame_ms=VAD_FRAME_MS,
+                 energy_threshold=VAD_ENERGY_THRESHOLD,
+                 hangover_ms=VAD_HANGOVER_MS, preroll_ms=VAD_PREROLL_MS):
+        self.frame_ms = frame_ms
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_samples * 2
+        self.energy_threshold = energy_threshold
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.preroll = deque(maxlen=max(0, preroll_ms // frame_ms))
+        self.remainder = b''
+        self.in_speech = False
+        self.silent_run = 0
+        self.speech_frames = 0
+        self.silence_frames = 0
+        # Adaptive floor so steady background noise is not taken for speech
+        self.noise_floor = energy_threshold / 2
+
+    def classify(self, pcm):
+        """Return a boolean speech flag for every whole frame in pcm"""
+        samples = np.frombuffer(pcm, dtype='<i2').reshape(-1, self.frame_samples)
+        as_float = samples.astype(np.float32)
+        rms = np.sqrt(np.mean(as_float * as_float, axis=1))
+        signs = np.signbit(samples)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_samples
+
+        threshold = max(self.energy_threshold, self.noise_floor * 3)
+        voiced = (rms > threshold) | ((rms > threshold / 2) & (zcr > FRICATIVE_ZCR))
+
+        quiet = rms[~voiced]
+        if quiet.size:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * float(quiet.mean())
+        return voiced
+
+    def process(self, pcm):
+        """Filter a chunk of caller audio, keeping only speech
+
+        Stops at the frame that ends an utterance, so the start of the next
+        one is never reported with it; the rest waits in remainder until
+        the next call (process(b'') drains it).
+        """
+        data = self.remainder + pcm
+        whole = len(data) - len(data) % self.frame_bytes
+        self.remainder = data[whole:]
+        if not whole:
+            return VadResult(b'', False, False)
+
+        flags = self.classify(data[:whole])
+        out = []
+        started = ended = False
+        view = memoryview(data)
+        for i, voiced in enumerate(flags):
+            frame = view[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            if voiced:
+                self.speech_frames += 1
+                self.silent_run = 0
+                if not self.in_speech:
+                    self.in_speech = True
+                    started = True
+                    out.extend(self.preroll)
+                    self.preroll.clear()
+                out.append(frame)
+                continue
+
+            self.silence_frames += 1
+            if self.in_speech:
+                self.silent_run += 1
+                out.append(frame)
+                if self.silent_run >= self.hangover_frames:
+                    self.in_speech = False
+                    ended = True
+                    self.remainder = data[(i + 1) * self.frame_bytes:]
+                    break
+            elif self.preroll.maxlen:
+                self.preroll.append(bytes(frame))
+
+        return VadResult(b''.join(out), started, ended)
+
+    def pending(self):
+        """Whether remainder holds a whole frame not yet processed"""
+        return len(self.remainder) >= self.frame_bytes
+
+    def stats(self):
+        """Speech/silence totals for call metadata"""
+        total = self.speech_frames + self.silence_frames
+        return {
+            "speech_ms": self.speech_frames * self.frame_ms,
+            "silence_ms": self.silence_frames * self.frame_ms,
+            "speech_ratio": round(self.speech_frames / total, 3) if total else 0.0,
+        }